@@ -1,16 +1,28 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, request, jsonify, render_template_string, url_for
+from functools import wraps
 import os
-import pandas as pd
-import sqlite3
-import json
+import time
 import logging
+import uuid
 from flask_cors import CORS
 
 # Importa as funções dos modelos
-from dixon_coles_model import predict_dixon_coles, MODEL_PARAMS_FILE
-from skellam_bayesian_model import predict_skellam_bayesian, train_skellam_bayesian_model
-from xg_differential_model import predict_xg_differential
-from calculate_bet_value import calculate_value_bet
+from dixon_coles_model import predict_dixon_coles, predict_dixon_coles_batch, predict_all_pairs, grid_to_json, MODEL_PARAMS_FILE
+from skellam_bayesian_model import (predict_skellam_bayesian, predict_skellam_bayesian_batch, posterior_file, posterior_from_arrays,
+                                    read_posterior_arrays, POSTERIOR_FOLDER)
+from xg_differential_model import predict_xg_differential, predict_xg_differential_batch
+from calculate_bet_value import load_matches_with_odds, scan_value_bets
+from data_versions import get_all_data_versions, get_data_version
+from db import DB_FILE, get_connection
+from score_matrix import MAX_GOALS
+from model_registry import ModelRegistry
+from competitions import competition_model_name, competition_params_file, list_competitions
+from parquet_snapshots import PARQUET_FOLDER
+from jobs import create_job, get_job, start_job_worker
+from shared_arrays import shared_array_loader
+from response_cache import ResponseCache, SQLiteCacheStore, cache_key, etag_for
+from metrics import (REQUEST_LATENCY, DATA_VERSION, SamplingProfiler, begin_request, end_request, count_cache,
+                     render_metrics, set_model_versions, stage_timer)
 
 app = Flask(__name__)
 CORS(app)  # Permite requisições de qualquer origem
@@ -21,22 +33,231 @@ logger = logging.getLogger(__name__)
 
 # Configurações
 UPLOAD_FOLDER = 'uploads'
-PARQUET_FOLDER = 'parquets'
-DB_FILE = 'database.db'
+BATCH_MODELS = ['dixon-coles', 'skellam-bayesian', 'xg-differential']
+MAX_BATCH_FIXTURES = 1000
+VALUE_BETS_CACHE_SIZE = 16
+GRID_CACHE_SIZE = 16
+MAX_GOALS_LIMIT = 20
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # o CSV enviado é gravado em disco em blocos de 1 MiB
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+RESPONSE_MAX_AGE = 15  # segundos que o cliente pode reutilizar uma resposta antes de revalidar pelo ETag
 
 # Cria os diretórios se não existirem
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PARQUET_FOLDER, exist_ok=True)
 
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
+# Registro dos modelos: os parâmetros são carregados uma vez por worker e recarregados quando o arquivo muda
+model_registry = ModelRegistry()
+model_registry.register("dixon_coles", MODEL_PARAMS_FILE)
+
+# Grades de todos os pares do Dixon-Coles por versão do modelo (global ou de cada competição)
+dixon_coles_grid_cache = {}
+
+# Varredura de apostas de valor por (versão do modelo, versão dos dados de matches, temporada)
+value_bets_cache = {}
+
+# Profiler por amostragem opcional (PROFILER=1), com as pilhas coletadas em /metrics/profile
+profiler = SamplingProfiler() if os.environ.get('PROFILER', '').lower() in ('1', 'true', 'yes') else None
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+    if profiler is not None and not profiler.running:
+        # Iniciado na primeira requisição de cada worker, já depois do fork
+        profiler.start()
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+                                method=request.method, status=response.status_code)
+    end_request()
+    return response
+
+# Cache das respostas dos GETs de previsão e de /teams; com RESPONSE_CACHE_DB, compartilhado entre os workers
+response_cache_file = os.environ.get('RESPONSE_CACHE_DB')
+response_cache = ResponseCache(store=SQLiteCacheStore(response_cache_file) if response_cache_file else None)
+
+def cached_response(versions):
+    """ Decorator das rotas GET cujas respostas dependem só dos parâmetros e das versões de modelo/dados.
+    `versions` retorna as versões das dependências da requisição atual (None para não usar o cache).
+    Responde 304 quando o If-None-Match do cliente confere com o ETag, sem executar a rota. """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with stage_timer('cache'):
+                    dependency_versions = versions()
+            except FileNotFoundError:
+                dependency_versions = None
+            if dependency_versions is None:
+                return view(*args, **kwargs)
+            
+            key = cache_key(request.path, request.args, dependency_versions)
+            etag = etag_for(key)
+            if request.if_none_match.contains(etag):
+                count_cache('responses_not_modified', True)
+                response = Response(status=304)
+            else:
+                with stage_timer('cache'):
+                    body = response_cache.get(key)
+                count_cache('responses', body is not None)
+                if body is not None:
+                    response = Response(body, mimetype='application/json')
+                else:
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    response_cache.set(key, response.get_data())
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = f'public, max-age={RESPONSE_MAX_AGE}'
+            return response
+        return wrapper
+    return decorator
+
+def json_response(payload):
+    """ jsonify medido como a etapa de serialização da resposta """
+    with stage_timer('serialize'):
+        return jsonify(payload)
+
+def parse_competition_args(args=None):
+    """ Lê o seletor de competição: league (None para o modelo global), season (padrão: 2025) e window (padrão: 1) """
+    args = request.args if args is None else args
+    league = args.get('league') or None
+    season = str(args.get('season') or '2025')
+    try:
+        window = int(args.get('window', 1))
+    except (TypeError, ValueError):
+        window = None
+    if window is not None and window < 1:
+        window = None
+    return league, season, window
+
+def parse_non_negative_int(name, default=None, args=None):
+    """ Lê um parâmetro inteiro não negativo (default se ausente). Levanta ValueError com a mensagem para o 400 """
+    args = request.args if args is None else args
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"Parâmetro '{name}' deve ser um inteiro não negativo")
+    if value < 0:
+        raise ValueError(f"Parâmetro '{name}' deve ser um inteiro não negativo")
+    return value
+
+def get_dixon_coles_model(league=None, season='2025', window=1):
+    """ Retorna (parâmetros, versão) do Dixon-Coles global ou, com league, do modelo da competição.
+    Levanta FileNotFoundError se o modelo pedido não foi treinado. """
+    if league is None:
+        return model_registry.get("dixon_coles")
+    name = competition_model_name(league, season, window)
+    if name not in model_registry:
+        params_file = competition_params_file(league, season, window)
+        # Só registra competições treinadas, para que parâmetros arbitrários não cresçam o registro
+        if not os.path.exists(params_file):
+            raise FileNotFoundError(params_file)
+        model_registry.register(name, params_file)
+    return model_registry.get(name)
+
+def get_skellam_posterior(season='2025'):
+    """ Retorna (amostras da posterior, versão) do Skellam Bayesiano da temporada.
+    Levanta FileNotFoundError se o modelo da temporada não foi ajustado. """
+    name = f"skellam_bayesian:{season}"
+    if name not in model_registry:
+        path = posterior_file(season)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        # As amostras ficam em arquivos .npy mapeados em memória, compartilhados por todos os workers
+        model_registry.register(name, path, loader=shared_array_loader(name, read_posterior_arrays, posterior_from_arrays))
+    return model_registry.get(name)
+
+def preload_models():
+    """ Carrega todos os modelos treinados (Dixon-Coles global e por competição, posteriores do Skellam).
+    Chamado no processo mestre do gunicorn (preload_app): os workers herdam os modelos já carregados no fork
+    e só recarregam um modelo quando a versão dele muda. Retorna os nomes dos modelos carregados. """
+    try:
+        get_dixon_coles_model()
+    except FileNotFoundError:
+        logger.warning("Modelo Dixon-Coles global não treinado.")
+    
+    conn = get_connection(DB_FILE, read_only=True)
+    if conn:
+        for league, seasons in list_competitions(conn).items():
+            for season in seasons:
+                try:
+                    get_dixon_coles_model(league, season)
+                except FileNotFoundError:
+                    pass
+    
+    if os.path.isdir(POSTERIOR_FOLDER):
+        for file in sorted(os.listdir(POSTERIOR_FOLDER)):
+            if file.endswith('.npz'):
+                get_skellam_posterior(os.path.splitext(file)[0])
+    return sorted(model_registry.loaded_versions())
+
+def current_data_versions(*names):
+    """ Versões atuais dos conjuntos de dados pedidos (None se o banco não estiver acessível) """
+    conn = get_connection(DB_FILE, read_only=True)
+    if not conn:
+        return None
+    return [get_data_version(conn, name) for name in names]
+
+def dixon_coles_versions():
+    """ Versão do modelo Dixon-Coles selecionado pelos parâmetros da requisição """
+    league, season, window = parse_competition_args()
+    if window is None:
+        return None
+    return [get_dixon_coles_model(league, season, window)[1]]
+
+def value_bets_versions():
+    model_versions = dixon_coles_versions()
+    data_versions = current_data_versions('matches')
+    if model_versions is None or data_versions is None:
+        return None
+    return model_versions + data_versions
+
+def skellam_versions():
+    return [get_skellam_posterior(request.args.get('season', '2025'))[1]]
+
+def dixon_coles_not_trained(league, season):
+    """ Resposta de erro para modelo Dixon-Coles ausente """
+    if league is not None:
+        return jsonify({"error": f"Modelo Dixon-Coles não treinado para a competição {league} {season}"}), 404
+    return jsonify({"error": "Modelo Dixon-Coles não treinado"}), 500
+
+def parse_market_args():
+    """ Lê os parâmetros opcionais de mercados: max_goals (None se inválido) e markets (true/false) """
+    max_goals = request.args.get('max_goals', MAX_GOALS, type=int)
+    if max_goals is None or not 1 <= max_goals <= MAX_GOALS_LIMIT:
+        max_goals = None
+    include_markets = request.args.get('markets', 'false').lower() in ('1', 'true', 'yes')
+    return max_goals, include_markets
+
+def save_upload_stream(stream, destination):
+    """ Copia o arquivo enviado para o disco em blocos, sem carregá-lo inteiro na memória.
+    Grava num arquivo temporário e só o renomeia para o destino se chegar inteiro.
+    Retorna o número de bytes gravados, ou None se o limite de tamanho for ultrapassado. """
+    partial_path = destination + ".part"
+    size = 0
     try:
-        conn = sqlite3.connect(db_file)
-        logger.info(f"Conexão com o banco de dados {db_file} estabelecida.")
-    except sqlite3.Error as e:
-        logger.error(f"Erro ao conectar com o banco de dados: {e}")
-    return conn
+        with open(partial_path, "wb") as f:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    return None
+                f.write(chunk)
+        os.replace(partial_path, destination)
+        return size
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
 
 @app.route('/')
 def home():
@@ -56,43 +277,80 @@ def home():
     <body>
         <h1>Aurora13 API - Sistema de Predição Esportiva</h1>
         <p>Bem-vindo à API de predição esportiva Aurora13. Esta API oferece modelos preditivos avançados para apostas esportivas.</p>
+        <p>As respostas dos GETs de previsão, de /value-bets e de /teams trazem ETag e Cache-Control: envie o ETag recebido em If-None-Match para receber 304 enquanto o modelo e os dados não mudarem.</p>
         
         <h2>Endpoints Disponíveis:</h2>
         
         <div class="endpoint">
             <span class="method">GET</span> <strong>/predict/dixon-coles</strong>
             <p>Predição usando o modelo Dixon-Coles</p>
-            <p>Parâmetros: home_team, away_team</p>
+            <p>Parâmetros: home_team, away_team; opcionais: markets (true para incluir over/under, ambos marcam, handicap asiático e placar exato), max_goals (padrão: 5)</p>
+            <p>Seletor de competição (opcional): league, season (padrão: 2025), window (temporadas no treino, padrão: 1); sem league, usa o modelo global</p>
+        </div>
+        
+        <div class="endpoint">
+            <span class="method">GET</span> <strong>/predict/dixon-coles/grid</strong>
+            <p>Probabilidades e gols esperados do Dixon-Coles para todos os pares de times (linha = mandante, coluna = visitante)</p>
+            <p>Parâmetros opcionais: league, season, window</p>
         </div>
         
         <div class="endpoint">
             <span class="method">GET</span> <strong>/predict/skellam-bayesian</strong>
-            <p>Predição usando o modelo Skellam Bayesiano</p>
-            <p>Parâmetros: home_team, away_team</p>
+            <p>Predição usando o modelo Skellam Bayesiano hierárquico (posterior preditiva, com intervalos de credibilidade de 90% para cada resultado)</p>
+            <p>Parâmetros: home_team, away_team; opcionais: season (padrão: 2025), markets (true para incluir over/under, ambos marcam, handicap asiático e placar exato), max_goals (padrão: 5)</p>
         </div>
         
         <div class="endpoint">
             <span class="method">GET</span> <strong>/predict/xg-differential</strong>
             <p>Predição usando o modelo XG Diferencial</p>
-            <p>Parâmetros: home_team, away_team</p>
+            <p>Parâmetros: home_team, away_team; opcional: season (padrão: todas)</p>
+        </div>
+        
+        <div class="endpoint">
+            <span class="method">POST</span> <strong>/predict/batch</strong>
+            <p>Predição de vários jogos de uma vez, com um ou mais modelos</p>
+            <p>Corpo JSON: fixtures (lista de {home_team, away_team}), models (opcional: dixon-coles, skellam-bayesian, xg-differential), league, season, window (opcionais)</p>
         </div>
         
         <div class="endpoint">
             <span class="method">GET</span> <strong>/value-bets</strong>
             <p>Lista de apostas de valor identificadas pelo sistema</p>
-            <p>Parâmetros opcionais: min_value (padrão: 0.05)</p>
+            <p>Parâmetros opcionais: min_value (padrão: 0.05), season (padrão: 2025), league (usa o modelo da competição e filtra os jogos da liga), window, limit, offset</p>
+        </div>
+        
+        <div class="endpoint">
+            <span class="method">POST</span> <strong>/upload</strong>
+            <p>Envia um CSV de jogos (corpo da requisição ou campo 'file' de um formulário) e enfileira ingestão, odds médias, xG e retreino em segundo plano</p>
+            <p>Retorna o job_id para acompanhar em /jobs/&lt;job_id&gt;</p>
+        </div>
+        
+        <div class="endpoint">
+            <span class="method">GET</span> <strong>/jobs/&lt;job_id&gt;</strong>
+            <p>Status de um job de ingestão: queued, running (com a etapa atual), succeeded ou failed</p>
         </div>
         
         <div class="endpoint">
             <span class="method">GET</span> <strong>/teams</strong>
             <p>Lista de times disponíveis no banco de dados</p>
         </div>
+        
+        <div class="endpoint">
+            <span class="method">GET</span> <strong>/metrics</strong>
+            <p>Métricas do worker no formato do Prometheus: latência por endpoint e por etapa, hits/misses dos caches e versões dos modelos e dados</p>
+        </div>
+        
+        <div class="endpoint">
+            <span class="method">GET</span> <strong>/metrics/profile</strong>
+            <p>Pilhas amostradas pelo profiler, no formato collapsed (apenas com PROFILER=1)</p>
+            <p>Parâmetros opcionais: limit (número de pilhas), reset (true para zerar as amostras)</p>
+        </div>
     </body>
     </html>
     """
     return render_template_string(html_template)
 
 @app.route('/predict/dixon-coles')
+@cached_response(dixon_coles_versions)
 def predict_dixon_coles_endpoint():
     """Endpoint para predição usando o modelo Dixon-Coles"""
     home_team = request.args.get('home_team')
@@ -100,16 +358,26 @@ def predict_dixon_coles_endpoint():
     
     if not home_team or not away_team:
         return jsonify({"error": "Parâmetros 'home_team' e 'away_team' são obrigatórios"}), 400
+    max_goals, include_markets = parse_market_args()
+    if max_goals is None:
+        return jsonify({"error": f"Parâmetro 'max_goals' deve ser um inteiro entre 1 e {MAX_GOALS_LIMIT}"}), 400
+    league, season, window = parse_competition_args()
+    if window is None:
+        return jsonify({"error": "Parâmetro 'window' deve ser um inteiro positivo"}), 400
     
     try:
-        with open(MODEL_PARAMS_FILE, 'r') as f:
-            dixon_coles_params = json.load(f)
+        with stage_timer('model'):
+            dixon_coles_params, model_version = get_dixon_coles_model(league, season, window)
         
-        prediction = predict_dixon_coles(home_team, away_team, dixon_coles_params)
+        with stage_timer('predict'):
+            prediction = predict_dixon_coles(home_team, away_team, dixon_coles_params, max_goals=max_goals, include_markets=include_markets)
         
         if prediction:
-            return jsonify({
+            return json_response({
                 "model": "Dixon-Coles",
+                "model_version": model_version,
+                "league": league,
+                "season": season if league else None,
                 "home_team": home_team,
                 "away_team": away_team,
                 "predictions": prediction
@@ -118,12 +386,48 @@ def predict_dixon_coles_endpoint():
             return jsonify({"error": "Time(s) não encontrado(s) no modelo"}), 404
             
     except FileNotFoundError:
-        return jsonify({"error": "Modelo Dixon-Coles não treinado"}), 500
+        return dixon_coles_not_trained(league, season)
     except Exception as e:
         logger.error(f"Erro na predição Dixon-Coles: {e}")
         return jsonify({"error": "Erro interno do servidor"}), 500
 
+@app.route('/predict/dixon-coles/grid')
+@cached_response(dixon_coles_versions)
+def predict_dixon_coles_grid_endpoint():
+    """Endpoint com a grade de predições Dixon-Coles para todos os pares de times"""
+    league, season, window = parse_competition_args()
+    if window is None:
+        return jsonify({"error": "Parâmetro 'window' deve ser um inteiro positivo"}), 400
+    
+    try:
+        with stage_timer('model'):
+            dixon_coles_params, model_version = get_dixon_coles_model(league, season, window)
+        
+        grid = dixon_coles_grid_cache.get(model_version)
+        count_cache('dixon_coles_grid', grid is not None)
+        if grid is None:
+            with stage_timer('predict'):
+                grid = grid_to_json(predict_all_pairs(dixon_coles_params))
+            if len(dixon_coles_grid_cache) >= GRID_CACHE_SIZE:
+                dixon_coles_grid_cache.clear()
+            dixon_coles_grid_cache[model_version] = grid
+        
+        return json_response({
+            "model": "Dixon-Coles",
+            "model_version": model_version,
+            "league": league,
+            "season": season if league else None,
+            **grid
+        })
+        
+    except FileNotFoundError:
+        return dixon_coles_not_trained(league, season)
+    except Exception as e:
+        logger.error(f"Erro na grade Dixon-Coles: {e}")
+        return jsonify({"error": "Erro interno do servidor"}), 500
+
 @app.route('/predict/skellam-bayesian')
+@cached_response(skellam_versions)
 def predict_skellam_bayesian_endpoint():
     """Endpoint para predição usando o modelo Skellam Bayesiano"""
     home_team = request.args.get('home_team')
@@ -131,19 +435,23 @@ def predict_skellam_bayesian_endpoint():
     
     if not home_team or not away_team:
         return jsonify({"error": "Parâmetros 'home_team' e 'away_team' são obrigatórios"}), 400
+    max_goals, include_markets = parse_market_args()
+    if max_goals is None:
+        return jsonify({"error": f"Parâmetro 'max_goals' deve ser um inteiro entre 1 e {MAX_GOALS_LIMIT}"}), 400
+    
+    season = request.args.get('season', '2025')
     
     try:
-        conn = create_connection(DB_FILE)
-        if not conn:
-            return jsonify({"error": "Erro de conexão com o banco de dados"}), 500
-        
-        team_stats = train_skellam_bayesian_model(conn)
-        prediction = predict_skellam_bayesian(home_team, away_team, team_stats)
-        conn.close()
+        with stage_timer('model'):
+            posterior, model_version = get_skellam_posterior(season)
+        with stage_timer('predict'):
+            prediction = predict_skellam_bayesian(home_team, away_team, posterior, max_goals=max_goals, include_markets=include_markets)
         
         if prediction:
-            return jsonify({
+            return json_response({
                 "model": "Skellam Bayesiano",
+                "model_version": model_version,
+                "season": season,
                 "home_team": home_team,
                 "away_team": away_team,
                 "predictions": prediction
@@ -151,11 +459,14 @@ def predict_skellam_bayesian_endpoint():
         else:
             return jsonify({"error": "Time(s) não encontrado(s) no modelo"}), 404
             
+    except FileNotFoundError:
+        return jsonify({"error": f"Modelo Skellam Bayesiano não treinado para a temporada {season}"}), 404
     except Exception as e:
         logger.error(f"Erro na predição Skellam Bayesiano: {e}")
         return jsonify({"error": "Erro interno do servidor"}), 500
 
 @app.route('/predict/xg-differential')
+@cached_response(lambda: current_data_versions('xg_data', 'matches'))
 def predict_xg_differential_endpoint():
     """Endpoint para predição usando o modelo XG Diferencial"""
     home_team = request.args.get('home_team')
@@ -165,16 +476,19 @@ def predict_xg_differential_endpoint():
         return jsonify({"error": "Parâmetros 'home_team' e 'away_team' são obrigatórios"}), 400
     
     try:
-        conn = create_connection(DB_FILE)
+        with stage_timer('connect'):
+            conn = get_connection(DB_FILE, read_only=True)
         if not conn:
             return jsonify({"error": "Erro de conexão com o banco de dados"}), 500
         
-        prediction = predict_xg_differential(home_team, away_team, conn)
-        conn.close()
+        season = request.args.get('season')
+        with stage_timer('predict'):
+            prediction = predict_xg_differential(home_team, away_team, conn, season)
         
         if prediction:
-            return jsonify({
+            return json_response({
                 "model": "XG Diferencial",
+                "season": season,
                 "home_team": home_team,
                 "away_team": away_team,
                 "predictions": prediction
@@ -186,93 +500,237 @@ def predict_xg_differential_endpoint():
         logger.error(f"Erro na predição XG Diferencial: {e}")
         return jsonify({"error": "Erro interno do servidor"}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_endpoint():
+    """Endpoint para predição em lote de vários jogos, com todos os modelos pedidos"""
+    payload = request.get_json(silent=True) or {}
+    fixtures = payload.get('fixtures')
+    models = payload.get('models')
+    if models is None:
+        models = BATCH_MODELS
+    
+    if not isinstance(fixtures, list) or not fixtures:
+        return jsonify({"error": "Campo 'fixtures' deve ser uma lista não vazia de jogos"}), 400
+    if not isinstance(models, list) or not models or not all(isinstance(model, str) for model in models):
+        return jsonify({"error": f"Campo 'models' deve ser uma lista não vazia de nomes de modelos. Disponíveis: {BATCH_MODELS}"}), 400
+    if len(fixtures) > MAX_BATCH_FIXTURES:
+        return jsonify({"error": f"Máximo de {MAX_BATCH_FIXTURES} jogos por requisição"}), 400
+    unknown_models = [model for model in models if model not in BATCH_MODELS]
+    if unknown_models:
+        return jsonify({"error": f"Modelo(s) desconhecido(s): {unknown_models}. Disponíveis: {BATCH_MODELS}"}), 400
+    league, season, window = parse_competition_args(payload)
+    if window is None:
+        return jsonify({"error": "Campo 'window' deve ser um inteiro positivo"}), 400
+    
+    home_teams = []
+    away_teams = []
+    for fixture in fixtures:
+        if isinstance(fixture, dict):
+            home_team, away_team = fixture.get('home_team'), fixture.get('away_team')
+        elif isinstance(fixture, (list, tuple)) and len(fixture) == 2:
+            home_team, away_team = fixture
+        else:
+            home_team, away_team = None, None
+        if not home_team or not away_team:
+            return jsonify({"error": "Cada jogo deve ter 'home_team' e 'away_team'"}), 400
+        home_teams.append(home_team)
+        away_teams.append(away_team)
+    
+    try:
+        model_predictions = {}
+        model_versions = {}
+        
+        if 'dixon-coles' in models:
+            with stage_timer('model'):
+                dixon_coles_params, model_versions['dixon-coles'] = get_dixon_coles_model(league, season, window)
+            with stage_timer('predict_dixon_coles'):
+                model_predictions['dixon-coles'] = predict_dixon_coles_batch(home_teams, away_teams, dixon_coles_params)
+        
+        if 'skellam-bayesian' in models:
+            try:
+                with stage_timer('model'):
+                    posterior, model_versions['skellam-bayesian'] = get_skellam_posterior(season)
+            except FileNotFoundError:
+                return jsonify({"error": f"Modelo Skellam Bayesiano não treinado para a temporada {season}"}), 404
+            with stage_timer('predict_skellam_bayesian'):
+                model_predictions['skellam-bayesian'] = predict_skellam_bayesian_batch(home_teams, away_teams, posterior)
+        
+        if 'xg-differential' in models:
+            with stage_timer('connect'):
+                conn = get_connection(DB_FILE, read_only=True)
+            if not conn:
+                return jsonify({"error": "Erro de conexão com o banco de dados"}), 500
+            with stage_timer('predict_xg_differential'):
+                model_predictions['xg-differential'] = predict_xg_differential_batch(home_teams, away_teams, conn, payload.get('season'))
+        
+        predictions = []
+        for i, (home_team, away_team) in enumerate(zip(home_teams, away_teams)):
+            prediction = {"home_team": home_team, "away_team": away_team}
+            for model in models:
+                prediction[model] = model_predictions[model][i]
+            predictions.append(prediction)
+        
+        return json_response({
+            "models": models,
+            "model_versions": model_versions,
+            "league": league,
+            "season": season,
+            "total_fixtures": len(predictions),
+            "predictions": predictions
+        })
+        
+    except FileNotFoundError:
+        return dixon_coles_not_trained(league, season)
+    except Exception as e:
+        logger.error(f"Erro na predição em lote: {e}")
+        return jsonify({"error": "Erro interno do servidor"}), 500
+
 @app.route('/value-bets')
+@cached_response(value_bets_versions)
 def value_bets_endpoint():
     """Endpoint para listar apostas de valor"""
-    min_value = float(request.args.get('min_value', 0.05))  # 5% por padrão
+    try:
+        min_value = float(request.args.get('min_value', 0.05))  # 5% por padrão
+    except ValueError:
+        return jsonify({"error": "Parâmetro 'min_value' deve ser numérico"}), 400
+    try:
+        limit = parse_non_negative_int('limit')
+        offset = parse_non_negative_int('offset', 0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    league, season, window = parse_competition_args()
+    if window is None:
+        return jsonify({"error": "Parâmetro 'window' deve ser um inteiro positivo"}), 400
     
     try:
-        conn = create_connection(DB_FILE)
+        with stage_timer('connect'):
+            conn = get_connection(DB_FILE, read_only=True)
         if not conn:
             return jsonify({"error": "Erro de conexão com o banco de dados"}), 500
         
-        with open(MODEL_PARAMS_FILE, 'r') as f:
-            dixon_coles_params = json.load(f)
+        with stage_timer('model'):
+            dixon_coles_params, model_version = get_dixon_coles_model(league, season, window)
+        if league is None:
+            # O modelo global só precifica as temporadas com que foi treinado (parâmetros antigos, sem metadados: 2025)
+            trained_seasons = dixon_coles_params.get("metadata", {}).get("seasons", ["2025"])
+            if trained_seasons is not None and season not in trained_seasons:
+                return jsonify({"error": f"Modelo Dixon-Coles global treinado apenas com as temporadas {trained_seasons}. "
+                                         f"Informe 'league' para usar o modelo da competição na temporada {season}"}), 400
+        data_version = get_data_version(conn, "matches")
         
-        cursor = conn.cursor()
-        cursor.execute("SELECT home_team, away_team, avg_home_odds, avg_draw_odds, avg_away_odds FROM matches WHERE season = '2025' AND avg_home_odds IS NOT NULL AND avg_draw_odds IS NOT NULL AND avg_away_odds IS NOT NULL")
-        matches = cursor.fetchall()
+        # A varredura completa é refeita apenas quando o modelo ou as odds mudam
+        cache_key = (model_version, data_version, league, season)
+        all_bets = value_bets_cache.get(cache_key)
+        count_cache('value_bets', all_bets is not None)
+        if all_bets is None:
+            with stage_timer('query'):
+                matches_with_odds = load_matches_with_odds(conn, season, league)
+            with stage_timer('scan'):
+                all_bets = scan_value_bets(matches_with_odds, dixon_coles_params)
+            if len(value_bets_cache) >= VALUE_BETS_CACHE_SIZE:
+                value_bets_cache.clear()
+            value_bets_cache[cache_key] = all_bets
         
-        value_bets = []
+        # Lista ordenada por valor decrescente: as apostas acima do limiar formam um prefixo
+        total_value_bets = next((i for i, bet in enumerate(all_bets) if not bet["value"] > min_value), len(all_bets))
+        end = total_value_bets if limit is None else min(offset + limit, total_value_bets)
+        value_bets = all_bets[offset:end]
         
-        for match in matches:
-            home_team, away_team, avg_home_odds, avg_draw_odds, avg_away_odds = match
-            
-            prediction = predict_dixon_coles(home_team, away_team, dixon_coles_params)
-            
-            if prediction:
-                real_prob_home_win = prediction["home_win"]
-                real_prob_draw = prediction["draw"]
-                real_prob_away_win = prediction["away_win"]
-                
-                value_home_win = calculate_value_bet(real_prob_home_win, avg_home_odds)
-                value_draw = calculate_value_bet(real_prob_draw, avg_draw_odds)
-                value_away_win = calculate_value_bet(real_prob_away_win, avg_away_odds)
-                
-                if value_home_win > min_value:
-                    value_bets.append({
-                        "match": f"{home_team} vs {away_team}",
-                        "outcome": "Home Win",
-                        "real_prob": real_prob_home_win,
-                        "bookie_odds": avg_home_odds,
-                        "value": value_home_win
-                    })
-                if value_draw > min_value:
-                    value_bets.append({
-                        "match": f"{home_team} vs {away_team}",
-                        "outcome": "Draw",
-                        "real_prob": real_prob_draw,
-                        "bookie_odds": avg_draw_odds,
-                        "value": value_draw
-                    })
-                if value_away_win > min_value:
-                    value_bets.append({
-                        "match": f"{home_team} vs {away_team}",
-                        "outcome": "Away Win",
-                        "real_prob": real_prob_away_win,
-                        "bookie_odds": avg_away_odds,
-                        "value": value_away_win
-                    })
-        
-        # Ordena por valor decrescente
-        value_bets.sort(key=lambda x: x["value"], reverse=True)
-        
-        conn.close()
-        
-        return jsonify({
+        return json_response({
+            "model_version": model_version,
+            "data_version": data_version,
+            "league": league,
+            "season": season,
             "min_value_threshold": min_value,
-            "total_value_bets": len(value_bets),
+            "total_value_bets": total_value_bets,
+            "offset": offset,
+            "limit": limit,
             "value_bets": value_bets
         })
         
+    except FileNotFoundError:
+        return dixon_coles_not_trained(league, season)
     except Exception as e:
         logger.error(f"Erro ao calcular apostas de valor: {e}")
         return jsonify({"error": "Erro interno do servidor"}), 500
 
+@app.route('/upload', methods=['POST'])
+def upload_endpoint():
+    """Endpoint para envio de CSV de jogos; o processamento roda em segundo plano"""
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({"error": "Campo 'file' é obrigatório"}), 400
+        stream, filename = upload.stream, upload.filename
+    else:
+        stream, filename = request.stream, request.args.get('filename')
+    if filename and not filename.lower().endswith('.csv'):
+        return jsonify({"error": "Apenas arquivos CSV são aceitos"}), 400
+    
+    try:
+        file_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}.csv")
+        size = save_upload_stream(stream, file_path)
+        if size is None:
+            return jsonify({"error": f"Arquivo maior que o limite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MiB"}), 413
+        if size == 0:
+            os.remove(file_path)
+            return jsonify({"error": "Arquivo vazio"}), 400
+        
+        conn = get_connection(DB_FILE)
+        if not conn:
+            return jsonify({"error": "Erro de conexão com o banco de dados"}), 500
+        job_id = create_job(conn, file_path)
+        
+        try:
+            start_job_worker()
+        except OSError as e:
+            # O job continua na fila e será processado na próxima execução do worker
+            logger.error(f"Erro ao iniciar o worker de jobs: {e}")
+        
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "size_bytes": size,
+            "status_url": url_for('job_status_endpoint', job_id=job_id)
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"Erro no envio de arquivo: {e}")
+        return jsonify({"error": "Erro interno do servidor"}), 500
+
+@app.route('/jobs/<int:job_id>')
+def job_status_endpoint(job_id):
+    """Endpoint com o status de um job de ingestão"""
+    try:
+        conn = get_connection(DB_FILE, read_only=True)
+        if not conn:
+            return jsonify({"error": "Erro de conexão com o banco de dados"}), 500
+        
+        job = get_job(conn, job_id)
+        if job is None:
+            return jsonify({"error": "Job não encontrado"}), 404
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"Erro ao consultar job: {e}")
+        return jsonify({"error": "Erro interno do servidor"}), 500
+
 @app.route('/teams')
+@cached_response(lambda: current_data_versions('matches'))
 def teams_endpoint():
     """Endpoint para listar times disponíveis"""
     try:
-        conn = create_connection(DB_FILE)
+        with stage_timer('connect'):
+            conn = get_connection(DB_FILE, read_only=True)
         if not conn:
             return jsonify({"error": "Erro de conexão com o banco de dados"}), 500
         
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT home_team FROM matches WHERE season = '2025' UNION SELECT DISTINCT away_team FROM matches WHERE season = '2025' ORDER BY home_team")
-        teams = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        with stage_timer('query'):
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT home_team FROM matches WHERE season = '2025' UNION SELECT DISTINCT away_team FROM matches WHERE season = '2025' ORDER BY home_team")
+            teams = [row[0] for row in cursor.fetchall()]
         
-        return jsonify({
+        return json_response({
             "total_teams": len(teams),
             "teams": teams
         })
@@ -281,6 +739,27 @@ def teams_endpoint():
         logger.error(f"Erro ao listar times: {e}")
         return jsonify({"error": "Erro interno do servidor"}), 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Endpoint com as métricas do worker no formato texto do Prometheus"""
+    set_model_versions(model_registry.loaded_versions())
+    conn = get_connection(DB_FILE, read_only=True)
+    if conn:
+        for table, version in get_all_data_versions(conn).items():
+            DATA_VERSION.set(version, table=table)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/profile')
+def profile_endpoint():
+    """Endpoint com as pilhas amostradas pelo profiler (formato collapsed, para flame graphs)"""
+    if profiler is None:
+        return jsonify({"error": "Profiler desativado. Inicie a API com PROFILER=1 para ativá-lo"}), 404
+    limit = request.args.get('limit', type=int)
+    stacks = profiler.collapsed(limit)
+    if request.args.get('reset', 'false').lower() in ('1', 'true', 'yes'):
+        profiler.reset()
+    return Response(stacks, mimetype='text/plain')
+
 if __name__ == '__main__':
     logger.info("Iniciando a aplicação Aurora13 API...")
     app.run(host='0.0.0.0', port=5000, debug=True)
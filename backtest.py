@@ -0,0 +1,212 @@
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from calculate_bet_value import calculate_value_bet
+from competitions import list_competitions
+from db import DB_FILE, create_connection
+from migrations import add_column_if_missing
+from dixon_coles_model import fit_dixon_coles, poisson_log_rates, prepare_match_arrays
+from parquet_snapshots import read_matches
+from score_matrix import outcome_probabilities
+
+# Backtest walk-forward do Dixon-Coles de uma liga: a cada semana, o modelo é reajustado com todos os jogos
+# anteriores da liga (temporada atual e a anterior), partindo dos parâmetros da semana anterior, e prevê os
+# jogos da semana. As previsões são avaliadas com log-loss, Brier e o ROI das apostas de valor contra as odds
+# de fechamento. O ajuste semanal usa uma penalidade ridge e só avalia jogos entre times com um mínimo de
+# jogos no treino: sem isso, o ajuste por máxima verossimilhança com poucos jogos (times recém-promovidos,
+# primeiras rodadas) produz forças extremas e "apostas de valor" que medem overfitting, não vantagem.
+VALUE_THRESHOLD = 0.05
+MIN_TRAINING_MATCHES = 100
+MIN_TEAM_MATCHES = 10
+RIDGE_PENALTY = 10.0
+BACKTEST_COLUMNS = ["id", "date", "season", "home_team", "away_team", "home_goals", "away_goals",
+                    "psc_home_odds", "psc_draw_odds", "psc_away_odds",
+                    "avg_c_home_odds", "avg_c_draw_odds", "avg_c_away_odds"]
+
+def create_backtest_results_table(conn):
+    """ Cria a tabela com o resumo de cada temporada de cada execução do backtest. """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backtest_results (
+            run_id TEXT NOT NULL,
+            season TEXT NOT NULL,
+            weeks INTEGER NOT NULL,
+            fits INTEGER NOT NULL,
+            matches INTEGER NOT NULL,
+            log_loss REAL,
+            brier REAL,
+            market_log_loss REAL,
+            bets INTEGER NOT NULL,
+            profit REAL NOT NULL,
+            roi REAL,
+            value_threshold REAL NOT NULL,
+            elapsed_seconds REAL NOT NULL,
+            PRIMARY KEY (run_id, season)
+        );
+    """)
+    # Colunas das execuções por liga, com a regularização usada
+    add_column_if_missing(conn, "backtest_results", "league", "TEXT")
+    add_column_if_missing(conn, "backtest_results", "min_team_matches", "INTEGER")
+    add_column_if_missing(conn, "backtest_results", "ridge", "REAL")
+
+def _closing_odds(df):
+    """ Odds de fechamento (casa, empate, fora): Pinnacle, ou a média de fechamento quando ela falta. """
+    pinnacle = df[["psc_home_odds", "psc_draw_odds", "psc_away_odds"]].to_numpy(dtype=float)
+    average = df[["avg_c_home_odds", "avg_c_draw_odds", "avg_c_away_odds"]].to_numpy(dtype=float)
+    return np.where(np.isnan(pinnacle), average, pinnacle)
+
+def score_predictions(probs, outcomes, odds, value_threshold=VALUE_THRESHOLD):
+    """ Somas de log-loss, Brier e log-loss do mercado, e apostas/lucro das apostas de valor (1 unidade cada). """
+    rows = np.arange(len(outcomes))
+    actual = np.zeros_like(probs)
+    actual[rows, outcomes] = 1.0
+
+    log_loss = -np.log(np.clip(probs[rows, outcomes], 1e-15, 1.0)).sum()
+    brier = ((probs - actual) ** 2).sum()
+
+    # Probabilidades implícitas do mercado, sem a margem da casa
+    implied = 1.0 / odds
+    market_probs = implied / implied.sum(axis=1, keepdims=True)
+    has_odds = ~np.isnan(market_probs).any(axis=1)
+    market_log_loss = -np.log(np.clip(market_probs[rows[has_odds], outcomes[has_odds]], 1e-15, 1.0)).sum()
+
+    bets = (calculate_value_bet(probs, odds) > value_threshold) & ~np.isnan(odds)
+    profit = np.where(actual > 0, odds - 1.0, -1.0)[bets].sum()
+    return {"log_loss": log_loss, "brier": brier, "market_log_loss": market_log_loss,
+            "market_matches": int(has_odds.sum()), "bets": int(bets.sum()), "profit": float(profit)}
+
+def backtest_season(league, season, training_seasons, db_file=DB_FILE, value_threshold=VALUE_THRESHOLD,
+                    min_training_matches=MIN_TRAINING_MATCHES, min_team_matches=MIN_TEAM_MATCHES, ridge=RIDGE_PENALTY):
+    """ Executado num processo do pool: walk-forward semanal de uma temporada da liga.
+    Os times têm índices fixos durante toda a temporada, então o vetor ajustado numa semana
+    serve diretamente como ponto de partida (warm start) da semana seguinte. """
+    started = time.perf_counter()
+    conn = create_connection(db_file)
+    if conn is None:
+        raise RuntimeError(f"Não foi possível conectar ao banco de dados {db_file}")
+    try:
+        df = read_matches(conn, BACKTEST_COLUMNS, training_seasons, [league])
+    finally:
+        conn.close()
+
+    df = df.dropna(subset=["home_goals", "away_goals"])
+    df["date"] = pd.to_datetime(df["date"], format="%d/%m/%Y", errors="coerce")
+    df = df.dropna(subset=["date"]).sort_values(["date", "id"], kind="stable").reset_index(drop=True)
+    df["week"] = df["date"] - pd.to_timedelta(df["date"].dt.dayofweek, unit="D")
+
+    all_teams = pd.concat([df["home_team"], df["away_team"]]).unique()
+    team_to_index = {team: i for i, team in enumerate(all_teams)}
+    num_teams = len(all_teams)
+    home_indices = df["home_team"].map(team_to_index).to_numpy()
+    away_indices = df["away_team"].map(team_to_index).to_numpy()
+    home_goals = df["home_goals"].to_numpy(dtype=float)
+    away_goals = df["away_goals"].to_numpy(dtype=float)
+    outcomes = np.select([home_goals > away_goals, home_goals == away_goals], [0, 1], 2)
+    odds = _closing_odds(df)
+    weeks = df["week"].to_numpy()
+
+    totals = {"log_loss": 0.0, "brier": 0.0, "market_log_loss": 0.0, "market_matches": 0, "bets": 0, "profit": 0.0}
+    params = None
+    num_weeks = num_fits = num_matches = 0
+    for week in np.unique(weeks[(df["season"] == str(season)).to_numpy()]):
+        train = weeks < week
+        if train.sum() < min_training_matches:
+            continue
+        test = (weeks == week) & (df["season"] == str(season)).to_numpy()
+
+        params = fit_dixon_coles(prepare_match_arrays(home_goals[train], away_goals[train], home_indices[train], away_indices[train]),
+                                 num_teams, params, ridge=ridge)
+        num_fits += 1
+
+        # Só avalia jogos entre times com jogos suficientes no treino para uma estimativa estável
+        team_matches = np.bincount(home_indices[train], minlength=num_teams) + np.bincount(away_indices[train], minlength=num_teams)
+        known = team_matches >= max(min_team_matches, 1)
+        test &= known[home_indices] & known[away_indices]
+        if not test.any():
+            continue
+
+        log_lambda, log_mu = poisson_log_rates(params, home_indices[test], away_indices[test], num_teams)
+        probs = np.column_stack(outcome_probabilities(np.exp(log_lambda), np.exp(log_mu)))
+        for key, value in score_predictions(probs, outcomes[test], odds[test], value_threshold).items():
+            totals[key] += value
+        num_weeks += 1
+        num_matches += int(test.sum())
+
+    return {
+        "league": league,
+        "season": str(season),
+        "weeks": num_weeks,
+        "fits": num_fits,
+        "matches": num_matches,
+        "log_loss": totals["log_loss"] / num_matches if num_matches else None,
+        "brier": totals["brier"] / num_matches if num_matches else None,
+        "market_log_loss": totals["market_log_loss"] / totals["market_matches"] if totals["market_matches"] else None,
+        "bets": totals["bets"],
+        "profit": totals["profit"],
+        "roi": totals["profit"] / totals["bets"] if totals["bets"] else None,
+        "value_threshold": value_threshold,
+        "min_team_matches": min_team_matches,
+        "ridge": ridge,
+        "elapsed_seconds": time.perf_counter() - started
+    }
+
+def run_backtest(conn, league=None, seasons=None, value_threshold=VALUE_THRESHOLD, max_workers=None, db_file=DB_FILE,
+                 min_team_matches=MIN_TEAM_MATCHES, ridge=RIDGE_PENALTY):
+    """ Roda o backtest das temporadas pedidas (todas, se None) de uma liga em paralelo, uma por processo,
+    e grava o resumo de cada uma em backtest_results. A liga pode ser omitida se o banco tiver uma só.
+    Levanta ValueError para liga ou temporadas inexistentes. Retorna (run_id, resultados). """
+    competitions = list_competitions(conn)
+    if league is None:
+        if len(competitions) != 1:
+            raise ValueError(f"Informe a liga do backtest; ligas disponíveis: {sorted(competitions)}")
+        league = next(iter(competitions))
+    if league not in competitions:
+        raise ValueError(f"Liga '{league}' não encontrada; ligas disponíveis: {sorted(competitions)}")
+    all_seasons = competitions[league]
+    seasons = all_seasons if seasons is None else [str(season) for season in seasons]
+    unknown = [season for season in seasons if season not in all_seasons]
+    if unknown:
+        raise ValueError(f"Temporada(s) {unknown} sem jogos da liga '{league}'; disponíveis: {all_seasons}")
+    # Cada temporada treina também com a anterior, para já prever as primeiras rodadas
+    training_seasons = [all_seasons[max(0, all_seasons.index(season) - 1):all_seasons.index(season) + 1] for season in seasons]
+
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    count = len(seasons)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(backtest_season, [league] * count, seasons, training_seasons,
+                                    [db_file] * count, [value_threshold] * count, [MIN_TRAINING_MATCHES] * count,
+                                    [min_team_matches] * count, [ridge] * count))
+
+    columns = ["league", "season", "weeks", "fits", "matches", "log_loss", "brier", "market_log_loss",
+               "bets", "profit", "roi", "value_threshold", "min_team_matches", "ridge", "elapsed_seconds"]
+    create_backtest_results_table(conn)
+    conn.executemany(f"INSERT INTO backtest_results (run_id, {', '.join(columns)}) VALUES (?, {', '.join('?' for _ in columns)})",
+                     [(run_id, *(result[column] for column in columns)) for result in results])
+    conn.commit()
+    return run_id, results
+
+if __name__ == '__main__':
+    # Uso: python backtest.py [--league LIGA] [--season TEMPORADA] [--threshold 0.05]
+    #                         [--min-team-matches 10] [--ridge 10]
+    def _arg(flag, default=None):
+        return sys.argv[sys.argv.index(flag) + 1] if flag in sys.argv else default
+
+    conn = create_connection(DB_FILE)
+    if conn:
+        season = _arg("--season")
+        started = time.perf_counter()
+        try:
+            run_id, results = run_backtest(conn, _arg("--league"), None if season is None else [season],
+                                           float(_arg("--threshold", VALUE_THRESHOLD)),
+                                           min_team_matches=int(_arg("--min-team-matches", MIN_TEAM_MATCHES)),
+                                           ridge=float(_arg("--ridge", RIDGE_PENALTY)))
+        except ValueError as e:
+            print(f"Erro: {e}")
+            conn.close()
+            sys.exit(1)
+        print(f"Backtest {run_id} ({time.perf_counter() - started:.1f}s):")
+        print(pd.DataFrame(results).drop(columns=["value_threshold", "min_team_matches", "ridge"])
+              .to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+        conn.close()
@@ -0,0 +1,137 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from calculate_bet_value import load_matches_with_odds, scan_value_bets
+from db import create_connection
+from dixon_coles_model import (dixon_coles_gradient, dixon_coles_log_likelihood, predict_dixon_coles,
+                               predict_dixon_coles_batch, prepare_match_arrays, train_dixon_coles_model)
+from ingest_data import create_table, ingest_csv_to_db
+from skellam_bayesian_model import predict_skellam_bayesian, train_skellam_bayesian_model
+from synthetic_league import create_synthetic_database, generate_matches, write_csv
+from xg_differential_model import predict_xg_differential
+
+# Micro-benchmarks dos caminhos principais sobre ligas sintéticas de tamanhos configuráveis.
+# Cada cenário roda num diretório temporário (banco, parâmetros e caches), sem tocar nos arquivos do projeto.
+DEFAULT_SCENARIOS = [
+    {"teams": 20, "seasons": 1},
+    {"teams": 20, "seasons": 5},
+    {"teams": 40, "seasons": 1},
+]
+PREDICTION_CALLS = 200
+BATCH_SIZE = 1000
+
+def measure(function, repeat=5, number=1):
+    """ Executa `function` number vezes por rodada, em `repeat` rodadas, e retorna o tempo por chamada
+    (em segundos) da melhor rodada e da mediana. A saída impressa pela função é descartada. """
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                function()
+            timings.append((time.perf_counter() - started) / number)
+    return {"best": min(timings), "median": float(np.median(timings))}
+
+def run_scenario(teams=20, seasons=1, matches=None, leagues=1, seed=0, skellam=True):
+    """ Gera o banco sintético do cenário e mede treino, previsão, varredura de valor e ingestão. """
+    results = {"teams": teams, "seasons": seasons, "leagues": leagues}
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                generated = create_synthetic_database("synthetic.db", teams, seasons, matches, leagues, seed)
+            conn = create_connection("synthetic.db")
+            last_season = str(generated["Season"].max())
+            home_team, away_team = generated["Home"].iloc[0], generated["Away"].iloc[0]
+            results["matches"] = len(generated)
+
+            # Log-verossimilhança e gradiente do Dixon-Coles com todos os jogos
+            all_teams = pd.concat([generated["Home"], generated["Away"]]).unique()
+            team_to_index = {team: i for i, team in enumerate(all_teams)}
+            match_arrays = prepare_match_arrays(generated["HG"], generated["AG"],
+                                                generated["Home"].map(team_to_index), generated["Away"].map(team_to_index))
+            params = np.random.default_rng(seed).normal(0.0, 0.1, 2 * len(all_teams) + 1)
+            args = (*match_arrays[:4], len(all_teams), match_arrays[4])
+            results["dixon_coles_log_likelihood"] = measure(lambda: dixon_coles_log_likelihood(params, *args), number=100)
+            results["dixon_coles_gradient"] = measure(lambda: dixon_coles_gradient(params, *args), number=100)
+
+            # Treinos (todas as temporadas para o Dixon-Coles; a última para o Skellam)
+            results["dixon_coles_train"] = measure(lambda: train_dixon_coles_model(conn, seasons=None), repeat=3)
+            with contextlib.redirect_stdout(io.StringIO()):
+                model_params = train_dixon_coles_model(conn, seasons=None)
+            results["dixon_coles_predict"] = measure(lambda: predict_dixon_coles(home_team, away_team, model_params), number=PREDICTION_CALLS)
+            batch_home = generated["Home"].tolist()[:BATCH_SIZE]
+            batch_away = generated["Away"].tolist()[:BATCH_SIZE]
+            results["dixon_coles_predict_batch"] = measure(lambda: predict_dixon_coles_batch(batch_home, batch_away, model_params))
+            results["dixon_coles_predict_batch"]["fixtures"] = len(batch_home)
+
+            if skellam:
+                results["skellam_train"] = measure(lambda: train_skellam_bayesian_model(conn, last_season), repeat=1)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    posterior = train_skellam_bayesian_model(conn, last_season)
+                results["skellam_predict"] = measure(lambda: predict_skellam_bayesian(home_team, away_team, posterior), number=PREDICTION_CALLS)
+
+            # A primeira chamada materializa os agregados de xG; as seguintes medem a consulta em cache
+            predict_xg_differential(home_team, away_team, conn)
+            results["xg_differential_predict"] = measure(lambda: predict_xg_differential(home_team, away_team, conn), number=PREDICTION_CALLS)
+
+            matches_with_odds = load_matches_with_odds(conn, last_season)
+            results["value_bets_scan"] = measure(lambda: scan_value_bets(matches_with_odds, model_params))
+            results["value_bets_scan"]["matches"] = len(matches_with_odds)
+            conn.close()
+
+            # Ingestão de um CSV novo (jogos inéditos) num banco vazio
+            write_csv(generate_matches(teams, seasons, matches, leagues, seed=seed + 1), "ingest.csv")
+
+            def ingest_fresh():
+                if os.path.exists("ingest.db"):
+                    os.remove("ingest.db")
+                ingest_conn = create_connection("ingest.db")
+                create_table(ingest_conn)
+                ingest_csv_to_db(ingest_conn, "ingest.csv")
+                ingest_conn.close()
+            results["ingest"] = measure(ingest_fresh, repeat=3)
+            results["ingest"]["rows_per_second"] = len(generated) / results["ingest"]["best"]
+        finally:
+            os.chdir(previous_dir)
+    return results
+
+def format_results(results):
+    """ Tabela resumida (melhor tempo por chamada) de todos os cenários. """
+    rows = []
+    for scenario in results:
+        for name, timing in scenario.items():
+            if isinstance(timing, dict):
+                rows.append({"teams": scenario["teams"], "seasons": scenario["seasons"], "matches": scenario["matches"],
+                             "benchmark": name, "best_ms": timing["best"] * 1e3, "median_ms": timing["median"] * 1e3})
+    return pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.3f}")
+
+if __name__ == '__main__':
+    # Uso: python benchmark.py [--teams 20,40] [--seasons 1,5] [--leagues N] [--no-skellam] [--output resultados.json]
+    def _arg(flag, default=None):
+        return sys.argv[sys.argv.index(flag) + 1] if flag in sys.argv else default
+
+    if "--teams" in sys.argv or "--seasons" in sys.argv:
+        scenarios = [{"teams": int(teams), "seasons": int(seasons)}
+                     for teams in _arg("--teams", "20").split(",") for seasons in _arg("--seasons", "1").split(",")]
+    else:
+        scenarios = DEFAULT_SCENARIOS
+
+    results = []
+    for scenario in scenarios:
+        print(f"Cenário: {scenario['teams']} times, {scenario['seasons']} temporada(s)...")
+        results.append(run_scenario(**scenario, leagues=int(_arg("--leagues", 1)), skellam="--no-skellam" not in sys.argv))
+    print(format_results(results))
+
+    output_file = _arg("--output")
+    if output_file:
+        with open(output_file, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Resultados salvos em {output_file}")
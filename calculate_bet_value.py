@@ -1,18 +1,12 @@
 
-import sqlite3
 import json
 import numpy as np
-from dixon_coles_model import predict_dixon_coles, DB_FILE, MODEL_PARAMS_FILE
-
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file)
-        print(f"Conexão com o banco de dados {db_file} estabelecida.")
-    except sqlite3.Error as e:
-        print(e)
-    return conn
+import pandas as pd
+from db import DB_FILE, create_connection
+from dixon_coles_model import batch_rates, MODEL_PARAMS_FILE
+from score_matrix import outcome_probabilities
+
+OUTCOMES = ["Home Win", "Draw", "Away Win"]
 
 def calculate_value_bet(real_prob, bookie_odds):
     """ Calcula o valor de uma aposta. """
@@ -25,6 +19,45 @@ def calculate_value_bet(real_prob, bookie_odds):
     value = (real_prob / implied_prob) - 1
     return value
 
+def load_matches_with_odds(conn, season="2025", league=None):
+    """ Lê os jogos da temporada (e, opcionalmente, da liga) que têm as três odds médias, em ordem estável (por id). """
+    query_params = [str(season)]
+    league_filter = ""
+    if league is not None:
+        league_filter = "AND league = ? "
+        query_params.append(league)
+    return pd.read_sql_query(
+        "SELECT home_team, away_team, avg_home_odds, avg_draw_odds, avg_away_odds FROM matches "
+        f"WHERE season = ? {league_filter}AND avg_home_odds IS NOT NULL AND avg_draw_odds IS NOT NULL AND avg_away_odds IS NOT NULL "
+        "ORDER BY id", conn, params=query_params)
+
+def scan_value_bets(matches_df, model_params):
+    """ Calcula o valor de todos os resultados (casa, empate, fora) de todos os jogos numa única
+    operação de arrays. Retorna todas as apostas candidatas ordenadas por valor decrescente;
+    empates mantêm a ordem dos jogos e dos resultados (ordenação estável).
+    Como a lista está ordenada, as apostas acima de um limiar formam sempre um prefixo dela. """
+    known, lambda_home, mu_away = batch_rates(matches_df["home_team"].tolist(), matches_df["away_team"].tolist(), model_params)
+    known_matches = matches_df[known]
+    if known_matches.empty:
+        return []
+
+    real_probs = np.column_stack(outcome_probabilities(lambda_home, mu_away))
+    bookie_odds = known_matches[["avg_home_odds", "avg_draw_odds", "avg_away_odds"]].to_numpy(dtype=float)
+    values = calculate_value_bet(real_probs, bookie_odds)
+
+    # Achata (jogo, resultado) na ordem jogo a jogo e ordena de forma estável por valor decrescente
+    order = np.argsort(-values.ravel(), kind="stable")
+    match_labels = (known_matches["home_team"] + " vs " + known_matches["away_team"]).tolist()
+    match_index, outcome_index = np.divmod(order, len(OUTCOMES))
+
+    return [{
+        "match": match_labels[m],
+        "outcome": OUTCOMES[o],
+        "real_prob": float(real_probs[m, o]),
+        "bookie_odds": float(bookie_odds[m, o]),
+        "value": float(values[m, o])
+    } for m, o in zip(match_index, outcome_index)]
+
 if __name__ == '__main__':
     conn = create_connection(DB_FILE)
     if conn:
@@ -37,56 +70,17 @@ if __name__ == '__main__':
             conn.close()
             exit()
 
-        cursor = conn.cursor()
-        # Seleciona jogos da temporada 2025 com odds médias
-        cursor.execute("SELECT home_team, away_team, avg_home_odds, avg_draw_odds, avg_away_odds FROM matches WHERE season = '2025' AND avg_home_odds IS NOT NULL AND avg_draw_odds IS NOT NULL AND avg_away_odds IS NOT NULL")
-        matches = cursor.fetchall()
+        # Seleciona jogos da temporada 2025 com odds médias e calcula o valor de todos os resultados de uma vez
+        matches_df = load_matches_with_odds(conn)
 
         print("\n--- Análise de Valor de Apostas ---")
-        value_bets = []
-
-        for match in matches:
-            home_team, away_team, avg_home_odds, avg_draw_odds, avg_away_odds = match
-
-            # Previsão do modelo Dixon-Coles
-            prediction = predict_dixon_coles(home_team, away_team, dixon_coles_params)
-            
-            if prediction:
-                real_prob_home_win = prediction["home_win"]
-                real_prob_draw = prediction["draw"]
-                real_prob_away_win = prediction["away_win"]
-
-                # Calcula o valor para cada resultado
-                value_home_win = calculate_value_bet(real_prob_home_win, avg_home_odds)
-                value_draw = calculate_value_bet(real_prob_draw, avg_draw_odds)
-                value_away_win = calculate_value_bet(real_prob_away_win, avg_away_odds)
-
-                # Define um limiar para considerar uma aposta de valor (ex: > 0%)
-                if value_home_win > 0.05: # 5% de valor esperado
-                    value_bets.append({
-                        "match": f"{home_team} vs {away_team}",
-                        "outcome": "Home Win",
-                        "real_prob": f"{real_prob_home_win:.2%}",
-                        "bookie_odds": avg_home_odds,
-                        "value": f"{value_home_win:.2%}"
-                    })
-                if value_draw > 0.05:
-                    value_bets.append({
-                        "match": f"{home_team} vs {away_team}",
-                        "outcome": "Draw",
-                        "real_prob": f"{real_prob_draw:.2%}",
-                        "bookie_odds": avg_draw_odds,
-                        "value": f"{value_draw:.2%}"
-                    })
-                if value_away_win > 0.05:
-                    value_bets.append({
-                        "match": f"{home_team} vs {away_team}",
-                        "outcome": "Away Win",
-                        "real_prob": f"{real_prob_away_win:.2%}",
-                        "bookie_odds": avg_away_odds,
-                        "value": f"{value_away_win:.2%}"
-                    })
-        
+        # Define um limiar para considerar uma aposta de valor: 5% de valor esperado
+        value_bets = [{
+            **bet,
+            "real_prob": f"{bet['real_prob']:.2%}",
+            "value": f"{bet['value']:.2%}"
+        } for bet in scan_value_bets(matches_df, dixon_coles_params) if bet["value"] > 0.05]
+
         if value_bets:
             print("Apostas de Valor Encontradas (Valor Esperado > 5%):")
             for bet in value_bets:
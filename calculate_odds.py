@@ -1,50 +1,53 @@
 
 import sqlite3
-import pandas as pd
-
-DB_FILE = "database.db"
-
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
+from data_versions import bump_data_version
+from db import DB_FILE, create_connection
+from migrations import apply_migrations
+from parquet_snapshots import write_snapshots
+
+# Colunas de origem de cada odd média: Pinnacle, máxima e média de fechamento
+AVERAGE_ODDS_SOURCES = {
+    "avg_home_odds": ["psc_home_odds", "max_c_home_odds", "avg_c_home_odds"],
+    "avg_draw_odds": ["psc_draw_odds", "max_c_draw_odds", "avg_c_draw_odds"],
+    "avg_away_odds": ["psc_away_odds", "max_c_away_odds", "avg_c_away_odds"]
+}
+
+def _average_expression(columns):
+    """ Média em SQL ignorando valores NULL (como o mean do pandas); NULL se todas forem NULL. """
+    total = " + ".join(f"COALESCE({column}, 0.0)" for column in columns)
+    count = " + ".join(f"({column} IS NOT NULL)" for column in columns)
+    return f"({total}) / NULLIF({count}, 0)"
+
+def calculate_average_odds(conn, only_changed=True):
+    """ Calcula as odds médias e as adiciona à tabela de jogos com um único UPDATE.
+    Com only_changed=True, apenas os jogos cuja média gravada difere da recalculada (ou seja,
+    cujas odds de origem mudaram ou que ainda não têm média) são escritos. Retorna o número de jogos atualizados. """
     try:
-        conn = sqlite3.connect(db_file)
-    except sqlite3.Error as e:
-        print(e)
-    return conn
+        # Garante as colunas de odds médias (migração idempotente, segura para reexecuções)
+        apply_migrations(conn)
 
-def calculate_average_odds(conn):
-    """ Calcula as odds médias e as adiciona à tabela de jogos """
-    try:
-        df = pd.read_sql_query("SELECT id, psc_home_odds, psc_draw_odds, psc_away_odds, max_c_home_odds, max_c_draw_odds, max_c_away_odds, avg_c_home_odds, avg_c_draw_odds, avg_c_away_odds FROM matches", conn)
-
-        # Calcula a média das odds de casa
-        df["avg_home_odds"] = df[["psc_home_odds", "max_c_home_odds", "avg_c_home_odds"]].mean(axis=1)
-        # Calcula a média das odds de empate
-        df["avg_draw_odds"] = df[["psc_draw_odds", "max_c_draw_odds", "avg_c_draw_odds"]].mean(axis=1)
-        # Calcula a média das odds de fora
-        df["avg_away_odds"] = df[["psc_away_odds", "max_c_away_odds", "avg_c_away_odds"]].mean(axis=1)
-
-        # Atualiza o banco de dados com as novas colunas
-        cursor = conn.cursor()
-        cursor.execute("ALTER TABLE matches ADD COLUMN avg_home_odds REAL")
-        cursor.execute("ALTER TABLE matches ADD COLUMN avg_draw_odds REAL")
-        cursor.execute("ALTER TABLE matches ADD COLUMN avg_away_odds REAL")
-        conn.commit()
+        expressions = {column: _average_expression(sources) for column, sources in AVERAGE_ODDS_SOURCES.items()}
+        query = "UPDATE matches SET " + ", ".join(f"{column} = {expression}" for column, expression in expressions.items())
+        if only_changed:
+            query += " WHERE " + " OR ".join(f"{column} IS NOT {expression}" for column, expression in expressions.items())
 
-        for index, row in df.iterrows():
-            cursor.execute("UPDATE matches SET avg_home_odds = ?, avg_draw_odds = ?, avg_away_odds = ? WHERE id = ?",
-                           (row["avg_home_odds"], row["avg_draw_odds"], row["avg_away_odds"], row["id"]))
+        updated = conn.execute(query).rowcount
+        if updated:
+            bump_data_version(conn, "matches")
         conn.commit()
-        print("Odds médias calculadas e adicionadas à tabela matches.")
+        print(f"Odds médias calculadas e adicionadas à tabela matches ({updated} jogos atualizados).")
+        return updated
 
     except sqlite3.Error as e:
+        conn.rollback()
         print(f"Erro ao calcular odds médias: {e}")
+        return None
 
 if __name__ == '__main__':
     conn = create_connection(DB_FILE)
     if conn:
         calculate_average_odds(conn)
+        write_snapshots(conn)
         conn.close()
 
 
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from db import DB_FILE, create_connection
+from dixon_coles_model import MODEL_NAME, retrain_dixon_coles_incremental
+
+# Um modelo Dixon-Coles por competição (liga, temporada), com parâmetros em arquivos separados.
+# Com window > 1, o modelo da temporada usa também as (window - 1) temporadas anteriores da liga.
+COMPETITION_PARAMS_FOLDER = "dixon_coles_params"
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-")
+
+def competition_key(league, season, window=1):
+    """ Identificador da competição usado nos nomes de arquivos e no registro de modelos.
+    O slug deixa o nome legível, mas não é injetivo ("Serie A" e "Serie-A" dão o mesmo slug); o sufixo
+    com o hash da liga e da temporada originais evita que duas competições dividam o mesmo arquivo. """
+    raw = "\x1f".join([str(league), str(season)])
+    key = f"{_slug(league)}_{_slug(season)}_{hashlib.sha256(raw.encode()).hexdigest()[:8]}"
+    return key if window == 1 else f"{key}_w{window}"
+
+def competition_model_name(league, season, window=1):
+    return f"{MODEL_NAME}_{competition_key(league, season, window)}"
+
+def competition_params_file(league, season, window=1, folder=COMPETITION_PARAMS_FOLDER):
+    return os.path.join(folder, f"{competition_key(league, season, window)}.json")
+
+def list_competitions(conn):
+    """ Lista as temporadas de cada liga presentes em matches: {liga: [temporadas em ordem]}. """
+    competitions = {}
+    for league, season in conn.execute("SELECT DISTINCT league, season FROM matches WHERE league IS NOT NULL AND season IS NOT NULL ORDER BY league, season"):
+        competitions.setdefault(league, []).append(str(season))
+    return competitions
+
+def competition_windows(competitions, window=1, leagues=None, seasons=None):
+    """ Monta a lista de treinos (liga, temporada, temporadas usadas no treino). """
+    tasks = []
+    for league, league_seasons in competitions.items():
+        if leagues is not None and league not in leagues:
+            continue
+        for i, season in enumerate(league_seasons):
+            if seasons is not None and season not in seasons:
+                continue
+            tasks.append((league, season, league_seasons[max(0, i - window + 1):i + 1]))
+    return tasks
+
+def train_competition(league, season, training_seasons, window=1, db_file=DB_FILE, folder=COMPETITION_PARAMS_FOLDER):
+    """ Executado num processo do pool: abre a própria conexão e retreina (de forma incremental)
+    o modelo da competição. Retorna (liga, temporada, número de times). """
+    conn = create_connection(db_file)
+    if conn is None:
+        raise RuntimeError(f"Não foi possível conectar ao banco de dados {db_file}")
+    try:
+        model_params = retrain_dixon_coles_incremental(
+            conn, training_seasons, competition_params_file(league, season, window, folder),
+            leagues=[league], model_name=competition_model_name(league, season, window))
+    finally:
+        conn.close()
+    return league, season, len(model_params["attack"])
+
+def train_all_competitions(conn, window=1, leagues=None, seasons=None, max_workers=None,
+                           db_file=DB_FILE, folder=COMPETITION_PARAMS_FOLDER):
+    """ Treina em paralelo, num pool de processos, um modelo por competição (liga, temporada).
+    Retorna {(liga, temporada): número de times}; competições com erro ficam de fora e são reportadas. """
+    tasks = competition_windows(list_competitions(conn), window, leagues, seasons)
+    os.makedirs(folder, exist_ok=True)
+
+    trained = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(train_competition, league, season, training_seasons, window, db_file, folder): (league, season)
+                   for league, season, training_seasons in tasks}
+        for future in as_completed(futures):
+            league, season = futures[future]
+            try:
+                trained[(league, season)] = future.result()[2]
+            except Exception as e:
+                print(f"Erro no treino de {league} {season}: {e}")
+    print(f"{len(trained)} de {len(tasks)} competições treinadas.")
+    return trained
+
+if __name__ == '__main__':
+    # Uso: python competitions.py [--window N] [--league LIGA] [--season TEMPORADA]
+    def _arg(flag, default=None):
+        return sys.argv[sys.argv.index(flag) + 1] if flag in sys.argv else default
+
+    conn = create_connection(DB_FILE)
+    if conn:
+        league = _arg("--league")
+        season = _arg("--season")
+        train_all_competitions(conn, window=int(_arg("--window", 1)),
+                               leagues=None if league is None else [league],
+                               seasons=None if season is None else [season])
+        conn.close()
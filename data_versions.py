@@ -0,0 +1,40 @@
+import sqlite3
+
+def create_data_versions_table(conn):
+    """ Cria a tabela que guarda um contador de versão para cada conjunto de dados (ex: matches, xg_data). """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+    """)
+
+def get_data_version(conn, name, default=0):
+    """ Retorna a versão atual de um conjunto de dados (`default` se nunca foi registrada). """
+    try:
+        row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    except sqlite3.OperationalError:
+        # Banco criado antes da tabela de versões existir
+        return default
+    return row[0] if row else default
+
+def get_all_data_versions(conn):
+    """ Retorna as versões de todos os conjuntos de dados registrados: {nome: versão}. """
+    try:
+        return dict(conn.execute("SELECT name, version FROM data_versions ORDER BY name").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+def set_data_version(conn, name, version):
+    """ Grava explicitamente a versão de um conjunto de dados. """
+    create_data_versions_table(conn)
+    conn.execute("INSERT OR REPLACE INTO data_versions (name, version) VALUES (?, ?)", (name, version))
+
+def bump_data_version(conn, name):
+    """ Incrementa a versão de um conjunto de dados após uma escrita e retorna a nova versão. """
+    create_data_versions_table(conn)
+    conn.execute("""
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    """, (name,))
+    return get_data_version(conn, name)
@@ -0,0 +1,68 @@
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = "database.db"
+
+# Ajustes de desempenho aplicados a toda conexão
+BUSY_TIMEOUT_MS = 5000  # espera por locks das escritas (ex: ingestão) em vez de falhar na hora
+CACHE_SIZE_KIB = 64 * 1024  # 64 MiB de cache de páginas por conexão
+MMAP_SIZE = 256 * 1024 * 1024  # 256 MiB lidos via mmap
+
+def _apply_pragmas(conn, read_only):
+    """ Aplica os PRAGMAs de desempenho; WAL só pode ser ativado por conexões de escrita. """
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    if not read_only:
+        # WAL permite leituras concorrentes com a escrita dos scripts de ingestão
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+
+def create_connection(db_file=DB_FILE, read_only=False):
+    """ Cria uma conexão com o banco de dados SQLite, já configurada.
+    Com read_only=True, abre via URI em modo somente leitura. Retorna None em caso de erro. """
+    conn = None
+    try:
+        if read_only:
+            conn = sqlite3.connect(f"file:{os.path.abspath(db_file)}?mode=ro", uri=True)
+        else:
+            conn = sqlite3.connect(db_file)
+        _apply_pragmas(conn, read_only)
+        logger.debug(f"Conexão com o banco de dados {db_file} estabelecida (somente leitura: {read_only}).")
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao conectar com o banco de dados: {e}")
+        if conn is not None:
+            conn.close()
+        conn = None
+    return conn
+
+# Conexões reaproveitadas por thread (e por processo, para sobreviver ao fork dos workers do gunicorn)
+_local = threading.local()
+
+def get_connection(db_file=DB_FILE, read_only=False):
+    """ Retorna a conexão da thread atual para (db_file, read_only), criando-a na primeira chamada.
+    As conexões não devem ser fechadas por quem as usa. Retorna None em caso de erro. """
+    pool = getattr(_local, "pool", None)
+    if pool is None or getattr(_local, "pid", None) != os.getpid():
+        # Conexões herdadas de outro processo não podem ser reutilizadas após o fork
+        pool = _local.pool = {}
+        _local.pid = os.getpid()
+
+    key = (db_file, read_only)
+    conn = pool.get(key)
+    if conn is None:
+        conn = create_connection(db_file, read_only)
+        if conn is not None:
+            pool[key] = conn
+    return conn
+
+def close_connections():
+    """ Fecha as conexões da thread atual (ex: ao encerrar um worker ou em scripts). """
+    pool = getattr(_local, "pool", None) or {}
+    for conn in pool.values():
+        conn.close()
+    pool.clear()
@@ -1,63 +1,152 @@
 
 import pandas as pd
 import numpy as np
-import sqlite3
 from scipy.optimize import minimize
-import math
+from scipy.special import gammaln
 import json
+import sys
+from score_matrix import MAX_GOALS, derive_markets, markets_to_json, outcome_probabilities, outcomes_from_matrix, score_matrix
+from db import DB_FILE, create_connection
+from model_artifacts import publish_params
+from parquet_snapshots import read_matches
 
-DB_FILE = "database.db"
+MODEL_NAME = "dixon_coles"
 MODEL_PARAMS_FILE = "dixon_coles_model_params.json"
-
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file)
-        print(f"Conexão com o banco de dados {db_file} estabelecida.")
-    except sqlite3.Error as e:
-        print(e)
-    return conn
-
-def dixon_coles_log_likelihood(params, home_goals, away_goals, home_team_indices, away_team_indices, num_teams):
-    """ Função de log-verossimilhança para o modelo Dixon-Coles. """
+GRID_OUTPUT_FILE = "dixon_coles_grid.json"
+
+def prepare_match_arrays(home_goals, away_goals, home_team_indices, away_team_indices):
+    """ Prepara os arrays de treino: remove jogos com gols NaN uma única vez e
+    pré-calcula a soma de log(gols!) via gammaln, que é constante na otimização. """
+    home_goals = np.asarray(home_goals, dtype=float)
+    away_goals = np.asarray(away_goals, dtype=float)
+    home_team_indices = np.asarray(home_team_indices)
+    away_team_indices = np.asarray(away_team_indices)
+
+    valid = ~(np.isnan(home_goals) | np.isnan(away_goals))
+    home_goals = home_goals[valid]
+    away_goals = away_goals[valid]
+    home_team_indices = home_team_indices[valid].astype(np.intp)
+    away_team_indices = away_team_indices[valid].astype(np.intp)
+
+    log_factorial_sum = float(np.sum(gammaln(home_goals + 1)) + np.sum(gammaln(away_goals + 1)))
+    return home_goals, away_goals, home_team_indices, away_team_indices, log_factorial_sum
+
+def poisson_log_rates(params, home_team_indices, away_team_indices, num_teams):
+    """ Calcula os logs das taxas de Poisson (casa e fora) de todos os jogos de uma vez. """
     attack = params[:num_teams]
     defense = params[num_teams:2*num_teams]
     home_advantage = params[2*num_teams]
 
-    log_likelihood = 0
-    for i in range(len(home_goals)):
-        home_idx = home_team_indices[i]
-        away_idx = away_team_indices[i]
-
-        # Garante que os gols são inteiros para math.factorial
-        # Verifica se os valores são NaN antes de converter para int
-        if pd.isna(home_goals[i]) or pd.isna(away_goals[i]):
-            continue # Pula linhas com valores NaN
-
-        hg = int(home_goals[i])
-        ag = int(away_goals[i])
+    log_lambda_home = attack[home_team_indices] + defense[away_team_indices] + home_advantage
+    log_mu_away = attack[away_team_indices] + defense[home_team_indices]
+    return log_lambda_home, log_mu_away
 
-        # Taxas de Poisson
-        lambda_home = np.exp(attack[home_idx] + defense[away_idx] + home_advantage)
-        mu_away = np.exp(attack[away_idx] + defense[home_idx])
+def dixon_coles_log_likelihood(params, home_goals, away_goals, home_team_indices, away_team_indices, num_teams,
+                               log_factorial_sum=None):
+    """ Função de log-verossimilhança (negativa) para o modelo Dixon-Coles, vetorizada com NumPy.
+    Se log_factorial_sum não for informado, os arrays são preparados (NaNs removidos) a cada chamada;
+    no treino eles são preparados uma única vez com prepare_match_arrays. """
+    if log_factorial_sum is None:
+        home_goals, away_goals, home_team_indices, away_team_indices, log_factorial_sum = prepare_match_arrays(
+            home_goals, away_goals, home_team_indices, away_team_indices)
 
-        # Log-verossimilhança da distribuição de Poisson
-        # Adicionando uma verificação para evitar log(0) ou log de números negativos
-        if lambda_home <= 0 or mu_away <= 0:
-            continue
+    log_lambda_home, log_mu_away = poisson_log_rates(params, home_team_indices, away_team_indices, num_teams)
 
-        log_likelihood += (hg * np.log(lambda_home) - lambda_home - np.log(math.factorial(hg)))
-        log_likelihood += (ag * np.log(mu_away) - mu_away - np.log(math.factorial(ag)))
+    log_likelihood = (np.dot(home_goals, log_lambda_home) - np.sum(np.exp(log_lambda_home))
+                      + np.dot(away_goals, log_mu_away) - np.sum(np.exp(log_mu_away))
+                      - log_factorial_sum)
 
     return -log_likelihood
 
-def train_dixon_coles_model(conn):
-    """ Treina o modelo Dixon-Coles com os dados históricos. """
-    df = pd.read_sql_query("SELECT home_team, away_team, home_goals, away_goals, season FROM matches", conn)
+def dixon_coles_gradient(params, home_goals, away_goals, home_team_indices, away_team_indices, num_teams,
+                         log_factorial_sum=None):
+    """ Gradiente exato da log-verossimilhança negativa, usado como `jac` no BFGS. """
+    if log_factorial_sum is None:
+        home_goals, away_goals, home_team_indices, away_team_indices, log_factorial_sum = prepare_match_arrays(
+            home_goals, away_goals, home_team_indices, away_team_indices)
+
+    log_lambda_home, log_mu_away = poisson_log_rates(params, home_team_indices, away_team_indices, num_teams)
+
+    # Derivadas da log-verossimilhança em relação a log(lambda) e log(mu)
+    residual_home = home_goals - np.exp(log_lambda_home)
+    residual_away = away_goals - np.exp(log_mu_away)
+
+    grad_attack = (np.bincount(home_team_indices, weights=residual_home, minlength=num_teams)
+                   + np.bincount(away_team_indices, weights=residual_away, minlength=num_teams))
+    grad_defense = (np.bincount(away_team_indices, weights=residual_home, minlength=num_teams)
+                    + np.bincount(home_team_indices, weights=residual_away, minlength=num_teams))
+    grad_home_advantage = np.sum(residual_home)
+
+    return -np.concatenate([grad_attack, grad_defense, [grad_home_advantage]])
+
+def _ridge_objective(params, num_teams, ridge, *args):
+    """ Log-verossimilhança negativa mais a penalidade ridge sobre ataque e defesa, e o gradiente. """
+    strengths = params[:2*num_teams]
+    value = dixon_coles_log_likelihood(params, *args[:4], num_teams, args[4]) + ridge * np.dot(strengths, strengths)
+    gradient = dixon_coles_gradient(params, *args[:4], num_teams, args[4])
+    gradient[:2*num_teams] += 2 * ridge * strengths
+    return value, gradient
+
+def fit_dixon_coles(match_arrays, num_teams, initial_params=None, disp=False, ridge=0.0):
+    """ Ajusta ataque, defesa e vantagem de casa por máxima verossimilhança (BFGS com gradiente analítico).
+    `match_arrays` vem de prepare_match_arrays; `initial_params` permite partir de um ajuste anterior.
+    Com ridge > 0, a penalidade ridge * (soma dos quadrados de ataque e defesa) puxa para a média os times
+    com poucos jogos, o que estabiliza ajustes com pouca informação (ex: início de temporada no backtest). """
+    if initial_params is None:
+        initial_params = np.zeros(2 * num_teams + 1)
+    if ridge > 0:
+        result = minimize(_ridge_objective, initial_params, args=(num_teams, ridge, *match_arrays),
+                          jac=True, method="BFGS", options={"disp": disp})
+        return result.x
+    result = minimize(dixon_coles_log_likelihood, initial_params,
+                      args=(*match_arrays[:4], num_teams, match_arrays[4]),
+                      jac=dixon_coles_gradient,
+                      method="BFGS", options={"disp": disp})
+    return result.x
 
-    # Filtra os dados para a temporada de 2025
-    df = df[df["season"] == "2025"]
+def load_model_params(params_file=MODEL_PARAMS_FILE):
+    """ Carrega os parâmetros salvos do modelo, ou None se o arquivo não existir. """
+    try:
+        with open(params_file, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _finished_matches_state(conn, seasons, leagues=None):
+    """ Retorna (número de jogos finalizados, maior id) das temporadas (e ligas) usadas no treino. """
+    query = "SELECT COUNT(*), MAX(id) FROM matches WHERE home_goals IS NOT NULL AND away_goals IS NOT NULL"
+    query_params = []
+    if seasons is not None:
+        query += f" AND season IN ({','.join('?' for _ in seasons)})"
+        query_params += [str(season) for season in seasons]
+    if leagues is not None:
+        query += f" AND league IN ({','.join('?' for _ in leagues)})"
+        query_params += list(leagues)
+    num_matches, last_match_id = conn.execute(query, query_params).fetchone()
+    return num_matches, last_match_id
+
+def _warm_start_params(previous_params, all_teams):
+    """ Monta o vetor inicial a partir de parâmetros anteriores, mapeando os times pelo nome.
+    Times novos (ex: promovidos) recebem um prior neutro: a média de ataque e defesa dos times conhecidos. """
+    attack = previous_params["attack"]
+    defense = previous_params["defense"]
+    neutral_attack = float(np.mean(list(attack.values()))) if attack else 0.0
+    neutral_defense = float(np.mean(list(defense.values()))) if defense else 0.0
+
+    return np.concatenate([
+        [attack.get(team, neutral_attack) for team in all_teams],
+        [defense.get(team, neutral_defense) for team in all_teams],
+        [previous_params.get("home_advantage", 0.0)]
+    ])
+
+def train_dixon_coles_model(conn, seasons=("2025",), warm_start_params=None, params_file=MODEL_PARAMS_FILE,
+                            leagues=None, model_name=MODEL_NAME):
+    """ Treina o modelo Dixon-Coles com os dados históricos.
+    `seasons` e `leagues` definem as temporadas e ligas usadas no treino; None usa todas as da tabela.
+    Se `warm_start_params` for informado, a otimização parte desses parâmetros em vez de zeros.
+    Os parâmetros são publicados como uma nova versão e trocados atomicamente em `params_file`. """
+    # Lê apenas as colunas e temporadas escolhidas (por padrão, 2025), do snapshot Parquet ou do SQLite
+    df = read_matches(conn, ["id", "home_team", "away_team", "home_goals", "away_goals", "season"], seasons, leagues)
 
     # Remove linhas com valores NaN nas colunas de gols
     df.dropna(subset=["home_goals", "away_goals"], inplace=True)
@@ -70,85 +159,190 @@ def train_dixon_coles_model(conn):
     df["home_team_index"] = df["home_team"].map(team_to_index)
     df["away_team_index"] = df["away_team"].map(team_to_index)
 
-    home_goals = df["home_goals"].values
-    away_goals = df["away_goals"].values
-    home_team_indices = df["home_team_index"].values
-    away_team_indices = df["away_team_index"].values
+    match_arrays = prepare_match_arrays(df["home_goals"].values, df["away_goals"].values,
+                                        df["home_team_index"].values, df["away_team_index"].values)
 
     # Inicializa os parâmetros (ataque, defesa, vantagem de casa)
-    initial_params = np.zeros(2 * num_teams + 1)
+    if warm_start_params is not None:
+        initial_params = _warm_start_params(warm_start_params, all_teams)
+    else:
+        initial_params = np.zeros(2 * num_teams + 1)
 
-    # Otimização para encontrar os melhores parâmetros
-    result = minimize(dixon_coles_log_likelihood, initial_params,
-                      args=(home_goals, away_goals, home_team_indices, away_team_indices, num_teams),
-                      method="BFGS", options={"disp": True})
+    # Otimização para encontrar os melhores parâmetros, com gradiente analítico
+    fitted_params = fit_dixon_coles(match_arrays, num_teams, initial_params, disp=True)
 
-    attack_params = result.x[:num_teams]
-    defense_params = result.x[num_teams:2*num_teams]
-    home_advantage_param = result.x[2*num_teams]
+    attack_params = fitted_params[:num_teams]
+    defense_params = fitted_params[num_teams:2*num_teams]
+    home_advantage_param = fitted_params[2*num_teams]
 
     # Salva os parâmetros do modelo
     model_params = {
         "attack": {team: attack_params[team_to_index[team]] for team in all_teams},
         "defense": {team: defense_params[team_to_index[team]] for team in all_teams},
-        "home_advantage": home_advantage_param
+        "home_advantage": home_advantage_param,
+        "metadata": {
+            "seasons": None if seasons is None else [str(season) for season in seasons],
+            "leagues": None if leagues is None else list(leagues),
+            "num_matches": int(len(df)),
+            "last_match_id": int(df["id"].max()) if len(df) else None
+        }
     }
 
-    # Salva os parâmetros em um arquivo JSON
-    with open(MODEL_PARAMS_FILE, "w") as f:
-        json.dump(model_params, f, indent=4)
-    print(f"Parâmetros do modelo salvos em {MODEL_PARAMS_FILE}")
+    # Publica os parâmetros (artefato versionado + troca atômica do arquivo ativo)
+    version = publish_params(model_params, model_name, params_file)
+    print(f"Parâmetros do modelo salvos em {params_file} (versão {version})")
 
     return model_params
 
-def predict_dixon_coles(home_team, away_team, model_params):
-    """ Faz previsões de gols para um jogo usando o modelo Dixon-Coles. """
+def retrain_dixon_coles_incremental(conn, seasons=("2025",), params_file=MODEL_PARAMS_FILE, leagues=None, model_name=MODEL_NAME):
+    """ Retreino incremental: parte dos últimos parâmetros salvos e só refaz o ajuste
+    quando a tabela matches tem jogos finalizados novos desde o último treino. """
+    previous_params = load_model_params(params_file)
+    if previous_params is None:
+        print("Nenhum parâmetro anterior encontrado. Treinando do zero...")
+        return train_dixon_coles_model(conn, seasons, params_file=params_file, leagues=leagues, model_name=model_name)
+
+    metadata = previous_params.get("metadata", {})
+    num_matches, last_match_id = _finished_matches_state(conn, seasons, leagues)
+    expected_seasons = None if seasons is None else [str(season) for season in seasons]
+    expected_leagues = None if leagues is None else list(leagues)
+
+    if (metadata.get("seasons") == expected_seasons
+            and metadata.get("leagues") == expected_leagues
+            and metadata.get("num_matches") == num_matches
+            and metadata.get("last_match_id") == last_match_id):
+        print("Nenhum jogo novo desde o último treino. Parâmetros mantidos.")
+        return previous_params
+
+    print("Jogos novos encontrados. Retreinando a partir dos últimos parâmetros...")
+    return train_dixon_coles_model(conn, seasons, warm_start_params=previous_params, params_file=params_file,
+                                   leagues=leagues, model_name=model_name)
+
+def predict_dixon_coles(home_team, away_team, model_params, max_goals=MAX_GOALS, include_markets=False):
+    """ Faz previsões de gols para um jogo usando o modelo Dixon-Coles.
+    Com include_markets=True, também devolve os mercados derivados da mesma matriz de placares. """
     attack = model_params["attack"]
     defense = model_params["defense"]
     home_advantage = model_params["home_advantage"]
 
     if home_team not in attack or away_team not in attack:
         print(f"Erro: Time(s) não encontrado(s) nos parâmetros do modelo. Times disponíveis: {list(attack.keys())}")
-        return None, None
+        return None
 
     # Taxas de Poisson para gols do time da casa e do time visitante
     lambda_home = np.exp(attack[home_team] + defense[away_team] + home_advantage)
     mu_away = np.exp(attack[away_team] + defense[home_team])
 
-    # Calcula as probabilidades para cada placar (até um certo limite de gols)
-    max_goals = 5 # Limite de gols para calcular as probabilidades
-    prob_matrix = np.zeros((max_goals + 1, max_goals + 1))
+    # Matriz de placares (até max_goals gols por time) e mercados derivados dela
+    prob_matrix, tail_mass = score_matrix(lambda_home, mu_away, max_goals)
+    prob_home_win, prob_draw, prob_away_win = outcomes_from_matrix(prob_matrix)
 
-    for i in range(max_goals + 1):
-        for j in range(max_goals + 1):
-            prob_home = (lambda_home**i * np.exp(-lambda_home)) / math.factorial(i)
-            prob_away = (mu_away**j * np.exp(-mu_away)) / math.factorial(j)
-            prob_matrix[i, j] = prob_home * prob_away
+    prediction = {
+        "home_win": float(prob_home_win),
+        "draw": float(prob_draw),
+        "away_win": float(prob_away_win),
+        "lambda_home": float(lambda_home),
+        "mu_away": float(mu_away)
+    }
+    if include_markets:
+        prediction["markets"] = markets_to_json(derive_markets(prob_matrix, tail_mass))
+    return prediction
+
+def batch_rates(home_teams, away_teams, model_params):
+    """ Calcula as taxas de Poisson de vários jogos de uma vez.
+    Retorna (máscara dos jogos com os dois times conhecidos, lambda_home, mu_away),
+    onde as taxas cobrem apenas os jogos conhecidos, na ordem de entrada. """
+    attack = model_params["attack"]
+    defense = model_params["defense"]
+    home_advantage = model_params["home_advantage"]
 
-    # Probabilidades de resultado (Vitória Casa, Empate, Vitória Fora)
-    prob_home_win = np.sum(np.array([prob_matrix[i, j] for i in range(max_goals + 1) for j in range(max_goals + 1) if i > j]))
-    prob_draw = np.sum(np.array([prob_matrix[i, j] for i in range(max_goals + 1) for j in range(max_goals + 1) if i == j]))
-    prob_away_win = np.sum(np.array([prob_matrix[i, j] for i in range(max_goals + 1) for j in range(max_goals + 1) if i < j]))
+    known = np.array([home in attack and away in attack for home, away in zip(home_teams, away_teams)], dtype=bool)
+    known_home = [team for team, ok in zip(home_teams, known) if ok]
+    known_away = [team for team, ok in zip(away_teams, known) if ok]
+    attack_home = np.array([attack[team] for team in known_home], dtype=float)
+    attack_away = np.array([attack[team] for team in known_away], dtype=float)
+    defense_home = np.array([defense[team] for team in known_home], dtype=float)
+    defense_away = np.array([defense[team] for team in known_away], dtype=float)
+
+    lambda_home = np.exp(attack_home + defense_away + home_advantage)
+    mu_away = np.exp(attack_away + defense_home)
+    return known, lambda_home, mu_away
+
+def predict_dixon_coles_batch(home_teams, away_teams, model_params, max_goals=MAX_GOALS):
+    """ Faz previsões para vários jogos de uma vez, com taxas e matrizes de placar vetorizadas.
+    Retorna uma lista alinhada com os jogos de entrada; jogos com times desconhecidos ficam como None. """
+    known, lambda_home, mu_away = batch_rates(home_teams, away_teams, model_params)
+    predictions = [None] * len(known)
+    if not known.any():
+        return predictions
+
+    prob_home_win, prob_draw, prob_away_win = outcome_probabilities(lambda_home, mu_away, max_goals)
+
+    for position, i in enumerate(np.flatnonzero(known)):
+        predictions[i] = {
+            "home_win": float(prob_home_win[position]),
+            "draw": float(prob_draw[position]),
+            "away_win": float(prob_away_win[position]),
+            "lambda_home": float(lambda_home[position]),
+            "mu_away": float(mu_away[position])
+        }
+    return predictions
+
+def predict_all_pairs(model_params, max_goals=MAX_GOALS):
+    """ Calcula as previsões de todos os pares ordenados (mandante, visitante) dos parâmetros atuais
+    com um único broadcast sobre (times x times x gols x gols).
+    Retorna matrizes times x times, onde a linha é o mandante e a coluna é o visitante;
+    a diagonal (time contra ele mesmo) fica como NaN. """
+    teams = list(model_params["attack"].keys())
+    attack = np.array([model_params["attack"][team] for team in teams])
+    defense = np.array([model_params["defense"][team] for team in teams])
+    home_advantage = model_params["home_advantage"]
 
-    # Normaliza as probabilidades para garantir que somem 1
-    total_prob = prob_home_win + prob_draw + prob_away_win
-    prob_home_win /= total_prob
-    prob_draw /= total_prob
-    prob_away_win /= total_prob
+    lambda_home = np.exp(attack[:, None] + defense[None, :] + home_advantage)
+    mu_away = np.exp(attack[None, :] + defense[:, None])
+    prob_home_win, prob_draw, prob_away_win = outcome_probabilities(lambda_home, mu_away, max_goals)
 
-    return {
+    grid = {
         "home_win": prob_home_win,
         "draw": prob_draw,
         "away_win": prob_away_win,
         "lambda_home": lambda_home,
         "mu_away": mu_away
     }
+    diagonal = np.eye(len(teams), dtype=bool)
+    for values in grid.values():
+        values[diagonal] = np.nan
+
+    return {"teams": teams, **grid}
+
+def grid_to_json(grid):
+    """ Converte a grade de previsões em listas serializáveis, trocando NaN por None. """
+    result = {"teams": grid["teams"]}
+    for key, values in grid.items():
+        if key != "teams":
+            result[key] = [[None if np.isnan(value) else float(value) for value in row] for row in values]
+    return result
 
 if __name__ == '__main__':
+    if "--grid" in sys.argv:
+        model_params = load_model_params()
+        if model_params is None:
+            print(f"Erro: Arquivo de parâmetros do modelo Dixon-Coles não encontrado em {MODEL_PARAMS_FILE}")
+            exit()
+        grid = predict_all_pairs(model_params)
+        with open(GRID_OUTPUT_FILE, "w") as f:
+            json.dump(grid_to_json(grid), f)
+        print(f"Grade de previsões de {len(grid['teams'])} times salva em {GRID_OUTPUT_FILE}")
+        exit()
+
     conn = create_connection(DB_FILE)
     if conn:
-        print("Treinando o modelo Dixon-Coles...")
-        model_params = train_dixon_coles_model(conn)
+        if "--incremental" in sys.argv:
+            print("Retreinando o modelo Dixon-Coles (modo incremental)...")
+            model_params = retrain_dixon_coles_incremental(conn)
+        else:
+            print("Treinando o modelo Dixon-Coles...")
+            model_params = train_dixon_coles_model(conn)
         print("Modelo Dixon-Coles treinado com sucesso!")
         
         # Exemplo de previsão
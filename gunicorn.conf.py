@@ -0,0 +1,20 @@
+import multiprocessing
+import os
+
+# Configuração do gunicorn (render.yaml: gunicorn app:app --config gunicorn.conf.py).
+# Com preload_app, o app é importado e os modelos são carregados uma vez no processo mestre;
+# os workers nascem por fork e compartilham essa memória (copy-on-write, e as amostras do Skellam
+# por arquivos mapeados em memória), em vez de cada um carregar a própria cópia.
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+def when_ready(server):
+    """ Executado no mestre, depois de importar o app e antes de criar os workers. """
+    from app import preload_models
+    from db import close_connections
+
+    models = preload_models()
+    # Conexões SQLite não devem atravessar o fork; cada worker abre as próprias
+    close_connections()
+    server.log.info(f"Modelos pré-carregados no mestre: {', '.join(models) or 'nenhum'}")
@@ -2,90 +2,117 @@
 import pandas as pd
 import sqlite3
 import os
-
-# Defina o nome do arquivo do banco de dados
-DB_FILE = "database.db"
-
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file)
-        print(f"Conexão com o banco de dados {db_file} estabelecida.")
-    except sqlite3.Error as e:
-        print(e)
-    return conn
+from data_versions import bump_data_version
+from db import DB_FILE, create_connection
+from migrations import apply_migrations
+from parquet_snapshots import write_snapshots
 
 def create_table(conn):
-    """ Cria a tabela para armazenar os dados de jogos """
+    """ Cria a tabela para armazenar os dados de jogos (e os índices), aplicando as migrações pendentes """
     try:
-        sql_create_matches_table = """ CREATE TABLE IF NOT EXISTS matches (
-                                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                        country TEXT,
-                                        league TEXT,
-                                        season TEXT,
-                                        date TEXT,
-                                        time TEXT,
-                                        home_team TEXT,
-                                        away_team TEXT,
-                                        home_goals INTEGER,
-                                        away_goals INTEGER,
-                                        result TEXT,
-                                        psc_home_odds REAL,
-                                        psc_draw_odds REAL,
-                                        psc_away_odds REAL,
-                                        max_c_home_odds REAL,
-                                        max_c_draw_odds REAL,
-                                        max_c_away_odds REAL,
-                                        avg_c_home_odds REAL,
-                                        avg_c_draw_odds REAL,
-                                        avg_c_away_odds REAL
-                                    ); """
-        cursor = conn.cursor()
-        cursor.execute(sql_create_matches_table)
+        apply_migrations(conn)
         print("Tabela 'matches' criada com sucesso.")
     except sqlite3.Error as e:
         print(e)
 
-def ingest_csv_to_db(conn, csv_file):
-    """ Ingestiona dados de um arquivo CSV para o banco de dados SQLite """
+# Mapeamento das colunas do CSV para as colunas da tabela matches
+CSV_COLUMNS = {
+    'Country': 'country',
+    'League': 'league',
+    'Season': 'season',
+    'Date': 'date',
+    'Time': 'time',
+    'Home': 'home_team',
+    'Away': 'away_team',
+    'HG': 'home_goals',
+    'AG': 'away_goals',
+    'Res': 'result',
+    'PSCH': 'psc_home_odds',
+    'PSCD': 'psc_draw_odds',
+    'PSCA': 'psc_away_odds',
+    'MaxCH': 'max_c_home_odds',
+    'MaxCD': 'max_c_draw_odds',
+    'MaxCA': 'max_c_away_odds',
+    'AvgCH': 'avg_c_home_odds',
+    'AvgCD': 'avg_c_draw_odds',
+    'AvgCA': 'avg_c_away_odds'
+}
+MATCH_COLUMNS = list(CSV_COLUMNS.values())
+# Chave natural de um jogo: a mesma partida nunca aparece duas vezes na tabela
+KEY_COLUMNS = ['league', 'season', 'date', 'home_team', 'away_team']
+VALUE_COLUMNS = [column for column in MATCH_COLUMNS if column not in KEY_COLUMNS]
+INGEST_CHUNK_SIZE = 1000
+
+def read_csv_chunks(csv_file, chunksize=INGEST_CHUNK_SIZE):
+    """ Lê o CSV em blocos, já com as colunas renomeadas e selecionadas para a tabela matches """
+    for chunk in pd.read_csv(csv_file, chunksize=chunksize):
+        chunk = chunk.rename(columns=CSV_COLUMNS)[MATCH_COLUMNS]
+        # NaN vira NULL no SQLite
+        yield chunk.astype(object).where(chunk.notna(), None)
+
+def _upsert_staged_matches(conn):
+    """ Aplica os jogos da tabela temporária staging_matches em matches via upsert pela chave natural.
+    Retorna (inseridos, atualizados, ignorados); jogos sem chave completa ou repetidos no bloco contam como ignorados. """
+    key_join = " AND ".join(f"m.{column} = s.{column}" for column in KEY_COLUMNS)
+    unchanged = " AND ".join(f"m.{column} IS s.{column}" for column in VALUE_COLUMNS)
+
+    # Jogos com alguma coluna da chave vazia não podem ser identificados: são ignorados
+    invalid = conn.execute(
+        f"DELETE FROM staging_matches WHERE {' OR '.join(f'{column} IS NULL' for column in KEY_COLUMNS)}").rowcount
+    # O mesmo jogo repetido no bloco vale uma vez, com a última linha (como num upsert linha a linha)
+    invalid += conn.execute(f"""
+        DELETE FROM staging_matches WHERE rowid NOT IN (
+            SELECT MAX(rowid) FROM staging_matches GROUP BY {', '.join(KEY_COLUMNS)})
+    """).rowcount
+
+    inserted, updated, skipped = conn.execute(f"""
+        SELECT COALESCE(SUM(m.id IS NULL), 0),
+               COALESCE(SUM(m.id IS NOT NULL AND NOT ({unchanged})), 0),
+               COALESCE(SUM(m.id IS NOT NULL AND ({unchanged})), 0)
+        FROM staging_matches s LEFT JOIN matches m ON {key_join}
+    """).fetchone()
+
+    columns = ", ".join(MATCH_COLUMNS)
+    conn.execute(f"""
+        INSERT INTO matches ({columns}) SELECT {columns} FROM staging_matches WHERE true
+        ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET
+            {', '.join(f'{column} = excluded.{column}' for column in VALUE_COLUMNS)}
+        WHERE NOT ({' AND '.join(f'matches.{column} IS excluded.{column}' for column in VALUE_COLUMNS)})
+    """)
+    conn.execute("DELETE FROM staging_matches")
+    return inserted, updated, skipped + invalid
+
+def ingest_csv_to_db(conn, csv_file, chunksize=INGEST_CHUNK_SIZE):
+    """ Ingestiona dados de um arquivo CSV para o banco de dados SQLite.
+    O arquivo é lido em blocos e cada jogo é inserido ou atualizado pela chave natural
+    (liga, temporada, data, mandante, visitante), tudo em uma única transação; reexecutar
+    com o mesmo arquivo não duplica jogos. Retorna as contagens de inseridos, atualizados e ignorados. """
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    # O upsert depende da chave natural única (migração 4), então o esquema precisa estar atualizado
+    apply_migrations(conn)
     try:
-        df = pd.read_csv(csv_file)
-        # Renomeia as colunas para corresponder à tabela do banco de dados
-        df.rename(columns={
-            'Country': 'country',
-            'League': 'league',
-            'Season': 'season',
-            'Date': 'date',
-            'Time': 'time',
-            'Home': 'home_team',
-            'Away': 'away_team',
-            'HG': 'home_goals',
-            'AG': 'away_goals',
-            'Res': 'result',
-            'PSCH': 'psc_home_odds',
-            'PSCD': 'psc_draw_odds',
-            'PSCA': 'psc_away_odds',
-            'MaxCH': 'max_c_home_odds',
-            'MaxCD': 'max_c_draw_odds',
-            'MaxCA': 'max_c_away_odds',
-            'AvgCH': 'avg_c_home_odds',
-            'AvgCD': 'avg_c_draw_odds',
-            'AvgCA': 'avg_c_away_odds'
-        }, inplace=True)
-
-        # Seleciona apenas as colunas que correspondem à tabela
-        df_to_ingest = df[[
-            'country', 'league', 'season', 'date', 'time', 'home_team', 'away_team',
-            'home_goals', 'away_goals', 'result', 'psc_home_odds', 'psc_draw_odds',
-            'psc_away_odds', 'max_c_home_odds', 'max_c_draw_odds', 'max_c_away_odds',
-            'avg_c_home_odds', 'avg_c_draw_odds', 'avg_c_away_odds'
-        ]]
-
-        df_to_ingest.to_sql('matches', conn, if_exists='append', index=False)
-        print(f"Dados do arquivo {csv_file} inseridos na tabela 'matches'.")
+        conn.execute("BEGIN")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS staging_matches AS SELECT " + ", ".join(MATCH_COLUMNS) + " FROM matches WHERE 0")
+        placeholders = ", ".join("?" for _ in MATCH_COLUMNS)
+
+        for chunk in read_csv_chunks(csv_file, chunksize):
+            conn.executemany(f"INSERT INTO staging_matches ({', '.join(MATCH_COLUMNS)}) VALUES ({placeholders})",
+                             chunk.itertuples(index=False, name=None))
+            inserted, updated, skipped = _upsert_staged_matches(conn)
+            counts["inserted"] += inserted
+            counts["updated"] += updated
+            counts["skipped"] += skipped
+
+        if counts["inserted"] or counts["updated"]:
+            bump_data_version(conn, "matches")
+        conn.commit()
+        print(f"Dados do arquivo {csv_file} processados na tabela 'matches': "
+              f"{counts['inserted']} inseridos, {counts['updated']} atualizados, {counts['skipped']} ignorados.")
     except Exception as e:
+        conn.rollback()
         print(f"Erro ao processar o arquivo {csv_file}: {e}")
+        return None
+    return counts
 
 if __name__ == '__main__':
     # Cria a conexão com o banco de dados
@@ -98,6 +125,9 @@ if __name__ == '__main__':
         # Ingestiona o arquivo CSV
         ingest_csv_to_db(conn, 'BRA.csv')
 
+        # Atualiza os snapshots Parquet usados nos treinos
+        write_snapshots(conn)
+
         # Fecha a conexão
         conn.close()
         print("Conexão com o banco de dados fechada.")
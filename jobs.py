@@ -0,0 +1,231 @@
+import fcntl
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+from calculate_odds import calculate_average_odds
+from competitions import train_all_competitions
+from db import DB_FILE, create_connection
+from dixon_coles_model import retrain_dixon_coles_incremental
+from ingest_data import create_table, ingest_csv_to_db
+from migrations import add_column_if_missing
+from parquet_snapshots import write_snapshots
+from process_statsbomb_data import calculate_and_insert_simplified_xg
+from skellam_bayesian_model import refresh_skellam_posterior
+from xg_differential_model import refresh_xg_team_stats
+
+# Jobs de ingestão em segundo plano: a API só grava o arquivo e enfileira o job na tabela jobs;
+# o pipeline roda num processo separado (python jobs.py), sem ocupar um worker do gunicorn.
+# Um único worker roda por vez, garantido por um flock no arquivo de lock (liberado pelo sistema se o processo morrer).
+JOB_STAGES = ["ingest", "odds", "xg", "snapshots", "retrain", "skellam"]
+JOB_LOCK_FILE = "jobs.lock"
+HEARTBEAT_INTERVAL = 30  # segundos entre as atualizações de heartbeat_at do job em execução
+MAX_ATTEMPTS = 2  # um job interrompido (worker morto) volta para a fila uma vez; depois, falha
+
+# Processo do worker disparado por este processo da API, reaproveitado enquanto estiver vivo
+_worker_process = None
+
+def create_jobs_table(conn):
+    """ Cria a tabela de jobs (status, etapa atual e resultado de cada etapa). """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_path TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            stage TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TEXT,
+            finished_at TEXT
+        );
+    """)
+    add_column_if_missing(conn, "jobs", "heartbeat_at", "TEXT")
+    add_column_if_missing(conn, "jobs", "attempts", "INTEGER NOT NULL DEFAULT 0")
+
+def create_job(conn, file_path):
+    """ Enfileira o pipeline de ingestão de um CSV já gravado em disco e retorna o id do job. """
+    create_jobs_table(conn)
+    job_id = conn.execute("INSERT INTO jobs (file_path) VALUES (?)", (os.path.abspath(file_path),)).lastrowid
+    conn.commit()
+    return job_id
+
+def get_job(conn, job_id):
+    """ Retorna o job como dicionário, ou None se ele não existir. """
+    try:
+        row = conn.execute("""
+            SELECT id, status, stage, result, error, created_at, started_at, heartbeat_at, finished_at FROM jobs WHERE id = ?
+        """, (job_id,)).fetchone()
+    except sqlite3.OperationalError:
+        # Nenhum job foi criado ainda (tabela inexistente)
+        return None
+    if row is None:
+        return None
+    job_id, status, stage, result, error, created_at, started_at, heartbeat_at, finished_at = row
+    return {
+        "job_id": job_id,
+        "status": status,
+        "stage": stage,
+        "result": json.loads(result) if result else {},
+        "error": error,
+        "created_at": created_at,
+        "started_at": started_at,
+        "heartbeat_at": heartbeat_at,
+        "finished_at": finished_at
+    }
+
+def _claim_next_job(conn):
+    """ Marca o próximo job da fila como em execução e retorna (id, arquivo), ou None se a fila estiver vazia.
+    O BEGIN IMMEDIATE garante que dois processos nunca peguem o mesmo job. """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT id, file_path FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is not None:
+            conn.execute("""
+                UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP,
+                                attempts = attempts + 1
+                WHERE id = ?
+            """, (row[0],))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return row
+
+def _update_job(conn, job_id, **fields):
+    """ Grava campos do job e confirma na hora, para que o endpoint de status veja o progresso. """
+    conn.execute(f"UPDATE jobs SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+
+def _now(conn):
+    return conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+
+def _run_stage(conn, stage, file_path):
+    """ Executa uma etapa do pipeline e retorna o resumo dela. Lança RuntimeError se a etapa falhar. """
+    if stage == "ingest":
+        counts = ingest_csv_to_db(conn, file_path)
+        if counts is None:
+            raise RuntimeError(f"Falha na ingestão do arquivo {os.path.basename(file_path)}")
+        return counts
+    if stage == "odds":
+        updated = calculate_average_odds(conn)
+        if updated is None:
+            raise RuntimeError("Falha no cálculo das odds médias")
+        return {"updated": updated}
+    if stage == "xg":
+        calculate_and_insert_simplified_xg(conn)
+        return {"teams": len(refresh_xg_team_stats(conn))}
+    if stage == "snapshots":
+        return {"written": write_snapshots(conn)}
+    if stage == "retrain":
+        model_params = retrain_dixon_coles_incremental(conn)
+        # Modelos por competição: só as competições com jogos novos são reajustadas
+        competitions = train_all_competitions(conn)
+        return {"teams": len(model_params["attack"]), "num_matches": model_params.get("metadata", {}).get("num_matches"),
+                "competitions": len(competitions)}
+    if stage == "skellam":
+        posterior = refresh_skellam_posterior(conn)
+        return {"teams": len(posterior["teams"]), "draws": len(posterior["intercept"])}
+    raise ValueError(f"Etapa desconhecida: {stage}")
+
+def recover_interrupted_jobs(conn, max_attempts=MAX_ATTEMPTS):
+    """ Chamada com o lock do worker: nenhum outro worker está rodando, então todo job 'running' foi
+    interrompido (worker morto no meio do pipeline). Volta para a fila se ainda houver tentativas,
+    senão é marcado como falho. Retorna o número de jobs recuperados. """
+    requeued = conn.execute("UPDATE jobs SET status = 'queued', stage = NULL WHERE status = 'running' AND attempts < ?",
+                            (max_attempts,)).rowcount
+    failed = conn.execute("""
+        UPDATE jobs SET status = 'failed', error = 'Worker interrompido durante a execução', finished_at = CURRENT_TIMESTAMP
+        WHERE status = 'running'
+    """).rowcount
+    conn.commit()
+    if requeued or failed:
+        print(f"Jobs interrompidos: {requeued} de volta na fila, {failed} marcados como falhos.")
+    return requeued + failed
+
+def _heartbeat(db_file, job_id, stop, interval):
+    """ Atualiza heartbeat_at do job periodicamente (as etapas de retreino podem levar minutos). """
+    conn = create_connection(db_file)
+    if conn is None:
+        return
+    try:
+        while not stop.wait(interval):
+            conn.execute("UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+            conn.commit()
+    finally:
+        conn.close()
+
+def run_job(conn, job_id, file_path, db_file=DB_FILE, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """ Roda as etapas ingestão → odds médias → xG → snapshots → retreinos, registrando o progresso. """
+    result = {}
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(db_file, job_id, stop, heartbeat_interval), daemon=True)
+    heartbeat.start()
+    try:
+        for stage in JOB_STAGES:
+            _update_job(conn, job_id, stage=stage)
+            result[stage] = _run_stage(conn, stage, file_path)
+            _update_job(conn, job_id, result=json.dumps(result))
+    except Exception as e:
+        conn.rollback()
+        _update_job(conn, job_id, status="failed", error=str(e), finished_at=_now(conn))
+        print(f"Job {job_id} falhou na etapa {stage}: {e}")
+        return False
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    _update_job(conn, job_id, status="succeeded", stage=None, finished_at=_now(conn))
+    print(f"Job {job_id} concluído: {result}")
+    return True
+
+def _has_queued_jobs(conn):
+    return conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' LIMIT 1").fetchone() is not None
+
+def run_pending_jobs(conn, db_file=DB_FILE, lock_file=JOB_LOCK_FILE):
+    """ Processa a fila até esvaziá-la, com o lock exclusivo do worker. Se outro worker já detém o lock,
+    retorna na hora: ele mesmo processa os jobs novos, pois revê a fila depois de liberar o lock.
+    Retorna o número de jobs executados. """
+    create_table(conn)
+    create_jobs_table(conn)
+    conn.commit()
+    executed = 0
+    with open(lock_file, "a") as lock:
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return executed
+            try:
+                recover_interrupted_jobs(conn)
+                while True:
+                    job = _claim_next_job(conn)
+                    if job is None:
+                        break
+                    run_job(conn, *job, db_file=db_file)
+                    executed += 1
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            # Um job enfileirado enquanto o lock era liberado teria o worker novo recusado pelo lock
+            if not _has_queued_jobs(conn):
+                return executed
+
+def start_job_worker():
+    """ Garante um worker esvaziando a fila de jobs: reaproveita o disparado antes por este processo
+    enquanto ele estiver vivo (o poll também recolhe o processo já terminado) e, senão, dispara um novo.
+    O worker herda o diretório atual, usando o mesmo banco e os mesmos arquivos de modelo da API. """
+    global _worker_process
+    if _worker_process is not None and _worker_process.poll() is None:
+        return _worker_process
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.py")
+    _worker_process = subprocess.Popen([sys.executable, script], stdin=subprocess.DEVNULL, start_new_session=True)
+    return _worker_process
+
+if __name__ == '__main__':
+    conn = create_connection(DB_FILE)
+    if conn:
+        executed = run_pending_jobs(conn)
+        print(f"{executed} job(s) processado(s).")
+        conn.close()
@@ -0,0 +1,278 @@
+import json
+import os
+import random
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import numpy as np
+
+# Gerador de carga HTTP para a API, com a mesma linha de comando do render.yaml (gunicorn).
+# Cada thread simula um cliente que escolhe a próxima requisição pelo mix de tráfego abaixo, com pares de
+# times sorteados da lista de /teams. O relatório traz vazão e latências p50/p95/p99 por endpoint e pode
+# ser comparado com um baseline salvo de uma execução anterior.
+# As respostas da API ficam em cache (response_cache.py), então uma execução com pares de times repetidos mede
+# sobretudo acertos de cache. Por isso o teste roda em dois modos, relatados separadamente: "cold", em que cada
+# requisição leva um parâmetro único (CACHE_BUST_PARAM) e sempre calcula a previsão, e "warm", com o cache em uso.
+RENDER_FILE = "render.yaml"
+DEFAULT_PORT = 10000
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DURATION = 30
+REQUEST_TIMEOUT = 30
+# Peso de cada endpoint no mix de um dia de jogos: a maior parte do tráfego são previsões de um jogo
+TRAFFIC_MIX = {
+    "/predict/dixon-coles": 35,
+    "/predict/skellam-bayesian": 15,
+    "/predict/xg-differential": 15,
+    "/predict/dixon-coles/grid": 3,
+    "/predict/batch": 2,
+    "/value-bets": 20,
+    "/teams": 10,
+}
+BATCH_FIXTURES = 10
+PERCENTILES = [50, 95, 99]
+REGRESSION_TOLERANCE = 0.10  # variação aceita em relação ao baseline antes de marcar regressão
+CACHE_BUST_PARAM = "_nocache"
+MODES = ["cold", "warm"]
+
+def render_start_command(port=DEFAULT_PORT, render_file=RENDER_FILE):
+    """ Linha de comando do serviço web no render.yaml, com a porta trocada pela pedida. """
+    with open(render_file) as f:
+        match = re.search(r'startCommand:\s*"?([^"\n]+)"?', f.read())
+    if match is None:
+        raise ValueError(f"startCommand não encontrado em {render_file}")
+    return [re.sub(r":\d+$", f":{port}", part) if part.startswith("0.0.0.0:") else part
+            for part in shlex.split(match.group(1))]
+
+def start_server(port=DEFAULT_PORT, extra_args=(), startup_timeout=60):
+    """ Sobe o app como no render.yaml e espera ele responder em /teams. Retorna o processo. """
+    command = render_start_command(port) + list(extra_args)
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"O servidor terminou durante a inicialização: {' '.join(command)}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/teams", timeout=REQUEST_TIMEOUT):
+                return process
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"O servidor não respondeu em {startup_timeout}s: {' '.join(command)}")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def fetch_teams(base_url):
+    with urllib.request.urlopen(f"{base_url}/teams", timeout=REQUEST_TIMEOUT) as response:
+        return json.load(response)["teams"]
+
+def build_request(endpoint, base_url, teams, rng, cache_bust=False):
+    """ Monta uma requisição do endpoint com parâmetros realistas (times sorteados, mercados às vezes).
+    Com cache_bust, acrescenta um parâmetro único, que entra na chave do cache de respostas. """
+    home_team, away_team = rng.sample(teams, 2)
+    bust = {CACHE_BUST_PARAM: f"{rng.getrandbits(64):016x}"} if cache_bust else {}
+    if endpoint == "/predict/batch":
+        fixtures = [dict(zip(("home_team", "away_team"), rng.sample(teams, 2))) for _ in range(BATCH_FIXTURES)]
+        body = json.dumps({"fixtures": fixtures}).encode()
+        query = f"?{urllib.parse.urlencode(bust)}" if bust else ""
+        return urllib.request.Request(f"{base_url}{endpoint}{query}", data=body, headers={"Content-Type": "application/json"})
+    if endpoint in ("/predict/dixon-coles", "/predict/skellam-bayesian"):
+        params = {"home_team": home_team, "away_team": away_team}
+        if rng.random() < 0.3:
+            params["markets"] = "true"
+    elif endpoint == "/predict/xg-differential":
+        params = {"home_team": home_team, "away_team": away_team}
+    elif endpoint == "/value-bets":
+        params = {"min_value": rng.choice(["0.02", "0.05", "0.1"]), "limit": 50}
+    else:
+        params = {}
+    params.update(bust)
+    query = f"?{urllib.parse.urlencode(params)}" if params else ""
+    return urllib.request.Request(f"{base_url}{endpoint}{query}")
+
+def _client(base_url, teams, mix, deadline, max_requests, counter, samples, lock, seed, cache_bust):
+    """ Laço de um cliente: envia requisições até o prazo (ou o total pedido) e anota (endpoint, latência, status). """
+    rng = random.Random(seed)
+    endpoints, weights = list(mix), list(mix.values())
+    local = []
+    while time.monotonic() < deadline:
+        if max_requests is not None:
+            with lock:
+                if counter[0] >= max_requests:
+                    break
+                counter[0] += 1
+        endpoint = rng.choices(endpoints, weights)[0]
+        request = build_request(endpoint, base_url, teams, rng, cache_bust)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            status = 0
+        local.append((endpoint, time.perf_counter() - started, status))
+    with lock:
+        samples.extend(local)
+
+def run_load(base_url, concurrency=DEFAULT_CONCURRENCY, duration=DEFAULT_DURATION, max_requests=None,
+             mix=TRAFFIC_MIX, seed=0, cache_bust=False):
+    """ Dispara `concurrency` clientes por `duration` segundos (ou até `max_requests` requisições no total).
+    Com cache_bust, nenhuma requisição é atendida pelo cache de respostas. Retorna o relatório da execução. """
+    teams = fetch_teams(base_url)
+    if len(teams) < 2:
+        raise ValueError("São necessários pelo menos dois times em /teams para montar as requisições")
+
+    samples, counter, lock = [], [0], threading.Lock()
+    started = time.perf_counter()
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=_client, args=(base_url, teams, mix, deadline, max_requests, counter, samples, lock, seed + i, cache_bust))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    report = summarize(samples, elapsed, concurrency)
+    report["mode"] = "cold" if cache_bust else "warm"
+    return report
+
+def _latency_stats(latencies, statuses, elapsed):
+    latencies_ms = np.asarray(latencies) * 1e3
+    statuses = np.asarray(statuses)
+    stats = {
+        "requests": len(latencies_ms),
+        "errors": int(((statuses == 0) | (statuses >= 500)).sum()),
+        "throughput": len(latencies_ms) / elapsed,
+        "mean_ms": float(latencies_ms.mean()),
+    }
+    for percentile, value in zip(PERCENTILES, np.percentile(latencies_ms, PERCENTILES)):
+        stats[f"p{percentile}_ms"] = float(value)
+    return stats
+
+def summarize(samples, elapsed, concurrency):
+    """ Vazão (requisições/s) e latências por endpoint e do total. Erros são respostas 5xx ou falhas de conexão. """
+    report = {"concurrency": concurrency, "elapsed_seconds": elapsed, "endpoints": {}}
+    if not samples:
+        return report
+    endpoints, latencies, statuses = zip(*samples)
+    endpoints = np.asarray(endpoints)
+    for endpoint in sorted(set(endpoints)):
+        selected = endpoints == endpoint
+        report["endpoints"][endpoint] = _latency_stats(np.asarray(latencies)[selected], np.asarray(statuses)[selected], elapsed)
+    report["total"] = _latency_stats(latencies, statuses, elapsed)
+    return report
+
+def compare_with_baseline(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    """ Variação relativa de vazão e latências em relação ao baseline, por endpoint.
+    Retorna (linhas da comparação, houve regressão além da tolerância). """
+    rows = []
+    regressed = False
+    current_endpoints = {**report["endpoints"], "total": report.get("total")}
+    baseline_endpoints = {**baseline["endpoints"], "total": baseline.get("total")}
+    for endpoint, stats in current_endpoints.items():
+        reference = baseline_endpoints.get(endpoint)
+        if not stats or not reference:
+            continue
+        for metric in ["throughput"] + [f"p{percentile}_ms" for percentile in PERCENTILES]:
+            if not reference[metric]:
+                continue
+            change = stats[metric] / reference[metric] - 1.0
+            # Menos vazão ou mais latência é pior
+            worse = -change if metric == "throughput" else change
+            regression = worse > tolerance
+            regressed |= regression
+            rows.append({"endpoint": endpoint, "metric": metric, "baseline": reference[metric],
+                         "current": stats[metric], "change": change, "regression": regression})
+    return rows, regressed
+
+def compare_modes(reports, baseline, tolerance=REGRESSION_TOLERANCE):
+    """ Compara cada modo ({modo: relatório}) com o mesmo modo do baseline. Um baseline de um único
+    relatório (formato anterior aos modos) vale como "warm". Retorna (linhas com o modo, houve regressão). """
+    baseline_reports = baseline if "endpoints" not in baseline else {"warm": baseline}
+    rows, regressed = [], False
+    for mode, report in reports.items():
+        if mode not in baseline_reports:
+            continue
+        mode_rows, mode_regressed = compare_with_baseline(report, baseline_reports[mode], tolerance)
+        rows.extend({**row, "mode": mode} for row in mode_rows)
+        regressed |= mode_regressed
+    return rows, regressed
+
+def format_report(report):
+    lines = [f"Modo {report.get('mode', 'warm')}, concorrência {report['concurrency']}, {report['elapsed_seconds']:.1f}s",
+             f"{'endpoint':<28}{'req':>7}{'erros':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+    for endpoint, stats in [*report["endpoints"].items(), ("total", report.get("total"))]:
+        if stats:
+            lines.append(f"{endpoint:<28}{stats['requests']:>7}{stats['errors']:>7}{stats['throughput']:>9.1f}"
+                         f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+    return "\n".join(lines)
+
+def format_comparison(rows):
+    lines = [f"{'modo':<6}{'endpoint':<28}{'métrica':<12}{'baseline':>10}{'atual':>10}{'variação':>10}"]
+    for row in rows:
+        flag = "  <- regressão" if row["regression"] else ""
+        lines.append(f"{row.get('mode', 'warm'):<6}{row['endpoint']:<28}{row['metric']:<12}{row['baseline']:>10.1f}{row['current']:>10.1f}{row['change']:>+10.1%}{flag}")
+    return "\n".join(lines)
+
+if __name__ == '__main__':
+    # Uso: python load_test.py [--url http://127.0.0.1:10000 | --start [--port 10000] [--workers N]]
+    #                          [--mode cold|warm|both] [--concurrency 8] [--duration 30] [--requests N] [--seed 0]
+    #                          [--save-baseline baseline.json] [--baseline baseline.json] [--tolerance 0.1]
+    # Com --mode both (padrão), roda primeiro o modo cold e depois o warm, com a mesma duração cada.
+    def _arg(flag, default=None):
+        return sys.argv[sys.argv.index(flag) + 1] if flag in sys.argv else default
+
+    port = int(_arg("--port", DEFAULT_PORT))
+    base_url = _arg("--url", f"http://127.0.0.1:{port}").rstrip("/")
+    mode = _arg("--mode", "both")
+    modes = MODES if mode == "both" else [mode]
+    if any(mode not in MODES for mode in modes):
+        print(f"Modo inválido: use {', '.join(MODES)} ou both")
+        sys.exit(1)
+    server = None
+    if "--start" in sys.argv:
+        workers = _arg("--workers")
+        server = start_server(port, [] if workers is None else ["--workers", workers])
+        print(f"Servidor iniciado: {' '.join(render_start_command(port))}")
+
+    reports = {}
+    try:
+        max_requests = _arg("--requests")
+        for mode in modes:
+            reports[mode] = run_load(base_url, int(_arg("--concurrency", DEFAULT_CONCURRENCY)), float(_arg("--duration", DEFAULT_DURATION)),
+                                     None if max_requests is None else int(max_requests), seed=int(_arg("--seed", 0)),
+                                     cache_bust=mode == "cold")
+    finally:
+        if server is not None:
+            stop_server(server)
+    print("\n\n".join(format_report(report) for report in reports.values()))
+
+    save_file = _arg("--save-baseline")
+    if save_file:
+        with open(save_file, "w") as f:
+            json.dump(reports, f, indent=4)
+        print(f"Baseline salvo em {save_file}")
+
+    baseline_file = _arg("--baseline")
+    if baseline_file:
+        if not os.path.exists(baseline_file):
+            print(f"Baseline {baseline_file} não encontrado")
+            sys.exit(1)
+        with open(baseline_file) as f:
+            rows, regressed = compare_modes(reports, json.load(f), float(_arg("--tolerance", REGRESSION_TOLERANCE)))
+        print(format_comparison(rows))
+        sys.exit(1 if regressed else 0)
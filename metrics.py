@@ -0,0 +1,214 @@
+import abc
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Métricas em memória do processo, expostas no formato texto do Prometheus em /metrics.
+# Cada worker do gunicorn tem as próprias métricas: o rótulo pid distingue os workers na coleta,
+# e as séries devem ser somadas entre eles (ex: sum without (pid) (...)) nos painéis.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILER_INTERVAL = 0.005  # 5 ms entre amostras de pilha
+PROFILER_MAX_DEPTH = 64
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+class _Metric(abc.ABC):
+    """ Base das métricas: séries indexadas pelos valores dos rótulos, protegidas por um lock. """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    @abc.abstractmethod
+    def _samples(self):
+        """ Amostras da métrica como (sufixo do nome, rótulos, valor). """
+
+    def render(self, extra_labels=()):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(tuple(labels) + tuple(extra_labels))} {value:.17g}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [("", zip(self.labelnames, key), value) for key, value in sorted(self._series.items())]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def _samples(self):
+        with self._lock:
+            return [("", zip(self.labelnames, key), value) for key, value in sorted(self._series.items())]
+
+class Histogram(_Metric):
+    """ Histograma cumulativo com buckets fixos (em segundos, para latências). """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Contagens por bucket (o último é o +Inf), soma e total de observações
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", labels + [("le", "+Inf" if bound == float("inf") else f"{bound:g}")], cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+REQUEST_LATENCY = Histogram("aurora13_request_duration_seconds", "Latência das requisições HTTP por endpoint.",
+                            ["endpoint", "method", "status"])
+STAGE_LATENCY = Histogram("aurora13_stage_duration_seconds", "Latência de cada etapa do processamento das requisições.",
+                          ["endpoint", "stage"])
+CACHE_REQUESTS = Counter("aurora13_cache_requests_total", "Consultas aos caches em memória, por resultado (hit ou miss).",
+                         ["cache", "result"])
+MODEL_LOADS = Counter("aurora13_model_loads_total", "Cargas (e recargas) de modelos pelo ModelRegistry.", ["model"])
+MODEL_VERSION = Gauge("aurora13_model_version_info", "Versão carregada de cada modelo (valor sempre 1).", ["model", "version"])
+DATA_VERSION = Gauge("aurora13_data_version", "Contador de versão de cada tabela em data_versions.", ["table"])
+PROCESS_START = Gauge("aurora13_process_start_time_seconds", "Horário de início do processo (epoch).")
+ALL_METRICS = [REQUEST_LATENCY, STAGE_LATENCY, CACHE_REQUESTS, MODEL_LOADS, MODEL_VERSION, DATA_VERSION, PROCESS_START]
+PROCESS_START.set(time.time())
+
+# Endpoint da requisição em andamento em cada thread, usado como rótulo das etapas
+_current = threading.local()
+
+def begin_request(endpoint):
+    _current.endpoint = endpoint
+
+def end_request():
+    _current.endpoint = None
+
+@contextmanager
+def stage_timer(stage):
+    """ Mede o bloco como uma etapa do endpoint em andamento (ou "none" fora de requisições). """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, endpoint=getattr(_current, "endpoint", None) or "none", stage=stage)
+
+def count_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def set_model_versions(versions):
+    """ Atualiza o gauge com as versões carregadas ({modelo: versão}), removendo as versões substituídas. """
+    MODEL_VERSION.clear()
+    for model, version in versions.items():
+        MODEL_VERSION.set(1, model=model, version=version)
+
+def render_metrics():
+    """ Todas as métricas no formato texto do Prometheus (versão 0.0.4). """
+    extra_labels = [("pid", os.getpid())]
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render(extra_labels))
+    return "\n".join(lines) + "\n"
+
+class SamplingProfiler:
+    """ Profiler por amostragem: uma thread lê periodicamente a pilha de todas as outras threads
+    (sys._current_frames) e conta as pilhas no formato "collapsed" (func1;func2;func3 N),
+    que pode ser convertido em flame graph. O custo fica na thread de amostragem, não nas requisições. """
+
+    def __init__(self, interval=PROFILER_INTERVAL, max_depth=PROFILER_MAX_DEPTH):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = collections.Counter()
+        self.pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        # A thread de amostragem não sobrevive ao fork dos workers
+        return self._thread is not None and self._thread.is_alive() and self.pid == os.getpid()
+
+    def start(self):
+        if self.running:
+            return
+        self.pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self.pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = [self._stack(frame) for thread_id, frame in sys._current_frames().items() if thread_id != own_id]
+            with self._lock:
+                self.samples.update(stacks)
+
+    def collapsed(self, limit=None):
+        """ Pilhas amostradas no formato collapsed, das mais frequentes para as menos frequentes. """
+        with self._lock:
+            stacks = self.samples.most_common(limit)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
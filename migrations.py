@@ -0,0 +1,192 @@
+import sqlite3
+from data_versions import bump_data_version
+from db import DB_FILE, create_connection
+
+# A versão do esquema fica em PRAGMA user_version; cada migração roda uma única vez, em ordem.
+
+def column_exists(conn, table, column):
+    """ Verifica se a coluna já existe na tabela. """
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+def add_column_if_missing(conn, table, column, column_type):
+    """ Adiciona uma coluna apenas se ela ainda não existir (ALTER TABLE idempotente). """
+    if not column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+def _initial_schema(conn):
+    """ Tabelas matches e xg_data, como criadas originalmente pelos scripts de ingestão. """
+    conn.execute(""" CREATE TABLE IF NOT EXISTS matches (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        country TEXT,
+                        league TEXT,
+                        season TEXT,
+                        date TEXT,
+                        time TEXT,
+                        home_team TEXT,
+                        away_team TEXT,
+                        home_goals INTEGER,
+                        away_goals INTEGER,
+                        result TEXT,
+                        psc_home_odds REAL,
+                        psc_draw_odds REAL,
+                        psc_away_odds REAL,
+                        max_c_home_odds REAL,
+                        max_c_draw_odds REAL,
+                        max_c_away_odds REAL,
+                        avg_c_home_odds REAL,
+                        avg_c_draw_odds REAL,
+                        avg_c_away_odds REAL
+                    ); """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS xg_data (
+            match_id INTEGER PRIMARY KEY,
+            home_team TEXT,
+            away_team TEXT,
+            home_xg REAL,
+            away_xg REAL
+        );
+    """)
+
+def _add_average_odds_columns(conn):
+    """ Colunas de odds médias, antes adicionadas com ALTER TABLE direto em calculate_odds. """
+    for column in ["avg_home_odds", "avg_draw_odds", "avg_away_odds"]:
+        add_column_if_missing(conn, "matches", column, "REAL")
+
+def _create_hot_column_indexes(conn):
+    """ Índices para os filtros por temporada e por time usados pela API e pelos treinos. """
+    # Cobre /teams (DISTINCT por temporada) e as buscas de jogos por temporada
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_season_teams ON matches (season, home_team, away_team)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_home_team ON matches (home_team, season)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_away_team ON matches (away_team, season)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_xg_data_home_team ON xg_data (home_team)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_xg_data_away_team ON xg_data (away_team)")
+    conn.execute("ANALYZE")
+
+def _unique_match_key(conn):
+    """ Chave natural única de matches, usada pelo upsert da ingestão.
+    Remove antes as duplicatas criadas por ingestões repetidas, mantendo o jogo de menor id. Só entram
+    na deduplicação jogos com a chave completa (sem NULL), que o índice único também não cobre.
+    Os registros de xg_data das duplicatas passam para o jogo mantido (ou são removidos, se ele já tiver xG). """
+    conn.execute("""
+        CREATE TEMP TABLE duplicate_matches AS
+        SELECT m.id AS id, k.keep_id AS keep_id
+        FROM matches m JOIN (
+            SELECT league, season, date, home_team, away_team, MIN(id) AS keep_id FROM matches
+            WHERE league IS NOT NULL AND season IS NOT NULL AND date IS NOT NULL
+              AND home_team IS NOT NULL AND away_team IS NOT NULL
+            GROUP BY league, season, date, home_team, away_team HAVING COUNT(*) > 1
+        ) k USING (league, season, date, home_team, away_team)
+        WHERE m.id <> k.keep_id
+    """)
+    changes_before = conn.total_changes
+    # Um único registro de xG por jogo mantido: o dele, ou o da duplicata de menor id
+    conn.execute("""
+        DELETE FROM xg_data WHERE match_id IN (SELECT id FROM duplicate_matches) AND match_id NOT IN (
+            SELECT MIN(x.match_id) FROM xg_data x JOIN duplicate_matches d ON d.id = x.match_id
+            WHERE d.keep_id NOT IN (SELECT match_id FROM xg_data)
+            GROUP BY d.keep_id
+        )
+    """)
+    conn.execute("""
+        UPDATE xg_data SET match_id = (SELECT keep_id FROM duplicate_matches d WHERE d.id = xg_data.match_id)
+        WHERE match_id IN (SELECT id FROM duplicate_matches)
+    """)
+    xg_changed = conn.total_changes > changes_before
+    deleted = conn.execute("DELETE FROM matches WHERE id IN (SELECT id FROM duplicate_matches)").rowcount
+    conn.execute("DROP TABLE temp.duplicate_matches")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_natural_key ON matches (league, season, date, home_team, away_team)")
+
+    # Snapshots Parquet e caches de respostas são invalidados pela versão dos dados
+    if deleted:
+        bump_data_version(conn, "matches")
+    if xg_changed:
+        bump_data_version(conn, "xg_data")
+
+def _statsbomb_xg_support(conn):
+    """ Temporada em xg_data (os jogos do StatsBomb não existem em matches) e controle dos
+    arquivos de eventos já processados, para o processamento incremental. """
+    add_column_if_missing(conn, "xg_data", "season", "TEXT")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS xg_processed_files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        );
+    """)
+
+def _xg_data_source_key(conn):
+    """ Origem do xG na chave de xg_data: os match_id do StatsBomb e os ids de matches são espaços de
+    chaves diferentes, que antes podiam sobrescrever um ao outro no upsert. A chave passa a ser (source, match_id).
+    Registros existentes cujo match_id não aponta para um jogo de matches com os mesmos times vêm do StatsBomb. """
+    conn.execute("""
+        CREATE TABLE xg_data_new (
+            source TEXT NOT NULL DEFAULT 'matches',
+            match_id INTEGER NOT NULL,
+            home_team TEXT,
+            away_team TEXT,
+            home_xg REAL,
+            away_xg REAL,
+            season TEXT,
+            PRIMARY KEY (source, match_id)
+        );
+    """)
+    conn.execute("""
+        INSERT INTO xg_data_new (source, match_id, home_team, away_team, home_xg, away_xg, season)
+        SELECT CASE WHEN EXISTS (SELECT 1 FROM matches m WHERE m.id = x.match_id AND m.home_team = x.home_team
+                                 AND m.away_team = x.away_team) THEN 'matches' ELSE 'statsbomb' END,
+               x.match_id, x.home_team, x.away_team, x.home_xg, x.away_xg, x.season
+        FROM xg_data x
+    """)
+    conn.execute("DROP TABLE xg_data")
+    conn.execute("ALTER TABLE xg_data_new RENAME TO xg_data")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_xg_data_home_team ON xg_data (home_team)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_xg_data_away_team ON xg_data (away_team)")
+    bump_data_version(conn, "xg_data")
+
+def _drop_skellam_team_stats(conn):
+    """ Remove a tabela skellam_team_stats e as versões dela: o modelo Skellam usa só a posterior
+    amostrada, e as médias por time não são mais lidas por nenhuma rota. """
+    conn.execute("DROP TABLE IF EXISTS skellam_team_stats")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_versions'").fetchone():
+        conn.execute("DELETE FROM data_versions WHERE name LIKE 'skellam_team_stats:%'")
+
+# (versão, descrição, função); novas migrações entram sempre no final, com a próxima versão
+MIGRATIONS = [
+    (1, "esquema inicial (matches, xg_data)", _initial_schema),
+    (2, "colunas de odds médias em matches", _add_average_odds_columns),
+    (3, "índices de temporada e times em matches e xg_data", _create_hot_column_indexes),
+    (4, "chave natural única em matches", _unique_match_key),
+    (5, "temporada em xg_data e controle de arquivos do StatsBomb", _statsbomb_xg_support),
+    (6, "origem do xG (matches ou StatsBomb) na chave de xg_data", _xg_data_source_key),
+    (7, "remoção da tabela skellam_team_stats", _drop_skellam_team_stats),
+]
+
+def get_schema_version(conn):
+    """ Retorna a versão atual do esquema do banco. """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn):
+    """ Aplica, em ordem e cada uma em sua própria transação, as migrações ainda não aplicadas.
+    Retorna a versão final do esquema. """
+    current_version = get_schema_version(conn)
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        try:
+            conn.execute("BEGIN")
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            print(f"Migração {version} aplicada: {description}")
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        current_version = version
+    return current_version
+
+if __name__ == '__main__':
+    conn = create_connection(DB_FILE)
+    if conn:
+        version = apply_migrations(conn)
+        print(f"Esquema do banco de dados na versão {version}.")
+        conn.close()
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+# Cada treino publica um artefato versionado em model_versions/<modelo>/ e só então troca o arquivo
+# de parâmetros "ativo" lido pela API. As duas escritas são atômicas (arquivo temporário + rename),
+# então um worker nunca lê um arquivo pela metade; o ModelRegistry detecta a troca sem reiniciar.
+MODEL_VERSIONS_FOLDER = "model_versions"
+KEEP_VERSIONS = 5
+
+def write_atomic(path, content):
+    """ Grava o conteúdo (texto ou bytes) num arquivo temporário no mesmo diretório e o renomeia para o destino. """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        # mkstemp cria o arquivo só para o dono; os artefatos precisam ser legíveis pelos workers
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "wb" if isinstance(content, bytes) else "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def content_version(content):
+    """ Versão de um conteúdo: os 12 primeiros dígitos do sha256, a mesma usada pelo ModelRegistry. """
+    return hashlib.sha256(content.encode()).hexdigest()[:12]
+
+def _versions_folder(name, folder):
+    return os.path.join(folder, name)
+
+def list_versions(name, folder=MODEL_VERSIONS_FOLDER):
+    """ Lista os artefatos publicados do modelo, do mais recente para o mais antigo, como (versão, caminho). """
+    versions_folder = _versions_folder(name, folder)
+    if not os.path.isdir(versions_folder):
+        return []
+    # Os nomes começam com o horário da publicação, então a ordem alfabética é a cronológica
+    files = sorted((file for file in os.listdir(versions_folder) if file.endswith(".json")), reverse=True)
+    return [(os.path.splitext(file)[0].rsplit("_", 1)[-1], os.path.join(versions_folder, file)) for file in files]
+
+def active_version(params_file):
+    """ Versão do arquivo de parâmetros ativo, ou None se ele não existir. """
+    try:
+        with open(params_file) as f:
+            return content_version(f.read())
+    except FileNotFoundError:
+        return None
+
+def _prune_versions(name, params_file, keep, folder):
+    """ Remove os artefatos mais antigos além dos `keep` mais recentes, preservando sempre o ativo. """
+    current = active_version(params_file)
+    for version, path in list_versions(name, folder)[keep:]:
+        if version != current:
+            os.remove(path)
+
+def publish_params(model_params, name, params_file, keep=KEEP_VERSIONS, folder=MODEL_VERSIONS_FOLDER):
+    """ Publica novos parâmetros: grava o artefato versionado, troca o arquivo ativo e poda as versões antigas.
+    Retorna a versão publicada. """
+    content = json.dumps(model_params, indent=4)
+    version = content_version(content)
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    write_atomic(os.path.join(_versions_folder(name, folder), f"{timestamp}_{version}.json"), content)
+    write_atomic(params_file, content)
+    _prune_versions(name, params_file, keep, folder)
+    return version
+
+def rollback_params(name, params_file, version=None, folder=MODEL_VERSIONS_FOLDER):
+    """ Volta o arquivo ativo para uma versão publicada anteriormente.
+    Sem `version`, usa a versão imediatamente anterior à ativa. Retorna a versão restaurada. """
+    versions = list_versions(name, folder)
+    if version is None:
+        current = active_version(params_file)
+        position = next((i for i, (published, _) in enumerate(versions) if published == current), None)
+        if position is None or position + 1 >= len(versions):
+            raise ValueError(f"Nenhuma versão anterior do modelo {name} para restaurar")
+        version = versions[position + 1][0]
+
+    path = next((path for published, path in versions if published == version), None)
+    if path is None:
+        raise ValueError(f"Versão {version} do modelo {name} não encontrada em {_versions_folder(name, folder)}")
+    with open(path) as f:
+        write_atomic(params_file, f.read())
+    return version
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from metrics import MODEL_LOADS
+
+logger = logging.getLogger(__name__)
+
+def _read_file(path):
+    """ Lê o arquivo e retorna (stat do arquivo aberto, conteúdo, sha256 do conteúdo). O stat é o do
+    arquivo efetivamente lido, que pode ter sido trocado (rename atômico) depois de um os.stat anterior. """
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        content = f.read()
+    return stat, content, hashlib.sha256(content).hexdigest()
+
+def _json_loader(content):
+    """ Loader padrão: interpreta o conteúdo do arquivo como JSON. """
+    return json.loads(content)
+
+class ModelRegistry:
+    """ Registro em memória dos parâmetros dos modelos.
+    Cada modelo é carregado uma única vez por worker e recarregado apenas quando o mtime/tamanho
+    do arquivo muda e o hash do conteúdo é diferente (o hash vem do manifesto do loader, quando ele
+    o publica, em vez de ler o arquivo de novo). A troca é atômica: quem está lendo continua
+    com a versão anterior até a nova estar completamente carregada. """
+
+    def __init__(self, check_interval=1.0):
+        # Intervalo mínimo (em segundos) entre verificações do arquivo no disco
+        self.check_interval = check_interval
+        self._sources = {}
+        self._entries = {}
+        self._last_check = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, loader=_json_loader):
+        """ Registra um modelo pelo nome, com o caminho do arquivo de parâmetros e a função de carga. """
+        self._sources[name] = (path, loader)
+        self._entries.pop(name, None)
+        self._last_check.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._sources
+
+    def get(self, name):
+        """ Retorna (parâmetros, versão) do modelo. Levanta FileNotFoundError se nunca foi treinado. """
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is None or now - self._last_check.get(name, 0) >= self.check_interval:
+            entry = self._refresh(name, now)
+        return entry["params"], entry["version"]
+
+    def loaded_versions(self):
+        """ Versões dos modelos já carregados neste processo: {nome: versão}. """
+        return {name: entry["version"] for name, entry in list(self._entries.items())}
+
+    def version(self, name):
+        """ Retorna apenas o identificador de versão do modelo. """
+        return self.get(name)[1]
+
+    def _refresh(self, name, now):
+        """ Verifica o arquivo no disco e recarrega o modelo se o conteúdo mudou. """
+        path, loader = self._sources[name]
+        with self._lock:
+            entry = self._entries.get(name)
+            self._last_check[name] = now
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                if entry is None:
+                    raise
+                logger.warning(f"Arquivo de parâmetros {path} não encontrado. Mantendo a versão {entry['version']}.")
+                return entry
+
+            if entry is not None and (entry["mtime"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+                return entry
+
+            # Loaders com manifesto (shared_arrays) informam o hash do conteúdo sem que o arquivo seja lido
+            published_hash = getattr(loader, "published_hash", None)
+            content_hash = published_hash(stat) if published_hash is not None else None
+            content = None
+            if content_hash is None:
+                stat, content, content_hash = _read_file(path)
+
+            if entry is not None and entry["hash"] == content_hash:
+                entry = dict(entry, mtime=stat.st_mtime_ns, size=stat.st_size)
+                self._entries[name] = entry
+                return entry
+
+            try:
+                params = loader.load_published(content_hash) if content is None else None
+                if params is None:
+                    if content is None:
+                        # Versão do manifesto já podada: carrega (e republica) a partir do arquivo
+                        stat, content, content_hash = _read_file(path)
+                    params = loader(content)
+                    record = getattr(loader, "record", None)
+                    if record is not None:
+                        record(stat, content_hash)
+            except ValueError as e:
+                # Arquivo em escrita ou corrompido: mantém a versão anterior, se houver
+                if entry is None:
+                    raise
+                logger.error(f"Erro ao recarregar o modelo {name}: {e}. Mantendo a versão {entry['version']}.")
+                return entry
+
+            entry = {
+                "params": params,
+                "version": content_hash[:12],
+                "hash": content_hash,
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size
+            }
+            self._entries[name] = entry
+            MODEL_LOADS.inc(model=name)
+            logger.info(f"Modelo {name} carregado (versão {entry['version']}).")
+            return entry
@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import pandas as pd
+from data_versions import get_data_version
+from db import DB_FILE, create_connection
+from migrations import column_exists
+
+# Snapshots colunares de matches e xg_data, particionados por liga e temporada.
+# O pyarrow é opcional: sem ele (ou com snapshot desatualizado) as leituras voltam para o SQLite.
+PARQUET_FOLDER = "parquets"
+PARTITION_COLUMNS = ["league", "season"]
+VERSION_FILE = "_snapshot_version.json"
+
+def _dataset_path(dataset, folder):
+    return os.path.join(folder, dataset)
+
+def _read_xg_table(conn):
+    """ Lê xg_data com liga e temporada; a temporada gravada no xG (StatsBomb) tem prioridade sobre a de matches. """
+    xg_season = "x.season" if column_exists(conn, "xg_data", "season") else "NULL"
+    # Só os registros com origem em matches apontam para matches.id (os do StatsBomb têm ids próprios)
+    matches_source = "AND x.source = 'matches'" if column_exists(conn, "xg_data", "source") else ""
+    return pd.read_sql_query(f"""
+        SELECT x.match_id, x.home_team, x.away_team, x.home_xg, x.away_xg,
+               m.league AS league, COALESCE({xg_season}, m.season, '') AS season
+        FROM xg_data x LEFT JOIN matches m ON m.id = x.match_id {matches_source}
+    """, conn)
+
+def _write_dataset(df, dataset, data_version, folder):
+    """ Grava o dataset particionado numa pasta temporária e a troca pela pasta final,
+    para que leitores nunca vejam um snapshot pela metade. """
+    final_path = _dataset_path(dataset, folder)
+    tmp_path = final_path + ".tmp"
+    old_path = final_path + ".old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    df.to_parquet(tmp_path, partition_cols=PARTITION_COLUMNS, index=False)
+    with open(os.path.join(tmp_path, VERSION_FILE), "w") as f:
+        json.dump({"data_version": data_version}, f)
+
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(final_path):
+        os.replace(final_path, old_path)
+    os.replace(tmp_path, final_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def write_snapshots(conn, folder=PARQUET_FOLDER):
+    """ Grava os snapshots Parquet de matches e xg_data. Chamada após cada ingestão. """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("pyarrow não instalado: snapshots Parquet não gerados.")
+        return False
+
+    os.makedirs(folder, exist_ok=True)
+    matches = pd.read_sql_query("SELECT * FROM matches", conn)
+    matches["season"] = matches["season"].astype(str)
+    _write_dataset(matches, "matches", get_data_version(conn, "matches"), folder)
+
+    xg_data = _read_xg_table(conn)
+    # A liga e a temporada do xG dependem de matches, então o snapshot guarda as duas versões
+    _write_dataset(xg_data, "xg_data", [get_data_version(conn, "xg_data"), get_data_version(conn, "matches")], folder)
+    print(f"Snapshots Parquet gravados em {folder} ({len(matches)} jogos, {len(xg_data)} registros de xG).")
+    return True
+
+def _read_dataset(dataset, data_version, columns, seasons, leagues, folder):
+    """ Lê apenas as colunas e partições pedidas do snapshot, se ele existir e estiver na versão atual.
+    Retorna None caso contrário. """
+    path = _dataset_path(dataset, folder)
+    try:
+        with open(os.path.join(path, VERSION_FILE)) as f:
+            if json.load(f)["data_version"] != data_version:
+                return None
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except (FileNotFoundError, ImportError, ValueError, KeyError):
+        return None
+
+    filters = []
+    if seasons is not None:
+        filters.append(("season", "in", [str(season) for season in seasons]))
+    if leagues is not None:
+        filters.append(("league", "in", list(leagues)))
+    partitioning = ds.partitioning(pa.schema([("league", pa.string()), ("season", pa.string())]), flavor="hive")
+
+    df = pd.read_parquet(path, columns=columns, filters=filters or None, partitioning=partitioning)
+    for column in PARTITION_COLUMNS:
+        if columns is None or column in columns:
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+    return df
+
+def _sql_filters(seasons, leagues, season_column="season", league_column="league"):
+    """ Monta a cláusula WHERE equivalente aos filtros de partição. """
+    conditions = []
+    params = []
+    if seasons is not None:
+        conditions.append(f"{season_column} IN ({','.join('?' for _ in seasons)})")
+        params += [str(season) for season in seasons]
+    if leagues is not None:
+        conditions.append(f"{league_column} IN ({','.join('?' for _ in leagues)})")
+        params += list(leagues)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+def read_matches(conn, columns, seasons=None, leagues=None, folder=PARQUET_FOLDER):
+    """ Lê colunas de matches filtradas por temporada/liga, do snapshot Parquet quando atualizado
+    ou do SQLite caso contrário. As linhas vêm ordenadas por id quando a coluna id é pedida. """
+    df = _read_dataset("matches", get_data_version(conn, "matches"), columns, seasons, leagues, folder)
+    if df is None:
+        where, params = _sql_filters(seasons, leagues)
+        df = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM matches{where}", conn, params=params)
+    if "id" in columns:
+        df = df.sort_values("id", kind="stable").reset_index(drop=True)
+    return df
+
+def read_xg_data(conn, columns, seasons=None, leagues=None, folder=PARQUET_FOLDER):
+    """ Lê colunas de xg_data (com liga e temporada) do snapshot Parquet quando atualizado,
+    ou do SQLite caso contrário. """
+    data_version = [get_data_version(conn, "xg_data"), get_data_version(conn, "matches")]
+    df = _read_dataset("xg_data", data_version, columns, seasons, leagues, folder)
+    if df is None:
+        df = _read_xg_table(conn)
+        if seasons is not None:
+            df = df[df["season"].isin([str(season) for season in seasons])]
+        if leagues is not None:
+            df = df[df["league"].isin(list(leagues))]
+        df = df[columns].reset_index(drop=True)
+    return df
+
+if __name__ == '__main__':
+    conn = create_connection(DB_FILE)
+    if conn:
+        write_snapshots(conn)
+        conn.close()
@@ -1,35 +1,28 @@
-
 import json
+import os
 import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-
-DB_FILE = "database.db"
-MATCHES_JSON_FILE = "../matches_copa_america_2024.json" # Ainda não usaremos este para xG
-
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file)
-        print(f"Conexão com o banco de dados {db_file} estabelecida.")
-    except sqlite3.Error as e:
-        print(e)
-    return conn
+from data_versions import bump_data_version
+from db import DB_FILE, create_connection
+from migrations import apply_migrations
+from parquet_snapshots import write_snapshots
+from skellam_bayesian_model import compute_team_aggregates
+from xg_differential_model import refresh_xg_team_stats
+
+MATCHES_JSON_FILE = "../matches_copa_america_2024.json"
+# Pasta com os arquivos de eventos no formato StatsBomb (um arquivo <match_id>.json por jogo)
+EVENTS_FOLDER = "../events"
+JSON_CHUNK_SIZE = 1024 * 1024  # leitura dos arquivos de eventos em blocos de 1 MiB
+SHOOTOUT_PERIOD = 5
+# Origem dos registros de xg_data: os match_id do StatsBomb não são ids de matches
+STATSBOMB_SOURCE = "statsbomb"
 
 def create_xg_table(conn):
-    """ Cria a tabela xg_data no banco de dados. """
+    """ Cria a tabela xg_data no banco de dados, aplicando as migrações pendentes. """
     try:
-        c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS xg_data (
-                match_id INTEGER PRIMARY KEY,
-                home_team TEXT,
-                away_team TEXT,
-                home_xg REAL,
-                away_xg REAL
-            );
-        """)
-        conn.commit()
+        apply_migrations(conn)
         print("Tabela xg_data criada ou já existente.")
     except sqlite3.Error as e:
         print(e)
@@ -37,55 +30,184 @@ def create_xg_table(conn):
 def calculate_and_insert_simplified_xg(conn):
     """ Calcula estimativas simplificadas de xG e insere na tabela xg_data. """
     df_matches = pd.read_sql_query("SELECT id, home_team, away_team, home_goals, away_goals, season FROM matches WHERE season = '2025'", conn)
-    
+
     # Remove linhas com valores NaN nas colunas de gols
     df_matches.dropna(subset=["home_goals", "away_goals"], inplace=True)
 
-    teams = pd.concat([df_matches["home_team"], df_matches["away_team"]]).unique()
-    team_avg_goals = {}
-
-    for team in teams:
-        # Gols marcados
-        scored_home = df_matches[df_matches["home_team"] == team]["home_goals"].sum()
-        scored_away = df_matches[df_matches["away_team"] == team]["away_goals"].sum()
-        total_scored = scored_home + scored_away
-
-        # Gols sofridos
-        conceded_home = df_matches[df_matches["home_team"] == team]["away_goals"].sum()
-        conceded_away = df_matches[df_matches["away_team"] == team]["home_goals"].sum()
-        total_conceded = conceded_home + conceded_away
-
-        # Número de jogos
-        num_games_home = len(df_matches[df_matches["home_team"] == team])
-        num_games_away = len(df_matches[df_matches["away_team"] == team])
-        total_games = num_games_home + num_games_away
-
-        team_avg_goals[team] = {
-            "avg_scored": total_scored / total_games if total_games > 0 else 0,
-            "avg_conceded": total_conceded / total_games if total_games > 0 else 0
-        }
-
-    c = conn.cursor()
-    for index, row in df_matches.iterrows():
-        match_id = row["id"]
-        home_team = row["home_team"]
-        away_team = row["away_team"]
-
-        # Estimativa simplificada de xG
-        home_xg = team_avg_goals[home_team]["avg_scored"]
-        away_xg = team_avg_goals[away_team]["avg_scored"]
-
-        c.execute("INSERT OR REPLACE INTO xg_data (match_id, home_team, away_team, home_xg, away_xg) VALUES (?, ?, ?, ?, ?)",
-                  (match_id, home_team, away_team, home_xg, away_xg))
+    # Média de gols marcados por time, com um único groupby
+    aggregates = compute_team_aggregates(df_matches).set_index("team")
+    avg_scored = aggregates["goals_scored"] / aggregates["matches"]
+
+    # Estimativa simplificada de xG
+    df_matches["home_xg"] = df_matches["home_team"].map(avg_scored).astype(float)
+    df_matches["away_xg"] = df_matches["away_team"].map(avg_scored).astype(float)
+
+    conn.executemany("INSERT OR REPLACE INTO xg_data (source, match_id, home_team, away_team, home_xg, away_xg, season) VALUES ('matches', ?, ?, ?, ?, ?, ?)",
+                     [(int(match_id), home_team, away_team, home_xg, away_xg, season) for match_id, home_team, away_team, home_xg, away_xg, season
+                      in df_matches[["id", "home_team", "away_team", "home_xg", "away_xg", "season"]].itertuples(index=False)])
+    bump_data_version(conn, "xg_data")
     conn.commit()
     print("Estimativas simplificadas de xG inseridas na tabela xg_data.")
 
+def iter_json_array(path, chunk_size=JSON_CHUNK_SIZE):
+    """ Itera sobre os elementos de um array JSON no topo do arquivo sem carregar o arquivo inteiro:
+    o texto é lido em blocos e cada elemento é decodificado assim que estiver completo no buffer.
+    Levanta ValueError se o arquivo não for um array JSON válido (sem "[", vírgulas a mais ou a menos, incompleto). """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8-sig") as f:
+        buffer = ""
+        position = 0
+        eof = False
+        in_array = False
+        # Depois de um elemento vem "," ou "]"; depois de "[" ou de uma vírgula vem um elemento (ou "]", logo após "[")
+        expect_separator = False
+        after_comma = False
+
+        while True:
+            # Pula espaços entre os tokens, lendo mais do arquivo se necessário
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n":
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                buffer, position = f.read(chunk_size), 0
+                eof = not buffer
+
+            if position >= len(buffer):
+                if in_array:
+                    raise ValueError(f"Array JSON incompleto em {path}")
+                raise ValueError(f"O arquivo {path} não contém um array JSON")
+
+            char = buffer[position]
+            if not in_array:
+                if char != "[":
+                    raise ValueError(f"O arquivo {path} não contém um array JSON")
+                in_array = True
+                position += 1
+                continue
+
+            if char == "]":
+                if after_comma:
+                    raise ValueError(f"Vírgula antes de ']' no array JSON de {path}")
+                return
+            if expect_separator:
+                if char != ",":
+                    raise ValueError(f"Esperada ',' ou ']' entre os elementos do array JSON de {path}")
+                expect_separator, after_comma = False, True
+                position += 1
+                continue
+            if char == ",":
+                raise ValueError(f"Vírgula sem elemento no array JSON de {path}")
+
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+                # Um número pode ter sido cortado no fim do buffer e ainda assim ser decodificado ("1.5" de "1.5e-10"):
+                # o elemento só está completo se vier seguido de um separador ou se o arquivo acabou
+                complete = eof or (end < len(buffer) and buffer[end] in " \t\r\n,]")
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+
+            if not complete:
+                more = f.read(chunk_size)
+                eof = not more
+                buffer, position = buffer[position:] + more, 0
+                continue
+
+            yield element
+            position = end
+            expect_separator, after_comma = True, False
+            if position > chunk_size:
+                buffer, position = buffer[position:], 0
+
+def load_statsbomb_matches(matches_file=MATCHES_JSON_FILE):
+    """ Lê o arquivo de jogos do StatsBomb: match_id -> (mandante, visitante, temporada). """
+    matches = {}
+    for match in iter_json_array(matches_file):
+        matches[match["match_id"]] = (
+            match["home_team"]["home_team_name"],
+            match["away_team"]["away_team_name"],
+            str(match.get("season", {}).get("season_name", ""))
+        )
+    return matches
+
+def sum_shot_xg(events_file):
+    """ Soma o statsbomb_xg dos chutes de cada time em um arquivo de eventos, sem a disputa de pênaltis.
+    Retorna (match_id, {time: xG}); o match_id vem do nome do arquivo. """
+    match_id = int(os.path.splitext(os.path.basename(events_file))[0])
+    team_xg = {}
+    for event in iter_json_array(events_file):
+        # O período 5 é a disputa de pênaltis, que não conta como xG do jogo
+        if event.get("type", {}).get("name") != "Shot" or event.get("period") == SHOOTOUT_PERIOD:
+            continue
+        team = event["team"]["name"]
+        team_xg[team] = team_xg.get(team, 0.0) + event.get("shot", {}).get("statsbomb_xg", 0.0)
+    return match_id, team_xg
+
+def _pending_event_files(conn, events_folder):
+    """ Lista os arquivos de eventos novos ou modificados desde o último processamento. """
+    processed = {path: (size, mtime_ns) for path, size, mtime_ns
+                 in conn.execute("SELECT path, size, mtime_ns FROM xg_processed_files")}
+    pending = []
+    for name in sorted(os.listdir(events_folder)):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.abspath(os.path.join(events_folder, name))
+        stat = os.stat(path)
+        if processed.get(path) != (stat.st_size, stat.st_mtime_ns):
+            pending.append((path, stat.st_size, stat.st_mtime_ns))
+    return pending
+
+def process_statsbomb_events(conn, events_folder=EVENTS_FOLDER, matches_file=MATCHES_JSON_FILE, max_workers=None):
+    """ Calcula o xG de cada jogo a partir dos eventos do StatsBomb e grava em xg_data.
+    Só processa arquivos novos ou modificados, em paralelo entre processos, e grava tudo
+    com um upsert em lote numa única transação. Retorna o número de jogos gravados. """
+    matches = load_statsbomb_matches(matches_file)
+    pending = _pending_event_files(conn, events_folder)
+    if not pending:
+        print("Nenhum arquivo de eventos novo ou modificado.")
+        return 0
+
+    rows = []
+    missing = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for match_id, team_xg in executor.map(sum_shot_xg, [path for path, _, _ in pending], chunksize=8):
+            if match_id not in matches:
+                missing += 1
+                continue
+            home_team, away_team, season = matches[match_id]
+            rows.append((STATSBOMB_SOURCE, match_id, home_team, away_team, team_xg.get(home_team, 0.0), team_xg.get(away_team, 0.0), season))
+
+    conn.execute("BEGIN")
+    try:
+        conn.executemany("""
+            INSERT INTO xg_data (source, match_id, home_team, away_team, home_xg, away_xg, season) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(source, match_id) DO UPDATE SET home_team = excluded.home_team, away_team = excluded.away_team,
+                home_xg = excluded.home_xg, away_xg = excluded.away_xg, season = excluded.season
+        """, rows)
+        conn.executemany("INSERT OR REPLACE INTO xg_processed_files (path, size, mtime_ns) VALUES (?, ?, ?)", pending)
+        if rows:
+            bump_data_version(conn, "xg_data")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    print(f"xG de {len(rows)} jogos gravado na tabela xg_data a partir de {len(pending)} arquivos de eventos.")
+    if missing:
+        print(f"Aviso: {missing} arquivos de eventos sem o jogo correspondente em {matches_file}.")
+    return len(rows)
+
 if __name__ == '__main__':
     conn = create_connection(DB_FILE)
     if conn:
         create_xg_table(conn)
-        calculate_and_insert_simplified_xg(conn)
+        if "--statsbomb" in sys.argv:
+            process_statsbomb_events(conn)
+        else:
+            calculate_and_insert_simplified_xg(conn)
+        # Agregados de xG por time materializados aqui, fora do caminho das requisições
+        refresh_xg_team_stats(conn)
+        write_snapshots(conn)
         conn.close()
-
-
-
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Cache das respostas HTTP. A chave inclui a rota, os parâmetros e as versões de tudo de que a resposta
+# depende (parâmetros do modelo e dados de matches/xg_data), então uma entrada nunca fica desatualizada
+# por troca de modelo ou ingestão: a versão nova simplesmente gera outra chave. O TTL só limita quanto
+# tempo uma entrada ocupa memória. O ETag é derivado da mesma chave, o que permite responder 304 a um
+# GET condicional sem calcular a previsão.
+RESPONSE_CACHE_SIZE = 4096
+RESPONSE_CACHE_TTL = 300  # segundos
+PRUNE_PROBABILITY = 0.01  # fração das escritas no armazenamento compartilhado que removem entradas expiradas
+
+def cache_key(path, args, versions):
+    """ Chave da resposta: rota, parâmetros da query em ordem canônica e versões das dependências. """
+    return json.dumps([path, sorted(args.items(multi=True)), versions], separators=(",", ":"), default=str)
+
+def etag_for(key):
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+class SQLiteCacheStore:
+    """ Armazenamento compartilhado entre os workers num arquivo SQLite local (WAL, uma conexão por thread). """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+        conn.commit()
+
+    def _connection(self):
+        conn = get_connection(self.db_file)
+        if conn is None:
+            raise RuntimeError(f"Não foi possível abrir o cache compartilhado {self.db_file}")
+        return conn
+
+    def get(self, key, now):
+        row = self._connection().execute("SELECT body, expires_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        return bytes(row[0]), row[1]
+
+    def set(self, key, body, expires_at):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO response_cache (key, body, expires_at) VALUES (?, ?, ?)", (key, body, expires_at))
+        if random.random() < PRUNE_PROBABILITY:
+            conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        conn.commit()
+
+class ResponseCache:
+    """ LRU em memória com TTL, opcionalmente apoiado num armazenamento compartilhado entre os workers.
+    Guarda o corpo das respostas (bytes); a leitura consulta primeiro a memória e depois o compartilhado. """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Retorna o corpo em cache para a chave, ou None. """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+
+        if self.store is not None:
+            try:
+                entry = self.store.get(key, now)
+            except Exception as e:
+                # O cache compartilhado é só uma otimização: em caso de erro, a resposta é recalculada
+                logger.error(f"Erro ao ler o cache compartilhado: {e}")
+                entry = None
+            if entry is not None:
+                self._put(key, *entry)
+                return entry[0]
+        return None
+
+    def set(self, key, body):
+        expires_at = time.time() + self.ttl
+        self._put(key, body, expires_at)
+        if self.store is not None:
+            try:
+                self.store.set(key, body, expires_at)
+            except Exception as e:
+                logger.error(f"Erro ao gravar no cache compartilhado: {e}")
+
+    def _put(self, key, body, expires_at):
+        with self._lock:
+            self._entries[key] = (body, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
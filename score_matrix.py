@@ -0,0 +1,102 @@
+import numpy as np
+
+# Limite padrão de gols por time na matriz de placares (o mesmo das versões anteriores da API);
+# a massa acima dele é contabilizada em tail_mass. Valores maiores podem ser pedidos com max_goals.
+MAX_GOALS = 5
+OVER_UNDER_LINES = [0.5, 1.5, 2.5, 3.5, 4.5]
+ASIAN_HANDICAP_LINES = [-2.5, -2.0, -1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0, 2.5]
+
+def poisson_pmf_vectors(rates, max_goals=MAX_GOALS):
+    """ Retorna um array (*rates.shape, max_goals + 1) com P(X = k) para cada taxa de Poisson. """
+    # P(X = 0) = exp(-taxa) e P(X = k) = P(X = k - 1) * taxa / k, num produto acumulado vetorizado
+    # (sem o custo por chamada do scipy.stats, e sem log(0) para taxas nulas)
+    rates = np.asarray(rates, dtype=float)[..., None]
+    ratios = np.broadcast_to(rates / np.arange(1, max_goals + 1), (*rates.shape[:-1], max_goals))
+    pmf = np.concatenate([np.ones_like(rates), np.cumprod(ratios, axis=-1)], axis=-1)
+    return pmf * np.exp(-rates)
+
+def score_matrix(lambda_home, mu_away, max_goals=MAX_GOALS):
+    """ Monta as matrizes de placar (linha = gols do mandante, coluna = gols do visitante) a partir do
+    produto externo dos vetores de Poisson. As taxas podem ter qualquer formato (ex: jogos, ou times x times);
+    as matrizes ocupam os dois últimos eixos.
+    Retorna (matriz, tail_mass), onde tail_mass é a probabilidade de placares fora da matriz. """
+    prob_matrix = poisson_pmf_vectors(lambda_home, max_goals)[..., :, None] * poisson_pmf_vectors(mu_away, max_goals)[..., None, :]
+    tail_mass = np.clip(1.0 - prob_matrix.sum(axis=(-2, -1)), 0.0, 1.0)
+    return prob_matrix, tail_mass
+
+def _captured_mass(prob_matrix):
+    """ Massa de probabilidade dentro da matriz, usada para renormalizar os mercados (0 vira 1). """
+    total = prob_matrix.sum(axis=(-2, -1))
+    return np.where(total > 0, total, 1.0)
+
+def outcomes_from_matrix(prob_matrix):
+    """ Probabilidades de vitória do mandante, empate e vitória do visitante, renormalizadas. """
+    total = _captured_mass(prob_matrix)
+    # Abaixo da diagonal: gols do mandante > gols do visitante
+    prob_home_win = np.tril(prob_matrix, k=-1).sum(axis=(-2, -1)) / total
+    prob_draw = np.trace(prob_matrix, axis1=-2, axis2=-1) / total
+    prob_away_win = np.triu(prob_matrix, k=1).sum(axis=(-2, -1)) / total
+    return prob_home_win, prob_draw, prob_away_win
+
+def outcome_probabilities(lambda_home, mu_away, max_goals=MAX_GOALS):
+    """ Calcula as probabilidades de vitória do mandante, empate e vitória do visitante
+    para vários jogos de uma vez. As probabilidades são normalizadas pela massa dentro da matriz
+    para somar 1 (jogos com massa zero ficam com 0). """
+    prob_matrix, _ = score_matrix(lambda_home, mu_away, max_goals)
+    return outcomes_from_matrix(prob_matrix)
+
+def derive_markets(prob_matrix, tail_mass, over_under_lines=OVER_UNDER_LINES, handicap_lines=ASIAN_HANDICAP_LINES):
+    """ Deriva todos os mercados de uma vez a partir das mesmas matrizes de placar:
+    1X2, over/under de gols, ambos marcam (BTTS), handicap asiático (linhas inteiras e meias) e placar exato.
+    As probabilidades são renormalizadas pela massa dentro da matriz, exceto no over/under: todo placar fora da
+    matriz tem mais de max_goals gols, então tail_mass entra no "over" (exato para linhas abaixo de max_goals + 1). """
+    size = prob_matrix.shape[-1]
+    home_goals, away_goals = np.indices((size, size))
+    total = _captured_mass(prob_matrix)
+    flat_matrix = prob_matrix.reshape(*prob_matrix.shape[:-2], size * size)
+
+    # Distribuições do total de gols e da diferença de gols, somando as diagonais da matriz
+    total_goals = np.eye(2 * size - 1)[(home_goals + away_goals).ravel()]
+    total_goals_dist = flat_matrix @ total_goals / total[..., None]
+    goal_difference = np.eye(2 * size - 1)[(home_goals - away_goals + size - 1).ravel()]
+    goal_difference_dist = flat_matrix @ goal_difference / total[..., None]
+    differences = np.arange(-(size - 1), size)
+
+    prob_home_win, prob_draw, prob_away_win = outcomes_from_matrix(prob_matrix)
+    goal_totals = np.arange(2 * size - 1)
+
+    # Distribuição do total de gols sem renormalizar, para somar a cauda ao "over"
+    raw_total_goals_dist = total_goals_dist * total[..., None]
+    over_under = {}
+    for line in over_under_lines:
+        over_under[str(line)] = {
+            "over": raw_total_goals_dist[..., goal_totals > line].sum(axis=-1) + tail_mass,
+            "under": raw_total_goals_dist[..., goal_totals < line].sum(axis=-1)
+        }
+
+    btts_yes = prob_matrix[..., 1:, 1:].sum(axis=(-2, -1)) / total
+
+    # Handicap asiático na perspectiva do mandante: ganha se (diferença + linha) > 0, devolve se == 0
+    asian_handicap = {}
+    for line in handicap_lines:
+        adjusted = differences + line
+        asian_handicap[str(line)] = {
+            "home": goal_difference_dist[..., adjusted > 0].sum(axis=-1),
+            "push": goal_difference_dist[..., adjusted == 0].sum(axis=-1),
+            "away": goal_difference_dist[..., adjusted < 0].sum(axis=-1)
+        }
+
+    return {
+        "match_result": {"home_win": prob_home_win, "draw": prob_draw, "away_win": prob_away_win},
+        "over_under": over_under,
+        "btts": {"yes": btts_yes, "no": 1.0 - btts_yes},
+        "asian_handicap": asian_handicap,
+        "correct_score": prob_matrix / total[..., None, None],
+        "tail_mass": tail_mass
+    }
+
+def markets_to_json(markets):
+    """ Converte os mercados de um único jogo (arrays escalares) em tipos serializáveis. """
+    if isinstance(markets, dict):
+        return {key: markets_to_json(value) for key, value in markets.items()}
+    return np.asarray(markets).tolist()
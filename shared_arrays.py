@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from model_artifacts import write_atomic
+
+# Arrays de modelos compartilhados entre os workers do gunicorn por mmap.
+# Cada versão de um modelo é extraída uma única vez para shared_arrays/<modelo>/<versão>/<array>.npy;
+# os workers abrem os arquivos com np.load(mmap_mode="r"), então as páginas ficam no cache do sistema
+# operacional uma vez só, em vez de uma cópia por worker. Os arrays mapeados são somente leitura.
+# Quem publica uma versão grava também shared_arrays/<modelo>/manifest.json com o mtime/tamanho do arquivo
+# do modelo e o sha256 do conteúdo: os demais processos obtêm a versão pelo manifesto e só mapeiam os
+# arrays, sem ler nem calcular o hash do arquivo do modelo de novo.
+SHARED_ARRAYS_FOLDER = "shared_arrays"
+MANIFEST_FILE = "manifest.json"
+KEEP_SHARED_VERSIONS = 2
+
+def _version_folder(name, version, folder):
+    # O nome do modelo pode ter ":" (ex: skellam_bayesian:2025), que não convém em nomes de diretório
+    return os.path.join(folder, name.replace(":", "_"), version)
+
+def attach_arrays(name, version, folder=SHARED_ARRAYS_FOLDER):
+    """ Mapeia os arrays publicados da versão do modelo, ou retorna None se ela ainda não foi publicada. """
+    version_folder = _version_folder(name, version, folder)
+    if not os.path.isdir(version_folder):
+        return None
+    return {os.path.splitext(file)[0]: np.load(os.path.join(version_folder, file), mmap_mode="r", allow_pickle=False)
+            for file in sorted(os.listdir(version_folder)) if file.endswith(".npy")}
+
+def publish_arrays(name, version, arrays, folder=SHARED_ARRAYS_FOLDER, keep=KEEP_SHARED_VERSIONS):
+    """ Grava os arrays da versão num diretório temporário e o renomeia para o destino, de forma atômica.
+    Se outro processo publicou a mesma versão antes, mantém a dele. Poda as versões mais antigas. """
+    model_folder = os.path.dirname(_version_folder(name, version, folder))
+    os.makedirs(model_folder, exist_ok=True)
+    tmp_folder = tempfile.mkdtemp(dir=model_folder, prefix=".tmp-")
+    try:
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp_folder, f"{key}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+        os.chmod(tmp_folder, 0o755)
+        try:
+            os.rename(tmp_folder, _version_folder(name, version, folder))
+        except OSError:
+            if not os.path.isdir(_version_folder(name, version, folder)):
+                raise
+    finally:
+        if os.path.exists(tmp_folder):
+            shutil.rmtree(tmp_folder)
+    _prune_arrays(model_folder, version, keep)
+
+def _prune_arrays(model_folder, current, keep):
+    """ Remove as versões mais antigas (por data de publicação), preservando a atual. Os workers que ainda
+    mapeiam uma versão removida continuam lendo normalmente: o arquivo só some quando o último mapeamento fecha. """
+    versions = sorted((entry for entry in os.scandir(model_folder) if entry.is_dir() and not entry.name.startswith(".")),
+                      key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[keep:]:
+        if entry.name != current:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+def _manifest_path(name, folder):
+    return os.path.join(os.path.dirname(_version_folder(name, "", folder)), MANIFEST_FILE)
+
+def read_manifest(name, folder=SHARED_ARRAYS_FOLDER):
+    """ Manifesto da última versão publicada do modelo, ou None se não houver (ou estiver ilegível). """
+    try:
+        with open(_manifest_path(name, folder)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_manifest(name, stat, content_hash, folder=SHARED_ARRAYS_FOLDER):
+    """ Registra que o arquivo do modelo com este mtime/tamanho tem o conteúdo com este sha256. """
+    write_atomic(_manifest_path(name, folder), json.dumps({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                                                           "sha256": content_hash}))
+
+class SharedArrayLoader:
+    """ Loader do ModelRegistry para modelos formados por arrays.
+    `read_arrays(content)` extrai os arrays do arquivo do modelo e `build(arrays)` monta o objeto usado nas
+    previsões. O primeiro processo a carregar uma versão publica os arrays e o manifesto; os demais só
+    consultam o manifesto (published_hash) e mapeiam os arrays (load_published). """
+
+    def __init__(self, name, read_arrays, build, folder=SHARED_ARRAYS_FOLDER):
+        self.name = name
+        self.read_arrays = read_arrays
+        self.build = build
+        self.folder = folder
+
+    def published_hash(self, stat):
+        """ sha256 do conteúdo, pelo manifesto, se ele descreve o arquivo com este mtime/tamanho; senão None. """
+        manifest = read_manifest(self.name, self.folder)
+        if manifest is None or (manifest.get("mtime_ns"), manifest.get("size")) != (stat.st_mtime_ns, stat.st_size):
+            return None
+        return manifest.get("sha256")
+
+    def load_published(self, content_hash):
+        """ Monta o modelo a partir dos arrays já publicados, ou retorna None se a versão não existe mais. """
+        arrays = attach_arrays(self.name, content_hash[:12], self.folder)
+        return None if arrays is None else self.build(arrays)
+
+    def record(self, stat, content_hash):
+        write_manifest(self.name, stat, content_hash, self.folder)
+
+    def __call__(self, content):
+        # A mesma versão calculada pelo ModelRegistry (12 primeiros dígitos do sha256 do conteúdo)
+        version = hashlib.sha256(content).hexdigest()[:12]
+        arrays = attach_arrays(self.name, version, self.folder)
+        if arrays is None:
+            publish_arrays(self.name, version, self.read_arrays(content), self.folder)
+            arrays = attach_arrays(self.name, version, self.folder)
+        return self.build(arrays)
+
+def shared_array_loader(name, read_arrays, build, folder=SHARED_ARRAYS_FOLDER):
+    return SharedArrayLoader(name, read_arrays, build, folder)
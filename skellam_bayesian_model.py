@@ -1,138 +1,374 @@
 
 import pandas as pd
 import numpy as np
-import sqlite3
-from scipy.stats import poisson
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from scipy.special import gammaln
+from score_matrix import MAX_GOALS, derive_markets, markets_to_json, outcomes_from_matrix
+from db import DB_FILE, create_connection
+from model_artifacts import write_atomic
+from parquet_snapshots import read_matches
 
-# Para uma implementação bayesiana mais completa, seria necessário usar bibliotecas como PyMC3 ou Stan.
-# No entanto, para manter a complexidade e o tempo de execução gerenciáveis no ambiente do sandbox,
-# faremos uma abordagem simplificada que se aproxima do conceito Bayesiano.
+# Modelo hierárquico de ataque/defesa: os gols de cada time seguem Poisson (a diferença de gols é Skellam) com
+#   log(lambda_casa) = intercepto + vantagem_casa + ataque[casa] - defesa[visitante]
+#   log(mu_fora)     = intercepto + ataque[visitante] - defesa[casa]
+# ataque ~ N(0, sigma_ataque²) e defesa ~ N(0, sigma_defesa²), com sigmas ~ HalfNormal(1) aprendidos dos dados.
+# A posterior é amostrada com HMC (gradiente analítico vetorizado em NumPy), uma cadeia por processo,
+# e as amostras ficam num cache binário (.npz, float32) usado nas previsões.
+POSTERIOR_FOLDER = "skellam_posteriors"
+NUM_CHAINS = 4
+NUM_WARMUP = 500
+NUM_DRAWS = 500  # por cadeia
+THIN = 2  # guarda uma a cada THIN amostras: 4 x 500 / 2 = 1000 amostras no cache
+LEAPFROG_STEPS = 16
+TARGET_ACCEPT = 0.8
+PREDICT_CHUNK_SIZE = 128  # jogos por bloco na previsão em lote (limita a memória de jogos x amostras x gols)
+CREDIBLE_INTERVAL = (5, 95)
 
-DB_FILE = "database.db"
+def compute_team_aggregates(df):
+    """ Agrega gols marcados, sofridos e número de jogos por (temporada, time) com um único groupby.
+    Cada jogo aparece duas vezes: uma do ponto de vista do mandante e outra do visitante. """
+    home = pd.DataFrame({"season": df["season"].astype(str), "team": df["home_team"],
+                         "goals_scored": df["home_goals"], "goals_conceded": df["away_goals"]})
+    away = pd.DataFrame({"season": df["season"].astype(str), "team": df["away_team"],
+                         "goals_scored": df["away_goals"], "goals_conceded": df["home_goals"]})
 
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
+    return (pd.concat([home, away], ignore_index=True)
+            .groupby(["season", "team"], sort=False)
+            .agg(goals_scored=("goals_scored", "sum"),
+                 goals_conceded=("goals_conceded", "sum"),
+                 matches=("goals_scored", "size"))
+            .reset_index())
+
+def _read_finished_matches(conn, seasons=None):
+    """ Lê os jogos finalizados das temporadas pedidas (todas, se None), do snapshot Parquet ou do SQLite. """
+    df = read_matches(conn, ["season", "home_team", "away_team", "home_goals", "away_goals"], seasons)
+    return df.dropna(subset=["home_goals", "away_goals"])
+
+def _split_params(theta, num_teams):
+    """ Separa o vetor de parâmetros (não centrado): intercepto, vantagem de casa, log dos sigmas e escores z. """
+    intercept, home_advantage, log_sigma_attack, log_sigma_defense = theta[:4]
+    z_attack = theta[4:4 + num_teams]
+    z_defense = theta[4 + num_teams:]
+    return intercept, home_advantage, log_sigma_attack, log_sigma_defense, z_attack, z_defense
+
+def log_posterior_and_gradient(theta, home_goals, away_goals, home_team_indices, away_team_indices, num_teams):
+    """ Log da posterior (a menos de constantes) e seu gradiente, vetorizados sobre todos os jogos. """
+    intercept, home_advantage, log_sigma_attack, log_sigma_defense, z_attack, z_defense = _split_params(theta, num_teams)
+    sigma_attack, sigma_defense = np.exp(log_sigma_attack), np.exp(log_sigma_defense)
+    attack = sigma_attack * z_attack
+    defense = sigma_defense * z_defense
+
+    log_lambda = intercept + home_advantage + attack[home_team_indices] - defense[away_team_indices]
+    log_mu = intercept + attack[away_team_indices] - defense[home_team_indices]
+    lambda_home, mu_away = np.exp(log_lambda), np.exp(log_mu)
+
+    log_posterior = (np.dot(home_goals, log_lambda) - lambda_home.sum() + np.dot(away_goals, log_mu) - mu_away.sum()
+                     # Priors: N(0, 1) no intercepto, na vantagem de casa e nos escores z; HalfNormal(1) nos sigmas
+                     - 0.5 * (intercept ** 2 + home_advantage ** 2 + np.dot(z_attack, z_attack) + np.dot(z_defense, z_defense))
+                     - 0.5 * (sigma_attack ** 2 + sigma_defense ** 2) + log_sigma_attack + log_sigma_defense)
+
+    # Resíduos (gols - esperado) acumulados por time
+    residual_home = home_goals - lambda_home
+    residual_away = away_goals - mu_away
+    grad_attack = (np.bincount(home_team_indices, residual_home, num_teams)
+                   + np.bincount(away_team_indices, residual_away, num_teams))
+    grad_defense = -(np.bincount(away_team_indices, residual_home, num_teams)
+                     + np.bincount(home_team_indices, residual_away, num_teams))
+
+    gradient = np.concatenate([
+        [residual_home.sum() + residual_away.sum() - intercept,
+         residual_home.sum() - home_advantage,
+         np.dot(grad_attack, attack) - sigma_attack ** 2 + 1.0,
+         np.dot(grad_defense, defense) - sigma_defense ** 2 + 1.0],
+        sigma_attack * grad_attack - z_attack,
+        sigma_defense * grad_defense - z_defense
+    ])
+    return log_posterior, gradient
+
+def _hmc_transition(theta, log_posterior, gradient, step_size, num_steps, inverse_mass, rng, target):
+    """ Uma transição de HMC (leapfrog + aceitação de Metropolis). Retorna o novo estado e a probabilidade de aceitação. """
+    momentum = rng.standard_normal(theta.shape) / np.sqrt(inverse_mass)
+    initial_energy = -log_posterior + 0.5 * np.dot(momentum ** 2, inverse_mass)
+
+    new_theta, new_log_posterior, new_gradient = theta, log_posterior, gradient
+    # Trajetórias divergentes (passos grandes no início do aquecimento) geram overflow e são rejeitadas
+    with np.errstate(over="ignore", invalid="ignore"):
+        momentum = momentum + 0.5 * step_size * new_gradient
+        for step in range(num_steps):
+            new_theta = new_theta + step_size * inverse_mass * momentum
+            new_log_posterior, new_gradient = target(new_theta)
+            if step < num_steps - 1:
+                momentum = momentum + step_size * new_gradient
+        momentum = momentum + 0.5 * step_size * new_gradient
+
+        energy_change = initial_energy - (-new_log_posterior + 0.5 * np.dot(momentum ** 2, inverse_mass))
+    accept_prob = float(np.exp(min(0.0, energy_change))) if np.isfinite(energy_change) else 0.0
+    if rng.random() < accept_prob:
+        return new_theta, new_log_posterior, new_gradient, accept_prob
+    return theta, log_posterior, gradient, accept_prob
+
+def run_chain(match_arrays, num_teams, seed, num_warmup=NUM_WARMUP, num_draws=NUM_DRAWS, num_steps=LEAPFROG_STEPS):
+    """ Executa uma cadeia de HMC. O aquecimento adapta o passo (dual averaging) e, na segunda metade,
+    uma matriz de massa diagonal estimada das amostras da primeira metade.
+    Retorna (amostras (num_draws, parâmetros), taxa média de aceitação). """
+    rng = np.random.default_rng(seed)
+    home_goals = match_arrays[0]
+    target = lambda theta: log_posterior_and_gradient(theta, *match_arrays, num_teams)
+
+    theta = np.zeros(4 + 2 * num_teams)
+    theta[0] = np.log(max(home_goals.mean(), 0.1))
+    theta[2:4] = np.log(0.3)
+    theta[4:] = 0.1 * rng.standard_normal(2 * num_teams)
+    log_posterior, gradient = target(theta)
+    inverse_mass = np.ones_like(theta)
+
+    def dual_averaging(step_size):
+        return {"mu": np.log(10 * step_size), "h_bar": 0.0, "log_step": np.log(step_size), "log_step_bar": 0.0, "m": 0}
+
+    step_size = 0.01
+    adaptation = dual_averaging(step_size)
+    warmup_draws = []
+    for iteration in range(num_warmup):
+        steps = int(rng.integers(num_steps // 2, num_steps + 1))
+        theta, log_posterior, gradient, accept_prob = _hmc_transition(theta, log_posterior, gradient, step_size, steps, inverse_mass, rng, target)
+
+        adaptation["m"] += 1
+        m = adaptation["m"]
+        adaptation["h_bar"] = (1 - 1 / (m + 10)) * adaptation["h_bar"] + (TARGET_ACCEPT - accept_prob) / (m + 10)
+        adaptation["log_step"] = adaptation["mu"] - np.sqrt(m) / 0.05 * adaptation["h_bar"]
+        adaptation["log_step_bar"] = m ** -0.75 * adaptation["log_step"] + (1 - m ** -0.75) * adaptation["log_step_bar"]
+        step_size = float(np.exp(adaptation["log_step"]))
+
+        if iteration >= num_warmup // 4:
+            warmup_draws.append(theta)
+        if iteration == num_warmup // 2:
+            # Massa diagonal a partir da variância das amostras, regularizada em direção a 1
+            count = len(warmup_draws)
+            variance = np.var(warmup_draws, axis=0)
+            inverse_mass = (count / (count + 5.0)) * variance + 1e-3 * (5.0 / (count + 5.0))
+            adaptation = dual_averaging(step_size)
+    step_size = float(np.exp(adaptation["log_step_bar"]))
+
+    draws = np.empty((num_draws, theta.size))
+    accepted = 0.0
+    for i in range(num_draws):
+        steps = int(rng.integers(num_steps // 2, num_steps + 1))
+        theta, log_posterior, gradient, accept_prob = _hmc_transition(theta, log_posterior, gradient, step_size, steps, inverse_mass, rng, target)
+        draws[i] = theta
+        accepted += accept_prob
+    return draws, accepted / num_draws
+
+def _split_rhat(chains):
+    """ R-hat com cadeias divididas ao meio, para cada parâmetro; chains tem formato (cadeias, amostras, parâmetros). """
+    half = chains.shape[1] // 2
+    split = np.concatenate([chains[:, :half], chains[:, half:2 * half]], axis=0)
+    within = split.var(axis=1, ddof=1).mean(axis=0)
+    between = half * split.mean(axis=1).var(axis=0, ddof=1)
+    variance = (half - 1) / half * within + between / half
+    return np.sqrt(variance / np.where(within > 0, within, np.inf))
+
+def fit_posterior(df, num_chains=NUM_CHAINS, num_warmup=NUM_WARMUP, num_draws=NUM_DRAWS, thin=THIN, max_workers=None, seed=0):
+    """ Amostra a posterior do modelo hierárquico com várias cadeias de HMC, uma por processo.
+    Retorna o dicionário de amostras (float32) de ataque, defesa, vantagem de casa e intercepto. """
+    all_teams = pd.concat([df["home_team"], df["away_team"]]).unique()
+    team_to_index = {team: i for i, team in enumerate(all_teams)}
+    num_teams = len(all_teams)
+    match_arrays = (df["home_goals"].to_numpy(dtype=float), df["away_goals"].to_numpy(dtype=float),
+                    df["home_team"].map(team_to_index).to_numpy(), df["away_team"].map(team_to_index).to_numpy())
+
+    seeds = np.random.SeedSequence(seed).spawn(num_chains)
+    with ProcessPoolExecutor(max_workers=max_workers or num_chains) as executor:
+        results = list(executor.map(run_chain, [match_arrays] * num_chains, [num_teams] * num_chains, seeds,
+                                    [num_warmup] * num_chains, [num_draws] * num_chains))
+    chains = np.stack([draws[::thin] for draws, _ in results])
+    acceptance = [rate for _, rate in results]
+
+    intercept, home_advantage, log_sigma_attack, log_sigma_defense, z_attack, z_defense = _split_params(chains.reshape(-1, chains.shape[-1]).T, num_teams)
+    attack = (np.exp(log_sigma_attack)[:, None] * z_attack.T).astype(np.float32)
+    defense = (np.exp(log_sigma_defense)[:, None] * z_defense.T).astype(np.float32)
+    # Convergência medida nos parâmetros identificáveis (taxas por time), não nos escores z
+    kept_draws = chains.shape[1]
+    identified = np.concatenate([chains[..., :2], attack.reshape(num_chains, kept_draws, -1), defense.reshape(num_chains, kept_draws, -1)], axis=-1)
+    max_rhat = float(np.nanmax(_split_rhat(identified)))
+    print(f"Posterior amostrada: {num_chains} cadeias x {kept_draws} amostras, aceitação média {np.mean(acceptance):.2f}, R-hat máximo {max_rhat:.3f}")
+
+    return {
+        "teams": np.asarray(all_teams, dtype=str),
+        "intercept": intercept.astype(np.float32),
+        "home_advantage": home_advantage.astype(np.float32),
+        "attack": attack,
+        "defense": defense
+    }
+
+def posterior_file(season="2025", folder=POSTERIOR_FOLDER):
+    return os.path.join(folder, f"{season}.npz")
+
+def save_posterior(posterior, path):
+    """ Grava as amostras num .npz sem compressão (leitura rápida), com troca atômica do arquivo. """
+    buffer = io.BytesIO()
+    np.savez(buffer, **posterior)
+    write_atomic(path, buffer.getvalue())
+
+def read_posterior_arrays(content):
+    """ Lê os arrays do conteúdo de um .npz de amostras. Levanta ValueError se o conteúdo for inválido. """
+    try:
+        with np.load(io.BytesIO(content), allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+    except Exception as e:
+        raise ValueError(f"Cache de amostras inválido: {e}")
+
+def posterior_from_arrays(arrays):
+    """ Monta a posterior usada nas previsões a partir dos arrays (em memória ou mapeados do disco). """
+    posterior = dict(arrays)
+    posterior["team_index"] = {team: i for i, team in enumerate(posterior["teams"].tolist())}
+    return posterior
+
+def load_posterior(content):
+    """ Lê o conteúdo de um .npz de amostras (loader do ModelRegistry) e monta o índice de times. """
+    return posterior_from_arrays(read_posterior_arrays(content))
+
+def read_posterior(path):
+    """ Lê as amostras salvas em disco, ou None se o arquivo não existir. """
     try:
-        conn = sqlite3.connect(db_file)
-        print(f"Conexão com o banco de dados {db_file} estabelecida.")
-    except sqlite3.Error as e:
-        print(e)
-    return conn
-
-def train_skellam_bayesian_model(conn):
-    """ Treina um modelo Skellam Bayesiano simplificado.
-    Esta é uma abordagem simplificada, pois uma implementação Bayesiana completa
-    geralmente envolve inferência via MCMC, que é computacionalmente intensiva.
-    Aqui, vamos estimar as taxas de gols médias para cada time e usar isso para
-    prever a diferença de gols.
-    """
-    df = pd.read_sql_query("SELECT home_team, away_team, home_goals, away_goals, season FROM matches", conn)
-
-    # Filtra os dados para a temporada de 2025
-    df = df[df["season"] == "2025"]
-
-    # Remove linhas com valores NaN nas colunas de gols
-    df.dropna(subset=["home_goals", "away_goals"], inplace=True)
-
-    # Calcula a média de gols marcados e sofridos por cada time
-    teams = pd.concat([df["home_team"], df["away_team"]]).unique()
-    team_stats = {}
-
-    for team in teams:
-        # Gols marcados em casa
-        home_scored = df[df["home_team"] == team]["home_goals"].sum()
-        home_matches = len(df[df["home_team"] == team])
-
-        # Gols marcados fora
-        away_scored = df[df["away_team"] == team]["away_goals"].sum()
-        away_matches = len(df[df["away_team"] == team])
-
-        # Gols sofridos em casa
-        home_conceded = df[df["home_team"] == team]["away_goals"].sum()
-
-        # Gols sofridos fora
-        away_conceded = df[df["away_team"] == team]["home_goals"].sum()
-
-        total_scored = home_scored + away_scored
-        total_conceded = home_conceded + away_conceded
-        total_matches = home_matches + away_matches
-
-        team_stats[team] = {
-            "avg_scored": total_scored / total_matches if total_matches > 0 else 0,
-            "avg_conceded": total_conceded / total_matches if total_matches > 0 else 0
-        }
-
-    return team_stats
-
-def predict_skellam_bayesian(home_team, away_team, team_stats):
-    """ Faz previsões de gols para um jogo usando o modelo Skellam Bayesiano simplificado. """
-    if home_team not in team_stats or away_team not in team_stats:
-        print(f"Erro: Time(s) não encontrado(s) nas estatísticas do modelo.")
+        with open(path, "rb") as f:
+            return load_posterior(f.read())
+    except FileNotFoundError:
         return None
 
-    # Estimativa das taxas de gols para o jogo
-    # Abordagem simplificada: taxa de gols do time da casa = avg_scored do time da casa
-    # taxa de gols do time visitante = avg_scored do time visitante
-    # Para uma abordagem mais sofisticada, considerar avg_conceded do adversário
-
-    # Taxa de gols esperados para o time da casa
-    lambda_home = team_stats[home_team]["avg_scored"]
-    # Taxa de gols esperados para o time visitante
-    mu_away = team_stats[away_team]["avg_scored"]
-
-    # Calcula as probabilidades para cada placar (até um certo limite de gols)
-    max_goals = 5 # Limite de gols para calcular as probabilidades
-    prob_matrix = np.zeros((max_goals + 1, max_goals + 1))
-
-    for i in range(max_goals + 1):
-        for j in range(max_goals + 1):
-            prob_home = poisson.pmf(i, lambda_home)
-            prob_away = poisson.pmf(j, mu_away)
-            prob_matrix[i, j] = prob_home * prob_away
-
-    # Probabilidades de resultado (Vitória Casa, Empate, Vitória Fora)
-    prob_home_win = np.sum(np.array([prob_matrix[i, j] for i in range(max_goals + 1) for j in range(max_goals + 1) if i > j]))
-    prob_draw = np.sum(np.array([prob_matrix[i, j] for i in range(max_goals + 1) for j in range(max_goals + 1) if i == j]))
-    prob_away_win = np.sum(np.array([prob_matrix[i, j] for i in range(max_goals + 1) for j in range(max_goals + 1) if i < j]))
-
-    # Normaliza as probabilidades para garantir que somem 1
-    total_prob = prob_home_win + prob_draw + prob_away_win
-    if total_prob > 0:
-        prob_home_win /= total_prob
-        prob_draw /= total_prob
-        prob_away_win /= total_prob
-    else:
-        # Caso não haja probabilidade, atribui 0 a todos
-        prob_home_win, prob_draw, prob_away_win = 0, 0, 0
+def _finished_matches_state(conn, season):
+    """ (número de jogos finalizados, maior id) da temporada, para saber se a posterior está atualizada. """
+    return conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM matches WHERE home_goals IS NOT NULL AND away_goals IS NOT NULL AND season = ?",
+                        (str(season),)).fetchone()
 
-    return {
-        "home_win": prob_home_win,
-        "draw": prob_draw,
-        "away_win": prob_away_win,
-        "lambda_home": lambda_home,
-        "mu_away": mu_away
+def train_skellam_bayesian_model(conn, season="2025", folder=POSTERIOR_FOLDER, **fit_options):
+    """ Ajusta o modelo Skellam Bayesiano hierárquico da temporada e grava o cache de amostras.
+    Retorna a posterior. """
+    df = _read_finished_matches(conn, [season])
+    posterior = fit_posterior(df, **fit_options)
+    posterior["state"] = np.array(_finished_matches_state(conn, season), dtype=np.int64)
+    path = posterior_file(season, folder)
+    save_posterior(posterior, path)
+    print(f"Amostras da posterior salvas em {path}")
+    return read_posterior(path)
+
+def refresh_skellam_posterior(conn, season="2025", folder=POSTERIOR_FOLDER, **fit_options):
+    """ Reajusta a posterior apenas se a temporada tem jogos finalizados novos desde o último ajuste. """
+    posterior = read_posterior(posterior_file(season, folder))
+    if posterior is not None and tuple(posterior.get("state", ())) == tuple(_finished_matches_state(conn, season)):
+        print("Nenhum jogo novo desde o último ajuste. Posterior mantida.")
+        return posterior
+    return train_skellam_bayesian_model(conn, season, folder, **fit_options)
+
+_LOG_FACTORIALS = {}
+
+def _poisson_pmf_from_log_rates(log_rates, max_goals):
+    """ P(X = k) para k = 0..max_goals a partir do log das taxas, num único exp vetorizado. """
+    log_factorials = _LOG_FACTORIALS.get(max_goals)
+    if log_factorials is None:
+        log_factorials = _LOG_FACTORIALS[max_goals] = gammaln(np.arange(max_goals + 1) + 1.0).astype(np.float32)
+    goals = np.arange(max_goals + 1, dtype=np.float32)
+    return np.exp(goals * log_rates[..., None] - np.exp(log_rates)[..., None] - log_factorials)
+
+def _posterior_predictive(posterior, home_indices, away_indices, max_goals):
+    """ Passo único sobre as amostras: taxas (jogos x amostras), matriz de placar preditiva média
+    e probabilidades 1X2 de cada amostra (para os intervalos de credibilidade). """
+    attack, defense = posterior["attack"], posterior["defense"]
+    log_lambda = posterior["intercept"] + posterior["home_advantage"] + attack[:, home_indices].T - defense[:, away_indices].T
+    log_mu = posterior["intercept"] + attack[:, away_indices].T - defense[:, home_indices].T
+
+    home_pmf = _poisson_pmf_from_log_rates(log_lambda, max_goals)
+    away_pmf = _poisson_pmf_from_log_rates(log_mu, max_goals)
+    num_draws = log_lambda.shape[-1]
+    # Média das matrizes de placar sobre as amostras: (gols x amostras) @ (amostras x gols)
+    prob_matrix = np.matmul(home_pmf.transpose(0, 2, 1), away_pmf).astype(float) / num_draws
+    tail_mass = np.clip(1.0 - prob_matrix.sum(axis=(-2, -1)), 0.0, 1.0)
+
+    # 1X2 por amostra sem montar as matrizes: P(casa) = sum_i P(X = i) * P(Y < i)
+    away_cdf = np.cumsum(away_pmf, axis=-1)
+    captured = home_pmf.sum(axis=-1) * away_cdf[..., -1]
+    captured = np.where(captured > 0, captured, 1.0)
+    draw_home_win = (home_pmf[..., 1:] * away_cdf[..., :-1]).sum(axis=-1) / captured
+    draw_draw = (home_pmf * away_pmf).sum(axis=-1) / captured
+    draw_outcomes = np.stack([draw_home_win, draw_draw, 1.0 - draw_home_win - draw_draw], axis=-1)
+    intervals = np.percentile(draw_outcomes, CREDIBLE_INTERVAL, axis=1)
+
+    return np.exp(log_lambda).mean(axis=-1), np.exp(log_mu).mean(axis=-1), prob_matrix, tail_mass, intervals
+
+def _intervals_to_json(intervals, position):
+    return {outcome: [float(intervals[0, position, k]), float(intervals[1, position, k])]
+            for k, outcome in enumerate(["home_win", "draw", "away_win"])}
+
+def predict_skellam_bayesian(home_team, away_team, posterior, max_goals=MAX_GOALS, include_markets=False):
+    """ Faz previsões de gols para um jogo com a posterior preditiva do modelo hierárquico:
+    a matriz de placares é a média das matrizes de todas as amostras, e os intervalos de credibilidade
+    das probabilidades vêm da distribuição delas entre as amostras.
+    Com include_markets=True, também devolve os mercados derivados da mesma matriz de placares. """
+    team_index = posterior["team_index"]
+    if home_team not in team_index or away_team not in team_index:
+        print("Erro: Time(s) não encontrado(s) nas amostras do modelo.")
+        return None
+
+    lambda_home, mu_away, prob_matrix, tail_mass, intervals = _posterior_predictive(
+        posterior, np.array([team_index[home_team]]), np.array([team_index[away_team]]), max_goals)
+    prob_home_win, prob_draw, prob_away_win = outcomes_from_matrix(prob_matrix[0])
+
+    prediction = {
+        "home_win": float(prob_home_win),
+        "draw": float(prob_draw),
+        "away_win": float(prob_away_win),
+        "lambda_home": float(lambda_home[0]),
+        "mu_away": float(mu_away[0]),
+        "credible_intervals": _intervals_to_json(intervals, 0)
     }
+    if include_markets:
+        prediction["markets"] = markets_to_json(derive_markets(prob_matrix[0], tail_mass[0]))
+    return prediction
+
+def predict_skellam_bayesian_batch(home_teams, away_teams, posterior, max_goals=MAX_GOALS):
+    """ Faz previsões para vários jogos de uma vez com a posterior preditiva, em blocos de jogos.
+    Retorna uma lista alinhada com os jogos de entrada; jogos com times desconhecidos ficam como None. """
+    team_index = posterior["team_index"]
+    known = np.array([home in team_index and away in team_index for home, away in zip(home_teams, away_teams)], dtype=bool)
+    predictions = [None] * len(known)
+    if not known.any():
+        return predictions
+
+    positions = np.flatnonzero(known)
+    home_indices = np.array([team_index[home_teams[i]] for i in positions])
+    away_indices = np.array([team_index[away_teams[i]] for i in positions])
+    for start in range(0, len(positions), PREDICT_CHUNK_SIZE):
+        chunk = slice(start, start + PREDICT_CHUNK_SIZE)
+        lambda_home, mu_away, prob_matrix, _, intervals = _posterior_predictive(posterior, home_indices[chunk], away_indices[chunk], max_goals)
+        prob_home_win, prob_draw, prob_away_win = outcomes_from_matrix(prob_matrix)
+        for j, i in enumerate(positions[chunk]):
+            predictions[i] = {
+                "home_win": float(prob_home_win[j]),
+                "draw": float(prob_draw[j]),
+                "away_win": float(prob_away_win[j]),
+                "lambda_home": float(lambda_home[j]),
+                "mu_away": float(mu_away[j]),
+                "credible_intervals": _intervals_to_json(intervals, j)
+            }
+    return predictions
 
 if __name__ == '__main__':
     conn = create_connection(DB_FILE)
     if conn:
-        print("Treinando o modelo Skellam Bayesiano simplificado...")
-        team_stats = train_skellam_bayesian_model(conn)
-        print("Modelo Skellam Bayesiano simplificado treinado com sucesso!")
+        print("Ajustando o modelo Skellam Bayesiano hierárquico...")
+        posterior = train_skellam_bayesian_model(conn)
+        print("Modelo Skellam Bayesiano treinado com sucesso!")
         
         # Exemplo de previsão
         print("\n--- Exemplo de Previsão ---")
         # Substitua por times da temporada 2025
-        prediction = predict_skellam_bayesian("Corinthians", "Flamengo RJ", team_stats)
+        prediction = predict_skellam_bayesian("Corinthians", "Flamengo RJ", posterior)
         if prediction:
-            print(f"Probabilidade de Vitória do Corinthians: {prediction['home_win']:.2f}")
+            print(f"Probabilidade de Vitória do Corinthians: {prediction['home_win']:.2f} (intervalo {prediction['credible_intervals']['home_win'][0]:.2f}-{prediction['credible_intervals']['home_win'][1]:.2f})")
             print(f"Probabilidade de Empate: {prediction['draw']:.2f}")
             print(f"Probabilidade de Vitória do Flamengo RJ: {prediction['away_win']:.2f}")
             print(f"Gols esperados para Corinthians (casa): {prediction['lambda_home']:.2f}")
             print(f"Gols esperados para Flamengo RJ (fora): {prediction['mu_away']:.2f}")
 
         conn.close()
-
-
-
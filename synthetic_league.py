@@ -0,0 +1,130 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from calculate_odds import calculate_average_odds
+from data_versions import bump_data_version
+from db import create_connection
+from ingest_data import create_table, ingest_csv_to_db
+from score_matrix import outcome_probabilities
+from xg_differential_model import refresh_xg_team_stats
+
+# Gerador de ligas sintéticas no formato do BRA.csv, para benchmarks e testes de escala.
+# Os gols seguem Poisson com ataque/defesa "verdadeiros" por time; as odds de fechamento são as
+# probabilidades verdadeiras com margem e ruído; o xG é a taxa verdadeira com ruído multiplicativo.
+HOME_ADVANTAGE = 0.25
+BASE_LOG_RATE = 0.15
+STRENGTH_SD = 0.3
+SEASON_DRIFT_SD = 0.1
+FIRST_SEASON = 2012
+# Margem de cada coluna de odds de fechamento: Pinnacle, máxima e média do mercado
+ODDS_MARGINS = {"PSC": 0.025, "MaxC": 0.01, "AvgC": 0.05}
+
+def round_robin(num_teams):
+    """ Tabela de turno e returno pelo método do círculo: lista de rodadas com pares (mandante, visitante). """
+    teams = list(range(num_teams + num_teams % 2))  # um time fictício folga quando o número é ímpar
+    rounds = []
+    for _ in range(len(teams) - 1):
+        pairs = [(teams[i], teams[-1 - i]) for i in range(len(teams) // 2)]
+        rounds.append([(home, away) for home, away in pairs if home < num_teams and away < num_teams])
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return rounds + [[(away, home) for home, away in fixtures] for fixtures in rounds]
+
+def generate_matches(num_teams=20, num_seasons=1, matches_per_season=None, num_leagues=1, first_season=FIRST_SEASON, seed=0):
+    """ Gera jogos sintéticos com as colunas do BRA.csv (mais HxG/AxG com o xG de cada time).
+    Por padrão, cada temporada é um turno e returno completo (num_teams * (num_teams - 1) jogos). """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for league_number in range(num_leagues):
+        league = f"Synthetic League {league_number + 1}"
+        teams = np.array([f"Team {league_number + 1}-{i + 1:03d}" for i in range(num_teams)])
+        attack = rng.normal(0.0, STRENGTH_SD, num_teams)
+        defense = rng.normal(0.0, STRENGTH_SD, num_teams)
+        schedule = round_robin(num_teams)
+        season_matches = matches_per_season or sum(len(fixtures) for fixtures in schedule)
+
+        for season in range(first_season, first_season + num_seasons):
+            attack += rng.normal(0.0, SEASON_DRIFT_SD, num_teams)
+            defense += rng.normal(0.0, SEASON_DRIFT_SD, num_teams)
+
+            # Repete o turno e returno até completar o número de jogos pedido, uma rodada por semana
+            fixtures = []
+            round_number = 0
+            while len(fixtures) < season_matches:
+                for home, away in schedule[round_number % len(schedule)]:
+                    fixtures.append((round_number, home, away))
+                round_number += 1
+            round_numbers, home, away = map(np.array, zip(*fixtures[:season_matches]))
+
+            lambda_home = np.exp(BASE_LOG_RATE + HOME_ADVANTAGE + attack[home] - defense[away])
+            mu_away = np.exp(BASE_LOG_RATE + attack[away] - defense[home])
+            home_goals = rng.poisson(lambda_home)
+            away_goals = rng.poisson(mu_away)
+            true_probs = np.column_stack(outcome_probabilities(lambda_home, mu_away))
+            dates = pd.Timestamp(f"{season}-04-05") + pd.to_timedelta(7 * round_numbers, unit="D")
+
+            frame = pd.DataFrame({
+                "Country": "Synthland",
+                "League": league,
+                "Season": season,
+                "Date": dates.strftime("%d/%m/%Y"),
+                "Time": "16:00",
+                "Home": teams[home],
+                "Away": teams[away],
+                "HG": home_goals,
+                "AG": away_goals,
+                "Res": np.select([home_goals > away_goals, home_goals == away_goals], ["H", "D"], "A")
+            })
+            for prefix, margin in ODDS_MARGINS.items():
+                noisy_probs = true_probs * rng.lognormal(0.0, 0.05, true_probs.shape)
+                odds = np.round(1.0 / (noisy_probs / noisy_probs.sum(axis=1, keepdims=True) * (1 + margin)), 2)
+                for outcome, column in enumerate("HDA"):
+                    frame[f"{prefix}{column}"] = odds[:, outcome]
+            frame["HxG"] = np.round(lambda_home * rng.lognormal(0.0, 0.25, len(frame)), 2)
+            frame["AxG"] = np.round(mu_away * rng.lognormal(0.0, 0.25, len(frame)), 2)
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def write_csv(matches, csv_file):
+    """ Grava os jogos sintéticos no formato do BRA.csv, pronto para o ingest_data. """
+    matches.to_csv(csv_file, index=False)
+    return csv_file
+
+def create_synthetic_database(db_file, num_teams=20, num_seasons=1, matches_per_season=None, num_leagues=1, seed=0):
+    """ Cria um banco com matches (pela ingestão normal do CSV) e xg_data sintéticos. Retorna os jogos gerados. """
+    matches = generate_matches(num_teams, num_seasons, matches_per_season, num_leagues, seed=seed)
+    csv_file = write_csv(matches, os.path.splitext(db_file)[0] + ".csv")
+
+    conn = create_connection(db_file)
+    try:
+        create_table(conn)
+        ingest_csv_to_db(conn, csv_file)
+        calculate_average_odds(conn)
+
+        # O xG é ligado aos ids gerados na ingestão pela chave natural do jogo
+        ids = pd.read_sql_query("SELECT id, league, season, date, home_team, away_team FROM matches", conn)
+        xg = matches.rename(columns={"League": "league", "Season": "season", "Date": "date", "Home": "home_team", "Away": "away_team"})
+        xg["season"] = xg["season"].astype(str)
+        xg = xg.merge(ids, on=["league", "season", "date", "home_team", "away_team"])
+        conn.executemany("INSERT OR REPLACE INTO xg_data (match_id, home_team, away_team, home_xg, away_xg, season) VALUES (?, ?, ?, ?, ?, ?)",
+                         xg[["id", "home_team", "away_team", "HxG", "AxG", "season"]].itertuples(index=False, name=None))
+        bump_data_version(conn, "xg_data")
+        conn.commit()
+        refresh_xg_team_stats(conn)
+    finally:
+        conn.close()
+    return matches
+
+if __name__ == '__main__':
+    # Uso: python synthetic_league.py ARQUIVO.db [--teams N] [--seasons N] [--matches N] [--leagues N] [--seed N]
+    def _arg(flag, default=None):
+        return sys.argv[sys.argv.index(flag) + 1] if flag in sys.argv else default
+
+    if len(sys.argv) < 2 or sys.argv[1].startswith("--"):
+        print("Informe o arquivo do banco de dados sintético (ex: python synthetic_league.py synthetic.db --teams 20)")
+        sys.exit(1)
+    matches_per_season = _arg("--matches")
+    matches = create_synthetic_database(sys.argv[1], int(_arg("--teams", 20)), int(_arg("--seasons", 1)),
+                                        None if matches_per_season is None else int(matches_per_season),
+                                        int(_arg("--leagues", 1)), int(_arg("--seed", 0)))
+    print(f"Banco sintético {sys.argv[1]} criado com {len(matches)} jogos.")
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import create_connection  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """ Banco SQLite vazio num diretório temporário, que também vira o diretório atual
+    (snapshots, artefatos e locks são gravados em caminhos relativos). """
+    monkeypatch.chdir(tmp_path)
+    connection = create_connection(str(tmp_path / "database.db"))
+    yield connection
+    connection.close()
@@ -0,0 +1,27 @@
+import pytest
+
+from backtest import run_backtest
+from migrations import apply_migrations
+
+
+def _insert_matches(conn, rows):
+    apply_migrations(conn)
+    conn.executemany("INSERT INTO matches (league, season, date, home_team, away_team, home_goals, away_goals) "
+                     "VALUES (?, ?, '01/05/2025', ?, ?, 1, 0)", rows)
+    conn.commit()
+
+
+def test_unknown_season_is_rejected(conn):
+    _insert_matches(conn, [("Serie A", "2024", "Flamengo", "Palmeiras"), ("Serie A", "2025", "Santos", "Bahia")])
+
+    with pytest.raises(ValueError, match="1999"):
+        run_backtest(conn, seasons=["1999"])
+
+
+def test_league_is_required_when_there_are_several(conn):
+    _insert_matches(conn, [("Serie A", "2025", "Flamengo", "Palmeiras"), ("Premier League", "2025", "Arsenal", "Chelsea")])
+
+    with pytest.raises(ValueError, match="Informe a liga"):
+        run_backtest(conn, seasons=["2025"])
+    with pytest.raises(ValueError, match="Serie B"):
+        run_backtest(conn, league="Serie B", seasons=["2025"])
@@ -0,0 +1,85 @@
+import pandas as pd
+
+from data_versions import get_data_version
+from ingest_data import CSV_COLUMNS, ingest_csv_to_db
+from migrations import MIGRATIONS, get_schema_version
+
+
+def _row(home, away, date="01/05/2025", home_goals=1, away_goals=0, odds=2.0):
+    row = {column: None for column in CSV_COLUMNS}
+    row.update({"Country": "Brazil", "League": "Serie A", "Season": "2025", "Date": date, "Time": "16:00",
+                "Home": home, "Away": away, "HG": home_goals, "AG": away_goals,
+                "Res": "H" if home_goals > away_goals else "A" if away_goals > home_goals else "D",
+                "PSCH": odds, "PSCD": 3.2, "PSCA": 3.8})
+    return row
+
+
+def _write_csv(path, rows):
+    pd.DataFrame(rows, columns=list(CSV_COLUMNS)).to_csv(path, index=False)
+    return str(path)
+
+
+def _matches(conn):
+    return conn.execute("SELECT home_team, away_team, home_goals, away_goals, psc_home_odds FROM matches ORDER BY id").fetchall()
+
+
+def test_ingest_applies_migrations_on_a_fresh_database(conn, tmp_path):
+    csv_file = _write_csv(tmp_path / "matches.csv", [_row("Flamengo", "Palmeiras")])
+
+    counts = ingest_csv_to_db(conn, csv_file)
+
+    assert counts == {"inserted": 1, "updated": 0, "skipped": 0}
+    assert get_schema_version(conn) == MIGRATIONS[-1][0]
+
+
+def test_reingesting_the_same_csv_changes_nothing(conn, tmp_path):
+    csv_file = _write_csv(tmp_path / "matches.csv", [_row("Flamengo", "Palmeiras"), _row("Santos", "Bahia")])
+    ingest_csv_to_db(conn, csv_file)
+    version = get_data_version(conn, "matches")
+
+    counts = ingest_csv_to_db(conn, csv_file)
+
+    assert counts == {"inserted": 0, "updated": 0, "skipped": 2}
+    assert len(_matches(conn)) == 2
+    assert get_data_version(conn, "matches") == version
+
+
+def test_changed_row_counts_as_updated(conn, tmp_path):
+    ingest_csv_to_db(conn, _write_csv(tmp_path / "first.csv", [_row("Flamengo", "Palmeiras"), _row("Santos", "Bahia")]))
+    version = get_data_version(conn, "matches")
+
+    counts = ingest_csv_to_db(conn, _write_csv(tmp_path / "second.csv", [
+        _row("Flamengo", "Palmeiras", home_goals=2, away_goals=2), _row("Santos", "Bahia")]))
+
+    assert counts == {"inserted": 0, "updated": 1, "skipped": 1}
+    assert _matches(conn)[0] == ("Flamengo", "Palmeiras", 2, 2, 2.0)
+    assert get_data_version(conn, "matches") == version + 1
+
+
+def test_duplicate_keys_inside_one_chunk_keep_the_last_row(conn, tmp_path):
+    csv_file = _write_csv(tmp_path / "matches.csv", [
+        _row("Flamengo", "Palmeiras", odds=2.0), _row("Santos", "Bahia"), _row("Flamengo", "Palmeiras", odds=2.5)])
+
+    counts = ingest_csv_to_db(conn, csv_file, chunksize=10)
+
+    assert counts == {"inserted": 2, "updated": 0, "skipped": 1}
+    assert sorted(_matches(conn)) == [("Flamengo", "Palmeiras", 1, 0, 2.5), ("Santos", "Bahia", 1, 0, 2.0)]
+
+
+def test_duplicate_keys_across_chunks_update_the_first(conn, tmp_path):
+    csv_file = _write_csv(tmp_path / "matches.csv", [
+        _row("Flamengo", "Palmeiras", odds=2.0), _row("Santos", "Bahia"), _row("Flamengo", "Palmeiras", odds=2.5)])
+
+    counts = ingest_csv_to_db(conn, csv_file, chunksize=2)
+
+    assert counts == {"inserted": 2, "updated": 1, "skipped": 0}
+    assert _matches(conn)[0] == ("Flamengo", "Palmeiras", 1, 0, 2.5)
+
+
+def test_rows_with_incomplete_key_are_skipped(conn, tmp_path):
+    incomplete = _row("Flamengo", "Palmeiras")
+    incomplete["Date"] = None
+
+    counts = ingest_csv_to_db(conn, _write_csv(tmp_path / "matches.csv", [incomplete, _row("Santos", "Bahia")]))
+
+    assert counts == {"inserted": 1, "updated": 0, "skipped": 1}
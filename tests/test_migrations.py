@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+from data_versions import get_data_version
+from migrations import MIGRATIONS, apply_migrations, get_schema_version
+
+
+def _migrate_to(conn, target):
+    """ Aplica as migrações até a versão `target`, como num banco criado por uma versão anterior do projeto. """
+    for version, _, migrate in MIGRATIONS:
+        if version <= target:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+
+
+def _insert_match(conn, match_id, home, away, date="2025-05-01", league="Serie A"):
+    conn.execute("INSERT INTO matches (id, league, season, date, home_team, away_team) VALUES (?, ?, '2025', ?, ?, ?)",
+                 (match_id, league, date, home, away))
+
+
+def _insert_xg(conn, match_id, home, away, home_xg, away_xg):
+    conn.execute("INSERT INTO xg_data (match_id, home_team, away_team, home_xg, away_xg) VALUES (?, ?, ?, ?, ?)",
+                 (match_id, home, away, home_xg, away_xg))
+
+
+def test_fresh_database_reaches_latest_version(conn):
+    assert apply_migrations(conn) == MIGRATIONS[-1][0]
+    assert get_schema_version(conn) == MIGRATIONS[-1][0]
+    # Reaplicar não faz nada
+    assert apply_migrations(conn) == MIGRATIONS[-1][0]
+
+
+def test_unique_match_key_removes_duplicates_and_moves_xg(conn):
+    _migrate_to(conn, 3)
+    # Três cópias do mesmo jogo; o xG está só nas duplicatas e passa para o jogo mantido (menor id)
+    for match_id in (1, 2, 3):
+        _insert_match(conn, match_id, "Flamengo", "Palmeiras")
+    _insert_xg(conn, 2, "Flamengo", "Palmeiras", 1.5, 0.7)
+    _insert_xg(conn, 3, "Flamengo", "Palmeiras", 9.9, 9.9)
+    # O jogo mantido já tem xG: o das duplicatas é descartado
+    _insert_match(conn, 4, "Santos", "Bahia")
+    _insert_match(conn, 5, "Santos", "Bahia")
+    _insert_xg(conn, 4, "Santos", "Bahia", 1.1, 1.2)
+    _insert_xg(conn, 5, "Santos", "Bahia", 8.8, 8.8)
+    # Chave incompleta (sem data): não entra na deduplicação nem no índice único
+    _insert_match(conn, 6, "Grêmio", "Inter", date=None)
+    _insert_match(conn, 7, "Grêmio", "Inter", date=None)
+    # Jogo único com xG e xG sem jogo correspondente ficam intactos
+    _insert_match(conn, 8, "Vasco", "Botafogo")
+    _insert_xg(conn, 8, "Vasco", "Botafogo", 0.9, 0.4)
+    _insert_xg(conn, 99, "Arsenal", "Chelsea", 2.0, 1.0)
+    conn.commit()
+
+    apply_migrations(conn)
+
+    assert [row[0] for row in conn.execute("SELECT id FROM matches ORDER BY id")] == [1, 4, 6, 7, 8]
+    assert conn.execute("SELECT match_id, home_xg, away_xg FROM xg_data ORDER BY match_id").fetchall() == [
+        (1, 1.5, 0.7), (4, 1.1, 1.2), (8, 0.9, 0.4), (99, 2.0, 1.0)]
+    assert get_data_version(conn, "matches") == 1
+
+    with pytest.raises(sqlite3.IntegrityError):
+        _insert_match(conn, 10, "Flamengo", "Palmeiras")
+
+
+def test_unique_match_key_without_duplicates_keeps_versions(conn):
+    _migrate_to(conn, 3)
+    _insert_match(conn, 1, "Flamengo", "Palmeiras")
+    _insert_xg(conn, 1, "Flamengo", "Palmeiras", 1.5, 0.7)
+    conn.commit()
+
+    _migrate_to(conn, 4)
+
+    assert get_data_version(conn, "matches", default=None) is None
+    assert get_data_version(conn, "xg_data", default=None) is None
+    assert conn.execute("SELECT COUNT(*) FROM xg_data").fetchone()[0] == 1
+
+
+def test_xg_data_source_key_classifies_existing_rows(conn):
+    _migrate_to(conn, 5)
+    _insert_match(conn, 1, "Flamengo", "Palmeiras")
+    _insert_match(conn, 2, "Santos", "Bahia")
+    # xG do jogo 1 de matches
+    conn.execute("INSERT INTO xg_data (match_id, home_team, away_team, home_xg, away_xg, season) "
+                 "VALUES (1, 'Flamengo', 'Palmeiras', 1.5, 0.7, '2025')")
+    # Id do StatsBomb que coincide com o jogo 2 de matches, mas com outros times
+    conn.execute("INSERT INTO xg_data (match_id, home_team, away_team, home_xg, away_xg, season) "
+                 "VALUES (2, 'Brazil', 'Uruguay', 0.9, 0.8, '2024')")
+    # Id do StatsBomb sem jogo correspondente em matches
+    conn.execute("INSERT INTO xg_data (match_id, home_team, away_team, home_xg, away_xg, season) "
+                 "VALUES (3943077, 'Argentina', 'Colombia', 1.2, 0.6, '2024')")
+    conn.commit()
+
+    apply_migrations(conn)
+
+    assert conn.execute("SELECT source, match_id, home_team FROM xg_data ORDER BY match_id").fetchall() == [
+        ("matches", 1, "Flamengo"), ("statsbomb", 2, "Brazil"), ("statsbomb", 3943077, "Argentina")]
+    assert get_data_version(conn, "xg_data") == 1
+
+    # Os dois espaços de ids convivem: o jogo 2 de matches pode ganhar o próprio xG
+    conn.execute("INSERT INTO xg_data (match_id, home_team, away_team, home_xg, away_xg) VALUES (2, 'Santos', 'Bahia', 1.0, 1.0)")
+    assert conn.execute("SELECT COUNT(*) FROM xg_data WHERE match_id = 2").fetchone()[0] == 2
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO xg_data (source, match_id) VALUES ('statsbomb', 2)")
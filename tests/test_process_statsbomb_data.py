@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from process_statsbomb_data import iter_json_array, sum_shot_xg
+
+CHUNK_SIZES = [1, 2, 7, 1024]
+
+ARRAYS = [
+    [],
+    [0],
+    [1234567890, -0.000123, 1.5e-10, 3.14159, 42],
+    ["texto", "com \"aspas\", vírgulas e ]colchetes[", "", "ção"],
+    [True, False, None, 12, "fim"],
+    [{"id": 1, "nested": {"values": [1, 2.5, {"deep": [None, True]}]}}, {"id": 2, "empty": {}, "list": []}],
+    [[1, [2, [3, [4]]]], {"a": [{"b": {"c": 123456789}}]}],
+]
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("array", ARRAYS)
+def test_iter_json_array_matches_json_load(tmp_path, array, chunk_size):
+    path = _write(tmp_path / "array.json", json.dumps(array, indent=2, ensure_ascii=False))
+
+    assert list(iter_json_array(path, chunk_size)) == array
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_iter_json_array_compact_and_padded_layouts(tmp_path, chunk_size):
+    array = [{"n": i, "xg": i / 7, "tags": ["a"] * (i % 3)} for i in range(50)]
+    compact = _write(tmp_path / "compact.json", json.dumps(array, separators=(",", ":")))
+    padded = _write(tmp_path / "padded.json", "﻿ \n[ " + " ,\n\t ".join(json.dumps(item) for item in array) + " ]\n")
+
+    assert list(iter_json_array(compact, chunk_size)) == array
+    assert list(iter_json_array(padded, chunk_size)) == array
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", [
+    "",
+    "   ",
+    '{"not": "an array"}',
+    "[1, 2",
+    "[1, 2,",
+    '[{"a": 1}, {"b": ',
+    "[1, 2.",
+    "[1 2]",
+    "[1,, 2]",
+    "[, 1]",
+    "[1, 2,]",
+    "[tru]",
+])
+def test_iter_json_array_rejects_malformed_arrays(tmp_path, text, chunk_size):
+    path = _write(tmp_path / "malformed.json", text)
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(path, chunk_size))
+
+
+def test_sum_shot_xg_skips_non_shots_and_the_shootout(tmp_path):
+    events = [
+        {"type": {"name": "Pass"}, "team": {"name": "Brazil"}, "period": 1},
+        {"type": {"name": "Shot"}, "team": {"name": "Brazil"}, "period": 1, "shot": {"statsbomb_xg": 0.25}},
+        {"type": {"name": "Shot"}, "team": {"name": "Brazil"}, "period": 4, "shot": {"statsbomb_xg": 0.5}},
+        {"type": {"name": "Shot"}, "team": {"name": "Uruguay"}, "period": 2, "shot": {"statsbomb_xg": 0.125}},
+        {"type": {"name": "Shot"}, "team": {"name": "Uruguay"}, "period": 5, "shot": {"statsbomb_xg": 0.78}},
+    ]
+    path = _write(tmp_path / "3943077.json", json.dumps(events))
+
+    assert sum_shot_xg(path) == (3943077, {"Brazil": 0.75, "Uruguay": 0.125})
@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from data_versions import get_data_version
+from db import DB_FILE, create_connection
+from dixon_coles_model import MODEL_NAME, MODEL_PARAMS_FILE, retrain_dixon_coles_incremental
+from model_artifacts import active_version, list_versions, rollback_params
+
+# Os treinos rodam fora dos workers da API, num processo próprio e com prioridade reduzida,
+# para não disputar CPU com as requisições; a API só enxerga a troca atômica do arquivo ativo.
+TRAINING_NICE = 10
+WATCH_INTERVAL = 60  # segundos entre verificações de dados novos no modo --watch
+
+def _lower_priority():
+    """ Inicializador do processo de treino: reduz a prioridade de CPU, quando o sistema permite. """
+    try:
+        os.nice(TRAINING_NICE)
+    except (AttributeError, OSError):
+        pass
+
+def train_and_publish(seasons=("2025",), params_file=MODEL_PARAMS_FILE, db_file=DB_FILE):
+    """ Executado no processo de treino: abre a própria conexão, retreina de forma incremental
+    (publicando uma nova versão se houver jogos novos) e retorna a versão ativa. """
+    conn = create_connection(db_file)
+    if conn is None:
+        raise RuntimeError(f"Não foi possível conectar ao banco de dados {db_file}")
+    try:
+        retrain_dixon_coles_incremental(conn, seasons, params_file)
+    finally:
+        conn.close()
+    return active_version(params_file)
+
+class TrainingService:
+    """ Dispara treinos num processo separado, um de cada vez.
+    Pedidos feitos enquanto um treino está em andamento reaproveitam o mesmo resultado. """
+
+    def __init__(self):
+        self._executor = ProcessPoolExecutor(max_workers=1, initializer=_lower_priority)
+        self._future = None
+        self._lock = threading.Lock()
+
+    def submit(self, seasons=("2025",), params_file=MODEL_PARAMS_FILE):
+        """ Agenda um treino e retorna o Future com a versão publicada. """
+        with self._lock:
+            if self._future is None or self._future.done():
+                self._future = self._executor.submit(train_and_publish, seasons, params_file)
+            return self._future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+def watch(service, interval=WATCH_INTERVAL, db_file=DB_FILE):
+    """ Retreina sempre que a versão dos dados de matches muda. """
+    last_version = None
+    while True:
+        conn = create_connection(db_file, read_only=True)
+        data_version = get_data_version(conn, "matches") if conn else last_version
+        if conn:
+            conn.close()
+        if data_version != last_version:
+            print(f"Dados de matches na versão {data_version}. Treinando...")
+            try:
+                print(f"Versão ativa do modelo: {service.submit().result()}")
+                last_version = data_version
+            except Exception as e:
+                print(f"Erro no treino: {e}")
+        time.sleep(interval)
+
+if __name__ == '__main__':
+    if "--list" in sys.argv:
+        current = active_version(MODEL_PARAMS_FILE)
+        for version, path in list_versions(MODEL_NAME):
+            print(f"{'*' if version == current else ' '} {version}  {path}")
+    elif "--rollback" in sys.argv:
+        position = sys.argv.index("--rollback")
+        version = sys.argv[position + 1] if len(sys.argv) > position + 1 else None
+        print(f"Modelo {MODEL_NAME} restaurado para a versão {rollback_params(MODEL_NAME, MODEL_PARAMS_FILE, version)}")
+    else:
+        service = TrainingService()
+        try:
+            if "--watch" in sys.argv:
+                watch(service)
+            else:
+                print(f"Versão ativa do modelo: {service.submit().result()}")
+        finally:
+            service.shutdown()
@@ -1,16 +1,6 @@
 
 import sqlite3
-
-DB_FILE = "database.db"
-
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file)
-    except sqlite3.Error as e:
-        print(e)
-    return conn
+from db import DB_FILE, create_connection
 
 def verify_data(conn):
     """ Verifica se os dados foram inseridos corretamente, incluindo as odds médias """
@@ -2,44 +2,109 @@
 import sqlite3
 import pandas as pd
 import numpy as np
-
-DB_FILE = "database.db"
-
-def create_connection(db_file):
-    """ Cria uma conexão com o banco de dados SQLite """
-    conn = None
+from data_versions import get_data_version, set_data_version
+from db import DB_FILE, create_connection
+from metrics import count_cache
+from parquet_snapshots import read_xg_data
+
+def compute_xg_aggregates(df_xg):
+    """ Agrega xG marcado, xG sofrido e número de jogos por (temporada, time) com um único groupby. """
+    home = pd.DataFrame({"season": df_xg["season"], "team": df_xg["home_team"],
+                         "xg_scored": df_xg["home_xg"], "xg_conceded": df_xg["away_xg"]})
+    away = pd.DataFrame({"season": df_xg["season"], "team": df_xg["away_team"],
+                         "xg_scored": df_xg["away_xg"], "xg_conceded": df_xg["home_xg"]})
+
+    return (pd.concat([home, away], ignore_index=True)
+            .groupby(["season", "team"], sort=False)
+            .agg(xg_scored=("xg_scored", "sum"),
+                 xg_conceded=("xg_conceded", "sum"),
+                 matches=("xg_scored", "size"))
+            .reset_index())
+
+def create_xg_team_stats_table(conn):
+    """ Cria a tabela com os agregados de xG por time e temporada. """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS xg_team_stats (
+            season TEXT NOT NULL,
+            team TEXT NOT NULL,
+            xg_scored REAL NOT NULL,
+            xg_conceded REAL NOT NULL,
+            matches INTEGER NOT NULL,
+            PRIMARY KEY (season, team)
+        );
+    """)
+
+def _read_xg_with_season(conn):
+    """ Lê xg_data com a temporada de cada jogo, do snapshot Parquet ou do SQLite. """
+    return read_xg_data(conn, ["season", "home_team", "away_team", "home_xg", "away_xg"])
+
+def _xg_source_versions(conn):
+    """ Versões de que os agregados de xG dependem: xg_data e matches (a temporada dos jogos vem de matches). """
+    return [get_data_version(conn, "xg_data"), get_data_version(conn, "matches")]
+
+def refresh_xg_team_stats(conn):
+    """ Recalcula a tabela xg_team_stats a partir de xg_data. """
+    create_xg_team_stats_table(conn)
+    xg_version, matches_version = _xg_source_versions(conn)
+    aggregates = compute_xg_aggregates(_read_xg_with_season(conn))
+
+    conn.execute("DELETE FROM xg_team_stats")
+    conn.executemany(
+        "INSERT INTO xg_team_stats (season, team, xg_scored, xg_conceded, matches) VALUES (?, ?, ?, ?, ?)",
+        [(season, team, float(scored), float(conceded), int(matches)) for season, team, scored, conceded, matches
+         in aggregates[["season", "team", "xg_scored", "xg_conceded", "matches"]].itertuples(index=False)])
+    set_data_version(conn, "xg_team_stats", xg_version)
+    set_data_version(conn, "xg_team_stats:matches", matches_version)
+    conn.commit()
+    return aggregates
+
+def load_xg_team_stats(conn, season=None):
+    """ Lê os agregados de xG de uma temporada (ou somados sobre todas, se None), sem escrever no banco.
+    A tabela é materializada por refresh_xg_team_stats após cada escrita em xg_data; se ela não existir
+    ou estiver desatualizada (em relação a xg_data ou a matches), os agregados são calculados em memória. """
     try:
-        conn = sqlite3.connect(db_file)
-        print(f"Conexão com o banco de dados {db_file} estabelecida.")
-    except sqlite3.Error as e:
-        print(e)
-    return conn
+        materialized_version = [get_data_version(conn, "xg_team_stats", default=None),
+                                get_data_version(conn, "xg_team_stats:matches", default=None)]
+        if materialized_version != _xg_source_versions(conn):
+            aggregates = compute_xg_aggregates(_read_xg_with_season(conn))
+        else:
+            aggregates = pd.read_sql_query("SELECT season, team, xg_scored, xg_conceded, matches FROM xg_team_stats", conn)
+    except (sqlite3.OperationalError, pd.errors.DatabaseError):
+        aggregates = compute_xg_aggregates(_read_xg_with_season(conn))
+
+    if season is not None:
+        aggregates = aggregates[aggregates["season"] == str(season)]
+    aggregates = aggregates.groupby("team", sort=False)[["xg_scored", "xg_conceded", "matches"]].sum()
 
-def predict_xg_differential(home_team, away_team, conn):
-    """ Faz previsões de resultado com base no XG diferencial. """
-    # Recupera os xG médios dos times da tabela xg_data
-    # Como o xg_data é por partida, vamos calcular a média de xG para cada time
-    # a partir dos dados da temporada 2025.
-    df_xg = pd.read_sql_query("SELECT home_team, away_team, home_xg, away_xg FROM xg_data", conn)
-
-    # Calcula o xG médio para cada time (marcado e sofrido)
     team_xg_stats = {}
-    all_teams = pd.concat([df_xg["home_team"], df_xg["away_team"]]).unique()
-
-    for team in all_teams:
-        home_matches = df_xg[df_xg["home_team"] == team]
-        away_matches = df_xg[df_xg["away_team"] == team]
-
-        avg_xg_scored = (home_matches["home_xg"].sum() + away_matches["away_xg"].sum()) / \
-                        (len(home_matches) + len(away_matches)) if (len(home_matches) + len(away_matches)) > 0 else 0
-        
-        avg_xg_conceded = (home_matches["away_xg"].sum() + away_matches["home_xg"].sum()) / \
-                          (len(home_matches) + len(away_matches)) if (len(home_matches) + len(away_matches)) > 0 else 0
-        
+    for team, xg_scored, xg_conceded, matches in aggregates.itertuples():
         team_xg_stats[team] = {
-            "avg_xg_scored": avg_xg_scored,
-            "avg_xg_conceded": avg_xg_conceded
+            "avg_xg_scored": xg_scored / matches if matches > 0 else 0,
+            "avg_xg_conceded": xg_conceded / matches if matches > 0 else 0
         }
+    return team_xg_stats
+
+# Cache em memória por worker: temporada -> (versões de xg_data e matches, estatísticas de xG por time)
+_xg_team_stats_cache = {}
+
+def get_xg_team_stats(conn, season=None):
+    """ Retorna os agregados de xG por time, usando o cache em memória enquanto xg_data e matches não mudarem. """
+    xg_version = _xg_source_versions(conn)
+    cached = _xg_team_stats_cache.get(season)
+    hit = cached is not None and cached[0] == xg_version
+    count_cache("xg_team_stats", hit)
+    if hit:
+        return cached[1]
+
+    team_xg_stats = load_xg_team_stats(conn, season)
+    _xg_team_stats_cache[season] = (xg_version, team_xg_stats)
+    return team_xg_stats
+
+def predict_xg_differential(home_team, away_team, conn, season=None):
+    """ Faz previsões de resultado com base no XG diferencial. """
+    # Os xG médios de cada time (marcado e sofrido) vêm da camada de agregados,
+    # calculada uma vez por versão de xg_data; aqui é apenas uma consulta ao dicionário.
+    team_xg_stats = get_xg_team_stats(conn, season)
 
     if home_team not in team_xg_stats or away_team not in team_xg_stats:
         print(f"Erro: Time(s) não encontrado(s) nas estatísticas de xG. Times disponíveis: {list(team_xg_stats.keys())}")
@@ -87,6 +152,37 @@ def predict_xg_differential(home_team, away_team, conn):
         "xg_differential": xg_differential
     }
 
+def predict_xg_differential_batch(home_teams, away_teams, conn, season=None):
+    """ Faz previsões de XG diferencial para vários jogos de uma vez, com os limiares aplicados em arrays.
+    Retorna uma lista alinhada com os jogos de entrada; jogos com times desconhecidos ficam como None. """
+    team_xg_stats = get_xg_team_stats(conn, season)
+
+    known = np.array([home in team_xg_stats and away in team_xg_stats for home, away in zip(home_teams, away_teams)], dtype=bool)
+    predictions = [None] * len(known)
+    if not known.any():
+        return predictions
+
+    expected_xg_home = np.array([team_xg_stats[team]["avg_xg_scored"] for team, ok in zip(home_teams, known) if ok], dtype=float)
+    expected_xg_away = np.array([team_xg_stats[team]["avg_xg_scored"] for team, ok in zip(away_teams, known) if ok], dtype=float)
+    xg_differential = expected_xg_home - expected_xg_away
+
+    # Mesmos limiares de predict_xg_differential
+    conditions = [xg_differential > 0.5, xg_differential < -0.5]
+    prob_home_win = np.select(conditions, [0.7, 0.1], default=0.3)
+    prob_draw = np.select(conditions, [0.2, 0.2], default=0.4)
+    prob_away_win = np.select(conditions, [0.1, 0.7], default=0.3)
+
+    for position, i in enumerate(np.flatnonzero(known)):
+        predictions[i] = {
+            "home_win": float(prob_home_win[position]),
+            "draw": float(prob_draw[position]),
+            "away_win": float(prob_away_win[position]),
+            "expected_xg_home": float(expected_xg_home[position]),
+            "expected_xg_away": float(expected_xg_away[position]),
+            "xg_differential": float(xg_differential[position])
+        }
+    return predictions
+
 if __name__ == '__main__':
     conn = create_connection(DB_FILE)
     if conn: